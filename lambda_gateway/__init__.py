@@ -1,10 +1,5 @@
 import logging
 
-try:
-    from importlib.metadata import version, PackageNotFoundError
-except ImportError:
-    from importlib_metadata import version, PackageNotFoundError  # For Python <3.8
-
 
 def set_stream_logger(name, level=logging.DEBUG, format_string=None):
     """
@@ -29,12 +24,28 @@ def _version():
     """
     Helper to get package version.
     """
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:
+        # For Python <3.8
+        from importlib_metadata import version, PackageNotFoundError
     try:
         return version("lambda-gateway")
     except PackageNotFoundError:  # pragma: no cover
         return None
 
 
-__version__ = _version()
+def __getattr__(name):
+    """
+    Look ``__version__`` up on first use: importlib.metadata is slow to
+    import and most runs never print the version.
+    """
+    if name == '__version__':
+        global __version__
+        __version__ = _version()
+        return __version__
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
-logger = set_stream_logger(__name__)
+# The stream handler is installed by the CLI, see set_stream_logger()
+logger = logging.LoggerAdapter(logging.getLogger(__name__), dict(addr='::1'))
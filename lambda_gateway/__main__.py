@@ -1,24 +1,79 @@
 #!/usr/bin/env python3
 # usage:
 #   python server.py --help
+#
+# aiohttp, nest_asyncio and watchfiles are imported by the code paths that
+# need them, and ruamel.yaml only to parse a SAM template, so that --version
+# or a bad option returns at once and the server binds as early as possible.
 import argparse
 import os
+import signal
 import sys
-from aiohttp import web
-import asyncio
-import nest_asyncio
-from watchfiles import awatch
+import threading
+import time
 
-from lambda_gateway.event_proxy import EventProxy
-from lambda_gateway.request_handler import LambdaRequestHandler
-
-from lambda_gateway import __version__
+from lambda_gateway import manifest, set_stream_logger
 from lambda_gateway.sam import SAM, load_env_vars
 from lambda_gateway.cdk import CDKParser
 
-# So lambda functions can make use of asyncio without the problem
-# of being nested within our outer http loop
-nest_asyncio.apply()
+
+class StartupTimer:
+    """
+    Time the phases of startup, for ``--startup-report``.
+
+    Phases run back to back from the creation of the timer, i.e. from the
+    import of this module.
+    """
+    def __init__(self):
+        self.started = self.last = time.perf_counter()
+        self.phases = []
+
+    def phase(self, name):
+        """
+        End a phase, started at the end of the previous one.
+        """
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def report(self):
+        """
+        Print the phase timings and the time to bind.
+        """
+        print('Startup report:')
+        for name, duration in self.phases:
+            print(f'  {name:<10} {duration * 1000:8.1f} ms')
+        print(f'  {"total":<10} {(self.last - self.started) * 1000:8.1f} ms')
+
+
+STARTUP = StartupTimer()
+
+
+class VersionAction(argparse.Action):
+    """
+    Print the version and exit, looking it up only when asked for.
+    """
+    def __init__(self, option_strings, dest=argparse.SUPPRESS,
+                 default=argparse.SUPPRESS, help=None):
+        super().__init__(option_strings, dest, nargs=0, default=default,
+                         help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        from lambda_gateway import __version__
+        print(f'{parser.prog} {__version__}')
+        parser.exit()
+
+
+def get_limit(value):
+    """
+    Parse ``N`` or ``FUNCTION=N`` CLI values into (function, N).
+    """
+    handler, _, limit = value.rpartition('=')
+    try:
+        return handler or None, int(limit)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid limit: '{value}'")
+
 
 def get_opts():
     """
@@ -56,9 +111,8 @@ def get_opts():
     )
     parser.add_argument(
         '-v', '--version',
-        action='version',
+        action=VersionAction,
         help='Print version and exit',
-        version=f'%(prog)s {__version__}',
     )
     parser.add_argument(
         '-V', '--payload-version',
@@ -72,55 +126,567 @@ def get_opts():
         help='Watch the base python path and exit if files change.',
         action="store_true"
     )
+    parser.add_argument(
+        '-W', '--workers',
+        dest='workers',
+        default=1,
+        help='Number of gateway processes sharing the port [default: 1]',
+        metavar='N',
+        type=int,
+    )
+    parser.add_argument(
+        '--max-body-size',
+        dest='max_body_size',
+        help='Reject larger request bodies with 413 [default: 6 MiB, the '
+             'Lambda payload limit]',
+        metavar='BYTES',
+        type=int,
+    )
+    parser.add_argument(
+        '--server-timing',
+        action='store_true',
+        dest='server_timing',
+        help='Report event, invoke and response build times in a '
+             'Server-Timing response header',
+    )
+    parser.add_argument(
+        '--cache-ttl',
+        action='append',
+        dest='cache_ttl',
+        default=[],
+        help='Cache GET responses for this long, for all routes or for one '
+             'path (repeatable) [default: template MethodSettings, or off]',
+        metavar='[PATH=]SECONDS',
+        type=get_limit,
+    )
+    parser.add_argument(
+        '--cache-size',
+        dest='cache_size',
+        default=64,
+        help='Maximum size of cached responses [default: 64]',
+        metavar='MB',
+        type=int,
+    )
+    parser.add_argument(
+        '--cache-key-header',
+        action='append',
+        dest='cache_key_headers',
+        default=[],
+        help='Request header that varies cached responses (repeatable)',
+        metavar='NAME',
+    )
+    parser.add_argument(
+        '--single-flight',
+        action='store_true',
+        dest='single_flight',
+        help='Share one invocation between concurrent identical GET '
+             'requests (same cache key)',
+    )
+    parser.add_argument(
+        '--compress-min-size',
+        dest='compress_min_size',
+        help='Compress responses of at least this size for clients that '
+             'accept gzip (or br) [default: off]',
+        metavar='BYTES',
+        type=int,
+    )
+    parser.add_argument(
+        '--compress-type',
+        action='append',
+        dest='compress_types',
+        default=[],
+        help='Content type to compress, or prefix ending with / '
+             '(repeatable) [default: text/, JSON, JavaScript, XML and SVG]',
+        metavar='TYPE',
+    )
+    parser.add_argument(
+        '--compress-level',
+        dest='compress_level',
+        default=6,
+        help='Compression level, 1-9 [default: 6]',
+        metavar='N',
+        type=int,
+    )
+    parser.add_argument(
+        '--compress-cache-size',
+        dest='compress_cache_size',
+        default=8,
+        help='Maximum size of cached compressed bodies, 0 to disable '
+             '[default: 8]',
+        metavar='MB',
+        type=int,
+    )
+    parser.add_argument(
+        '--startup-report',
+        action='store_true',
+        dest='startup_report',
+        help='Print the time taken by each startup phase, up to binding '
+             'the port',
+    )
+    parser.add_argument(
+        '--profile',
+        action='append',
+        default=[],
+        help='Sample the stacks of a function\'s invocations from startup, '
+             'by logical ID or handler (repeatable); see /__gateway/profile',
+        metavar='FUNCTION',
+    )
+    parser.add_argument(
+        '--trace',
+        help='Export per-request phase spans, as OTLP/JSON lines to a file '
+             'or to an OTLP/HTTP collector URL',
+        metavar='FILE|URL',
+    )
+    parser.add_argument(
+        '--no-nest-asyncio',
+        action='store_false',
+        dest='nest_asyncio',
+        help="Don't patch asyncio to allow nested event loops",
+    )
     parser.add_argument(
         '-e', '--env-vars',
         dest='env_vars_json',
         help='JSON file containing environment variables',
         metavar='PATH',
     )
+    parser.add_argument(
+        '-c', '--max-concurrency',
+        action='append',
+        default=[],
+        dest='max_concurrency',
+        help='Maximum concurrent containers per function, optionally for '
+             'one function (logical ID) or handler only (repeatable) '
+             '[default: none, or one per CPU with --isolation=process]',
+        metavar='[FUNCTION=]N',
+        type=get_limit,
+    )
+    parser.add_argument(
+        '--no-template-cache',
+        action='store_false',
+        dest='template_cache',
+        help="Don't cache the routes compiled from the SAM template",
+    )
+    parser.add_argument(
+        '--timeout-mode',
+        choices=['soft', 'hard'],
+        default='soft',
+        dest='timeout_mode',
+        help='On timeout, leave the handler running (soft) or terminate its '
+             'worker process (hard, implies --isolation=process) '
+             '[default: soft]',
+    )
+    parser.add_argument(
+        '--queue-timeout',
+        dest='queue_timeout',
+        default=30,
+        help='Seconds an invocation may wait for a container before being '
+             'throttled with a 429 [default: 30]',
+        metavar='SECONDS',
+        type=float,
+    )
+    parser.add_argument(
+        '--max-queue',
+        dest='max_queue',
+        help='Invocations that may wait for a container per function; '
+             'further ones are throttled with a 429 [default: none]',
+        metavar='N',
+        type=int,
+    )
+    parser.add_argument(
+        '--threads',
+        action='append',
+        default=[],
+        dest='threads',
+        help='Threads running synchronous handlers: N sizes the pool shared '
+             'by all functions, FUNCTION=N gives that function (logical ID) '
+             'or handler a dedicated pool (repeatable) '
+             '[default: min(32, CPUs + 4)]',
+        metavar='[FUNCTION=]N',
+        type=get_limit,
+    )
+    parser.add_argument(
+        '--dedicated-threads',
+        action='store_true',
+        dest='dedicated_threads',
+        help='Give every function its own thread pool, sized like the '
+             'shared one',
+    )
+    parser.add_argument(
+        '--isolation',
+        choices=['thread', 'process'],
+        default='thread',
+        help='Run handlers in executor threads or in long-lived worker '
+             'processes [default: thread]',
+    )
+    parser.add_argument(
+        '--prewarm',
+        dest='prewarm',
+        default=0,
+        help='Warm containers to start per function at startup [default: 0]',
+        metavar='N',
+        type=int,
+    )
+    parser.add_argument(
+        '--idle-ttl',
+        dest='idle_ttl',
+        default=900,
+        help='Reap containers idle for this long [default: 900]',
+        metavar='SECONDS',
+        type=float,
+    )
     parser.add_argument(
         'SAM_TEMPLATE',
         help='Path to SAM YAML template',
     )
-    return parser.parse_args()
+    opts = parser.parse_args()
+    if opts.timeout_mode == 'hard':
+        opts.isolation = 'process'
+    return opts
+
+
+# Workers exiting within this many seconds of their start are respawned
+# after a delay, doubling up to RESPAWN_MAX_DELAY while they keep failing
+RESPAWN_MIN_UPTIME = 1.0
+RESPAWN_DELAY = 0.1
+RESPAWN_MAX_DELAY = 10.0
 
 
-async def run_server(app, bind, port, path, quit_on_change=True):
+async def run_server(app, bind, port, paths, quit_on_change=True,
+                     on_change=None, sock=None, on_bind=None):
     """
     Run Lambda Gateway server.
+
+    Stops on SIGTERM, draining in-flight requests. Changes under ``paths``
+    either stop the server (``quit_on_change``) or are passed to
+    ``on_change``. If ``paths`` is empty the server does not watch.
+    The server listens on ``sock`` if given, else binds ``bind:port``.
+    ``on_bind`` is called once the server listens.
     """
+    import asyncio
+    from aiohttp import web
+
     runner = web.AppRunner(app, access_log=None)
     await runner.setup()
-    site = web.TCPSite(runner, bind, port)
+    if sock is None:
+        site = web.TCPSite(runner, bind, port)
+    else:
+        site = web.SockSite(runner, sock)
     await site.start()
+    if on_bind:
+        on_bind()
 
     stop_event = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(
+        signal.SIGTERM, stop_event.set)
 
-    # Wait for a source file to change, then quit
-    async for changes in awatch(path, stop_event=stop_event, raise_interrupt=False):
-        print(f"Source file changed: {changes}")
-        if quit_on_change:
-            print('Exiting so you can reload')
-            stop_event.set() # `break` would probably be enough BTW
-        else:
-            print("No reload or quit - try -w flag")
+    if not paths:
+        await stop_event.wait()
+
+    # Wait for a source file to change, then quit or reload
+    else:
+        from watchfiles import awatch
+        async for changes in awatch(*paths, stop_event=stop_event,
+                                    raise_interrupt=False):
+            print(f"Source file changed: {changes}")
+            if quit_on_change:
+                print('Exiting so you can reload')
+                stop_event.set() # `break` would probably be enough BTW
+            elif on_change:
+                on_change([path for _, path in changes])
 
     await runner.cleanup()
 
+
+def bind_socket(bind, port):
+    """
+    Bind a listening TCP socket, on all interfaces if ``bind`` is empty.
+    """
+    import socket
+
+    if bind:
+        family = socket.getaddrinfo(bind, port, type=socket.SOCK_STREAM)[0][0]
+        return socket.create_server((bind, port), family=family)
+    if socket.has_dualstack_ipv6():
+        return socket.create_server(
+            ('', port), family=socket.AF_INET6, dualstack_ipv6=True)
+    return socket.create_server(('', port))
+
+
+def run_workers(app, bind, port, paths, quit_on_change=True, on_change=None,
+                workers=2, on_bind=None):
+    """
+    Run Lambda Gateway server in forked worker processes.
+
+    The supervisor binds the port before forking, so that a port in use
+    fails at once, and workers accept connections on the shared socket.
+    Workers are respawned when they exit, with a growing delay if they
+    keep exiting right after their start. SIGTERM drains all workers.
+    With ``quit_on_change`` the supervisor watches ``paths`` instead of
+    the workers; on a change it drains all workers and returns.
+    ``on_bind`` is called by each worker once it listens.
+    """
+    import asyncio
+
+    sock = bind_socket(bind, port)
+
+    def spawn():
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            # Don't share the parent's loop: its epoll and self-pipe file
+            # descriptors are inherited by every worker
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            code = 0
+            try:
+                asyncio.run(run_server(
+                    app, bind, port, () if quit_on_change else paths,
+                    quit_on_change, on_change, sock=sock, on_bind=on_bind))
+            except BaseException:
+                code = 1
+                import traceback
+                traceback.print_exc()
+            finally:
+                os._exit(code)
+        print(f"Started worker {pid}")
+        started[pid] = time.monotonic()
+        return pid
+
+    stopping = threading.Event()
+
+    def stop(*args):
+        stopping.set()
+        for pid in list(pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def watch_changes():
+        from watchfiles import watch
+        for changes in watch(*paths, stop_event=stopping,
+                             raise_interrupt=False):
+            print(f"Source file changed: {changes}")
+            print('Draining workers so you can reload')
+            stop()
+            break
+
+    started = {}
+    pids = set()
+    delay = 0
+    sigterm = signal.signal(signal.SIGTERM, stop)
+    try:
+        pids.update(spawn() for _ in range(workers))
+        if quit_on_change:
+            threading.Thread(target=watch_changes, daemon=True).start()
+
+        while pids:
+            try:
+                pid, status = os.wait()
+            except KeyboardInterrupt:
+                stop()
+                continue
+            except ChildProcessError:
+                break
+            pids.discard(pid)
+            uptime = time.monotonic() - started.pop(pid)
+            if stopping.is_set():
+                continue
+            if uptime >= RESPAWN_MIN_UPTIME:
+                delay = 0
+            else:
+                delay = min(delay * 2 or RESPAWN_DELAY, RESPAWN_MAX_DELAY)
+            print(f"Worker {pid} exited with status {status}, respawning"
+                  + (f" in {delay:g}s" if delay else ''))
+            try:
+                if stopping.wait(delay):
+                    continue
+            except KeyboardInterrupt:
+                stop()
+                continue
+            pids.add(spawn())
+    finally:
+        signal.signal(signal.SIGTERM, sigterm)
+        sock.close()
+
+
 def get_cors_options_handler(extra_headers):
+    from aiohttp import web
+
     async def cors_options_handler(request):
         r = web.Response(status=204, headers=extra_headers)
         return r
     return cors_options_handler
-    
+
+
+def get_prewarm_handler(proxies, count):
+    async def prewarm(app):
+        for proxy in proxies:
+            await proxy.pool.prewarm(count)
+    return prewarm
+
+
+def get_template(path, cache=True):
+    """
+    Load SAM Template or CDK Stack.
+
+    Both are loaded as a manifest, cached on disk unless ``cache`` is off.
+    """
+    if not cache:
+        parser = CDKParser if path.endswith('.ts') else SAM
+        return manifest.Manifest.from_template(parser(path))
+    return manifest.load(path)
+
+
+def get_function_setting(values, endpoint, default=None):
+    """
+    Get a per-function CLI setting.
+
+    Settings are given for a function's name (its logical ID), or for a
+    handler spec, applying to every function with that handler.
+
+    :param dict values: Settings by function name or handler
+    :param Endpoint endpoint: Template endpoint of the function
+    :param default: Value if the function has no setting
+    """
+    for key in (endpoint.Function, endpoint.Handler):
+        if key is not None and key in values:
+            return values[key]
+    return default
+
+
+def get_cache_ttl(endpoint, ttls, settings):
+    """
+    Get the response cache TTL of an endpoint.
+
+    ``--cache-ttl PATH=N`` beats ``--cache-ttl N``, which beats the
+    template's caching ``MethodSettings``.
+
+    :param Endpoint endpoint: Template endpoint
+    :param dict ttls: TTLs from the CLI, by path (or None for all)
+    :param list settings: (method, path, TTL) from the template
+    :returns int: TTL in seconds, 0 if not cached
+    """
+    method = endpoint.Method.upper()
+    if method not in ('GET', 'ANY'):
+        return 0
+    for key in (endpoint.Path, None):
+        if key in ttls:
+            return ttls[key]
+    for setting_method, path, ttl in settings:
+        if setting_method in ('*', method) and path in ('/*', endpoint.Path):
+            return ttl
+    return 0
+
+
+def get_routes(sam, opts, base_python_path, extra_headers, proxies=None,
+               cache=None, compressor=None):
+    """
+    Get route definitions for the template's endpoints.
+
+    Routes of the same function share one proxy (and container pool).
+    Proxies found in ``proxies`` are reused, so warm containers survive a
+    template reload.
+
+    :returns tuple: (list of RouteDef, dict of EventProxy by function)
+    """
+    from aiohttp import web
+
+    from lambda_gateway import executors
+    from lambda_gateway.event_proxy import EventProxy
+    from lambda_gateway.request_handler import (
+        LambdaRequestHandler, MAX_BODY_SIZE)
+
+    proxies = proxies or {}
+    ttls = dict(opts.cache_ttl)
+    settings = sam.get_cache_settings() \
+        if hasattr(sam, 'get_cache_settings') else []
+
+    # Containers per function: a CLI limit for the function (or its
+    # handler) wins over the template's reserved concurrency, which wins
+    # over the CLI default. Worker processes are capped at one per CPU.
+    cli_limits = dict(opts.max_concurrency)
+    reserved = sam.get_reserved_concurrency() \
+        if hasattr(sam, 'get_reserved_concurrency') else {}
+    default_limit = cli_limits.get(None)
+    if default_limit is None and opts.isolation == 'process':
+        default_limit = os.cpu_count()
+
+    # Thread pools: shared by default, dedicated per function on request
+    threads = dict(opts.threads)
+
+    routes = []
+    used = {}
+    for endpoint in sam.get_endpoints():
+        name = endpoint.Function or endpoint.Handler
+        key = (name, endpoint.Handler, endpoint.CodeUri)
+        if key not in used:
+            limit = get_function_setting(
+                cli_limits, endpoint, reserved.get(name, default_limit))
+            timeout = opts.timeout if opts.timeout is not None \
+                else endpoint.Timeout
+            size = get_function_setting(threads, endpoint)
+            if size is not None or opts.dedicated_threads:
+                executor = executors.get_dedicated_executor(
+                    name, size or threads.get(None))
+            else:
+                executor = executors.get_executor(
+                    executors.SHARED, threads.get(None))
+            used[key] = proxies.get(key) or EventProxy(
+                endpoint.Handler,
+                os.path.join(base_python_path, endpoint.CodeUri),
+                timeout,
+                max_concurrency=limit,
+                idle_ttl=opts.idle_ttl,
+                isolation=opts.isolation,
+                queue_timeout=opts.queue_timeout,
+                max_queue=opts.max_queue,
+                executor=executor,
+                memory_size=endpoint.MemorySize,
+                name=name,
+            )
+            # Follow template changes on reload
+            used[key].timeout = timeout
+            used[key].memory_size = endpoint.MemorySize
+            used[key].pool.max_concurrency = limit
+        proxy = used[key]
+        handler = LambdaRequestHandler(
+            proxy, opts.payload_version, extra_headers,
+            max_body_size=opts.max_body_size
+            if opts.max_body_size is not None else MAX_BODY_SIZE,
+            server_timing=opts.server_timing,
+            cache=cache,
+            cache_ttl=get_cache_ttl(endpoint, ttls, settings),
+            single_flight=opts.single_flight,
+            compressor=compressor,
+        )
+        print(f"Registering route {endpoint}")
+        routes.append(web.RouteDef(endpoint.Method.upper(), endpoint.Path, handler.invoke, {}))
+
+    # Add a generic OPTIONS handler to encourage CORS to work
+    routes.append(web.RouteDef(
+        "OPTIONS", '$default', get_cors_options_handler(extra_headers), {}))
+
+    return routes, used
+
+
 def main():
     """
     Main entrypoint.
     """
+    if sys.argv[1:2] == ['bench']:
+        from lambda_gateway import bench
+        return bench.main(sys.argv[2:])
+
     # Parse opts
     opts = get_opts()
+    STARTUP.phase('options')
+
+    set_stream_logger('lambda_gateway')
 
     base_python_path = os.path.abspath(opts.base_python_path or os.path.curdir)
+    template_path = os.path.abspath(opts.SAM_TEMPLATE)
 
     # Load env vars
     if opts.env_vars_json and opts.SAM_TEMPLATE.endswith('.ts'):
@@ -131,12 +697,28 @@ def main():
     else:
         env_vars = load_env_vars(opts.env_vars_json)
         os.environ.update(env_vars)
+    STARTUP.phase('env vars')
 
     # Load SAM Template or CDK Stack
-    if opts.SAM_TEMPLATE.endswith('.ts'):
-        sam = CDKParser(opts.SAM_TEMPLATE)
-    else:
-        sam = SAM(opts.SAM_TEMPLATE)
+    sam = get_template(opts.SAM_TEMPLATE, opts.template_cache)
+    STARTUP.phase('template')
+
+    # So lambda functions can make use of asyncio without the problem
+    # of being nested within our outer http loop
+    if opts.nest_asyncio:
+        import nest_asyncio
+        nest_asyncio.apply()
+
+    from aiohttp import web
+
+    from lambda_gateway import (
+        compression, metrics, profiling, reloader, tracing)
+    from lambda_gateway.response_cache import ResponseCache
+    from lambda_gateway.router import Router
+    STARTUP.phase('imports')
+
+    if opts.trace:
+        tracing.configure(opts.trace)
 
     # TODO Maybe take an origin as a parameter
     extra_headers = {
@@ -145,24 +727,81 @@ def main():
         'Access-Control-Allow-Methods': 'GET,HEAD,PUT,PATCH,POST,DELETE',
     }
 
-    # Setup handler
-    routes = []
-    for endpoint in sam.get_endpoints():
-        proxy = EventProxy(endpoint.Handler, os.path.join(base_python_path, endpoint.CodeUri), opts.timeout)
-        handler = LambdaRequestHandler(proxy, opts.payload_version, extra_headers)
-        print(f"Registering route {endpoint}")
-        routes.append(web.RouteDef(endpoint.Method.upper(), endpoint.Path, handler.invoke, {}))
+    # Setup handlers behind a swappable router
+    cache = ResponseCache(opts.cache_size * 1024 * 1024,
+                          opts.cache_key_headers)
+    compressor = None
+    if opts.compress_min_size is not None:
+        compressor = compression.Compressor(
+            opts.compress_min_size,
+            opts.compress_types or compression.CONTENT_TYPES,
+            opts.compress_level,
+            cache_size=opts.compress_cache_size * 1024 * 1024,
+        )
+    routes, proxies = get_routes(
+        sam, opts, base_python_path, extra_headers, cache=cache,
+        compressor=compressor)
+    router = Router(routes)
+    STARTUP.phase('routes')
+
+    def on_change(paths):
+        """
+        Reload changed modules, and the routes if the template changed.
+        Cached responses are dropped.
+        """
+        if template_path in paths:
+            print('Template changed, rebuilding routes')
+            try:
+                routes, used = get_routes(
+                    get_template(opts.SAM_TEMPLATE, opts.template_cache),
+                    opts, base_python_path,
+                    extra_headers, proxies, cache, compressor)
+            except Exception as err:
+                print(f"Unable to reload template: {err}")
+            else:
+                for key in proxies.keys() - used.keys():
+                    proxies[key].pool.invalidate()
+                proxies.clear()
+                proxies.update(used)
+                router.set_routes(routes)
+        for proxy in reloader.reload(paths, proxies.values()):
+            print(f"Reloaded handler {proxy.handler}")
+        cache.clear()
 
     app = web.Application()
 
-    app.add_routes(routes)
+    metrics.REGISTRY.add_collector(metrics.get_pool_collector(proxies))
+    for name in opts.profile:
+        try:
+            profiling.start(profiling.find_proxy(name, proxies))
+        except (LookupError, ValueError) as err:
+            print(f"Unable to profile {name}: {err}")
+    app.add_routes([
+        web.get(metrics.METRICS_PATH, metrics.get_metrics_handler()),
+        *profiling.get_routes(proxies),
+        router.route(),
+    ])
 
-    # Add a generic OPTIONS handler to encourage CORS to work
-    app.add_routes([web.RouteDef("OPTIONS", r'/{path:.*}', get_cors_options_handler(extra_headers), {})])
+    if opts.prewarm:
+        app.on_startup.append(
+            get_prewarm_handler(proxies.values(), opts.prewarm))
 
     print(f"Run server at {opts.bind} port {opts.port}")
 
-    asyncio.run(run_server(app, opts.bind, opts.port, base_python_path, opts.watch))
+    def on_bind():
+        STARTUP.phase('bind')
+        if opts.startup_report:
+            STARTUP.report()
+
+    STARTUP.phase('app')
+    paths = [base_python_path, template_path]
+    if opts.workers > 1:
+        run_workers(app, opts.bind, opts.port, paths, opts.watch, on_change,
+                    opts.workers, on_bind)
+    else:
+        import asyncio
+        asyncio.run(run_server(app, opts.bind, opts.port, paths, opts.watch,
+                               on_change, on_bind=on_bind))
 
     os._exit(0) # OS exit because awatch thread seems to still be locked; without this it hangs
 
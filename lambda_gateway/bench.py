@@ -0,0 +1,453 @@
+"""
+Lambda Gateway benchmarks.
+
+    lambda-gateway bench http [--requests N] [--concurrency N] [--sleep S]
+                              [--output FILE] [--compare FILE] [-- ARGS...]
+    lambda-gateway bench router [--routes N] [--lookups N]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from lambda_gateway import __version__
+from lambda_gateway.router import Router
+from lambda_gateway.sam import SAM
+
+# Source checkout root, or the site-packages directory when installed
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Packaged copy of the root ``lambda_function.py``, so that the benchmark
+# also runs from an installed distribution
+SAMPLE_HANDLER = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'sample_handler.py')
+
+SAMPLE_TEMPLATE = """\
+Resources:
+  Function:
+    Type: AWS::Serverless::Function
+    Properties:
+      CodeUri: .
+      Handler: lambda_function.lambda_handler
+      Events:
+        HttpApiEvent:
+          Type: HttpApi
+          Properties:
+            Path: /
+            Method: get
+"""
+
+
+def get_template(routes):
+    """
+    Build a SAM template with the given number of HttpApi routes.
+
+    Every function has one static, two parameterized and one greedy route.
+    """
+    lines = ['Resources:']
+    for i in range(routes // 4):
+        lines += [
+            f'  Function{i}:',
+            '    Type: AWS::Serverless::Function',
+            '    Properties:',
+            '      CodeUri: .',
+            '      Handler: lambda_function.lambda_handler',
+            '      Events:',
+        ]
+        for j, (method, path) in enumerate([
+            ('get', f'/svc{i}/items'),
+            ('get', f'/svc{i}/items/{{id}}'),
+            ('post', f'/svc{i}/items/{{id}}/tags/{{tag}}'),
+            ('any', f'/svc{i}/files/{{proxy+}}'),
+        ]):
+            lines += [
+                f'        Event{j}:',
+                '          Type: HttpApi',
+                '          Properties:',
+                f'            Path: {path}',
+                f'            Method: {method}',
+            ]
+    return '\n'.join(lines) + '\n'
+
+
+def get_requests(count, routes):
+    """
+    Get random (method, path) requests matching the benchmark template.
+    """
+    rand = random.Random(0)
+    requests = []
+    for _ in range(count):
+        i = rand.randrange(routes // 4)
+        requests.append(rand.choice([
+            ('GET', f'/svc{i}/items'),
+            ('GET', f'/svc{i}/items/{rand.randrange(1000)}'),
+            ('POST', f'/svc{i}/items/{rand.randrange(1000)}/tags/x'),
+            ('PUT', f'/svc{i}/files/a/b/{rand.randrange(1000)}.txt'),
+        ]))
+    return requests
+
+
+async def handler(request):  # pragma: no cover
+    return web.Response()
+
+
+def bench_router(routes=1000, lookups=20000):
+    """
+    Compare route lookups of the compiled Router with aiohttp's router.
+
+    :returns dict: Lookups per second, by router
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'template.yaml')
+        with open(path, 'w') as f:
+            f.write(get_template(routes))
+        started = time.perf_counter()
+        endpoints = list(SAM(path).get_endpoints())
+        parse_time = time.perf_counter() - started
+    route_defs = [
+        web.RouteDef(x.Method, x.Path, handler, {}) for x in endpoints]
+    requests = get_requests(lookups, routes)
+    results = {'routes': len(route_defs), 'template_parse_s': parse_time}
+
+    started = time.perf_counter()
+    router = Router(route_defs)
+    results['compile_s'] = time.perf_counter() - started
+    started = time.perf_counter()
+    for method, path in requests:
+        route, _ = router.resolve(method, path)
+        assert route is not None
+    results['router_lookups_per_s'] = lookups / (time.perf_counter() - started)
+
+    # Baseline: aiohttp's UrlDispatcher, as used before the compiled router
+    dispatcher = web.UrlDispatcher()
+    for route in route_defs:
+        dispatcher.add_route(
+            '*' if route.method == 'any' else route.method.upper(),
+            route.path.replace('+}', ':.+}'), handler)
+    mocked = [make_mocked_request(method, path) for method, path in requests]
+
+    async def resolve_all():
+        for request in mocked:
+            match_info = await dispatcher.resolve(request)
+            assert match_info.http_exception is None
+
+    started = time.perf_counter()
+    asyncio.run(resolve_all())
+    results['aiohttp_lookups_per_s'] = \
+        lookups / (time.perf_counter() - started)
+    return results
+
+
+def get_free_port():
+    """
+    Get a free local TCP port.
+    """
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def get_percentiles(values):
+    """
+    Get p50/p95/p99 of a list of durations, in milliseconds.
+    """
+    if len(values) < 2:
+        values = values * 2 or [0.0, 0.0]
+    quantiles = statistics.quantiles(values, n=100, method='inclusive')
+    return {
+        'p50': quantiles[49] * 1000,
+        'p95': quantiles[94] * 1000,
+        'p99': quantiles[98] * 1000,
+    }
+
+
+def parse_server_timing(header):
+    """
+    Parse a Server-Timing header into durations (in seconds) by name.
+    """
+    timings = {}
+    for metric in header.split(','):
+        name, *params = metric.strip().split(';')
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'dur':
+                timings[name] = float(value) / 1000
+    return timings
+
+
+async def wait_for_port(port, process, timeout=30):
+    """
+    Wait until the server accepts connections.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(
+                f'Server exited with code {process.returncode}')
+        try:
+            _, writer = await asyncio.open_connection('localhost', port)
+        except OSError:
+            await asyncio.sleep(0.05)
+        else:
+            writer.close()
+            return
+    raise RuntimeError(f'Server did not start within {timeout}s')
+
+
+async def load(url, requests, concurrency):
+    """
+    Send requests from concurrent clients and record their timings.
+
+    :returns dict: Latencies, per-phase Server-Timing durations, statuses
+    """
+    latencies = []
+    phases = {}
+    statuses = {}
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def client(session):
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                async with session.get(url) as res:
+                    await res.read()
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            statuses[res.status] = statuses.get(res.status, 0) + 1
+            timing = res.headers.get('Server-Timing')
+            for name, value in parse_server_timing(timing or '').items():
+                phases.setdefault(name, []).append(value)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {
+        'elapsed_s': elapsed,
+        'rps': len(latencies) / elapsed,
+        'latency_ms': get_percentiles(latencies),
+        'phases_ms': {k: get_percentiles(v) for k, v in phases.items()},
+        'statuses': {str(k): v for k, v in sorted(statuses.items())},
+        'errors': errors,
+    }
+
+
+def bench_http(requests=2000, concurrency=16, sleep=0, template=None,
+               path='/', warmup=50, server_args=()):
+    """
+    Start the gateway in a subprocess and drive it over HTTP.
+
+    Without a template, a sample one is written for a copy of the root
+    ``lambda_function.py``, whose ``SLEEP`` knob is set from ``sleep``.
+    The server runs with ``--server-timing`` so that event build, invoke
+    and response build times are reported separately.
+
+    :returns dict: Benchmark results
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        if template is None:
+            template = os.path.join(tmp, 'template.yaml')
+            with open(template, 'w') as f:
+                f.write(SAMPLE_TEMPLATE)
+            shutil.copy(
+                SAMPLE_HANDLER, os.path.join(tmp, 'lambda_function.py'))
+        port = get_free_port()
+        env = {**os.environ, 'SLEEP': str(sleep)}
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [
+            ROOT,
+            env.get('PYTHONPATH'),
+        ]))
+        cmd = [
+            sys.executable, '-m', 'lambda_gateway',
+            '-p', str(port), '--server-timing', *server_args, template,
+        ]
+        process = subprocess.Popen(
+            cmd, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        async def run():
+            await wait_for_port(port, process)
+            url = f'http://localhost:{port}{path}'
+            if warmup:
+                await load(url, warmup, min(warmup, concurrency))
+            return await load(url, requests, concurrency)
+
+        try:
+            results = asyncio.run(run())
+        finally:
+            process.terminate()
+            process.wait()
+    return {
+        'version': __version__,
+        'python': sys.version.split()[0],
+        'args': {
+            'requests': requests,
+            'concurrency': concurrency,
+            'sleep': sleep,
+            'server_args': list(server_args),
+        },
+        **results,
+    }
+
+
+def compare(results, baseline):
+    """
+    Get the relative change of each metric from a baseline, in percent.
+    """
+    def flatten(data, prefix=''):
+        for key, value in data.items():
+            if isinstance(value, dict):
+                yield from flatten(value, f'{prefix}{key}.')
+            elif isinstance(value, (int, float)):
+                yield f'{prefix}{key}', value
+
+    before = dict(flatten(baseline))
+    deltas = {}
+    for key, value in flatten(results):
+        if before.get(key):
+            deltas[key] = (value - before[key]) / before[key] * 100
+    return deltas
+
+
+def print_http_results(results, deltas=None):
+    """
+    Print HTTP benchmark results, with changes from a baseline.
+    """
+    deltas = deltas or {}
+
+    def line(label, key, value, unit):
+        delta = f'  ({deltas[key]:+.1f}%)' if key in deltas else ''
+        print(f'{label:>24}: {value:,.2f}{unit}{delta}')
+
+    line('requests/s', 'rps', results['rps'], '')
+    for name, value in results['latency_ms'].items():
+        line(f'latency {name}', f'latency_ms.{name}', value, ' ms')
+    for phase, percentiles in results['phases_ms'].items():
+        for name, value in percentiles.items():
+            line(f'{phase} {name}', f'phases_ms.{phase}.{name}', value, ' ms')
+    print(f'{"statuses":>24}: {results["statuses"]}')
+    print(f'{"errors":>24}: {results["errors"]}')
+
+
+def get_opts(argv=None):
+    """
+    Get CLI options.
+    """
+    parser = argparse.ArgumentParser(
+        prog='lambda-gateway bench',
+        description='Run Lambda Gateway benchmarks',
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+    http = commands.add_parser(
+        'http', help='End-to-end HTTP load benchmark')
+    http.add_argument(
+        '-n', '--requests',
+        default=2000,
+        help='Number of requests to send [default: 2000]',
+        metavar='N',
+        type=int,
+    )
+    http.add_argument(
+        '-c', '--concurrency',
+        default=16,
+        help='Number of concurrent clients [default: 16]',
+        metavar='N',
+        type=int,
+    )
+    http.add_argument(
+        '--sleep',
+        default=0,
+        help='SLEEP seconds for the sample handler [default: 0]',
+        metavar='S',
+        type=float,
+    )
+    http.add_argument(
+        '--template',
+        help='SAM template to serve instead of the sample one',
+        metavar='TEMPLATE',
+    )
+    http.add_argument(
+        '--path',
+        default='/',
+        help='Request path [default: /]',
+    )
+    http.add_argument(
+        '-o', '--output',
+        help='Save results as JSON',
+        metavar='FILE',
+    )
+    http.add_argument(
+        '--compare',
+        help='Compare with results saved by an earlier run',
+        metavar='FILE',
+    )
+    http.add_argument(
+        'server_args',
+        help='Extra lambda-gateway options, after --',
+        nargs=argparse.REMAINDER,
+    )
+    router = commands.add_parser(
+        'router', help='Route lookup micro-benchmark')
+    router.add_argument(
+        '--routes',
+        default=1000,
+        help='Number of routes in the template [default: 1000]',
+        metavar='N',
+        type=int,
+    )
+    router.add_argument(
+        '--lookups',
+        default=20000,
+        help='Number of lookups to time [default: 20000]',
+        metavar='N',
+        type=int,
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Benchmark entrypoint.
+    """
+    opts = get_opts(argv)
+    if opts.command == 'http':
+        server_args = opts.server_args
+        if server_args[:1] == ['--']:
+            server_args = server_args[1:]
+        results = bench_http(
+            opts.requests, opts.concurrency, opts.sleep,
+            opts.template, opts.path, server_args=server_args)
+        deltas = None
+        if opts.compare:
+            with open(opts.compare) as f:
+                deltas = compare(results, json.load(f))
+        print_http_results(results, deltas)
+        if opts.output:
+            with open(opts.output, 'w') as f:
+                json.dump(results, f, indent=2)
+    elif opts.command == 'router':
+        results = bench_router(opts.routes, opts.lookups)
+        for key, value in results.items():
+            print(f'{key:>24}: {value:,.3f}'
+                  if isinstance(value, float) else f'{key:>24}: {value}')
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
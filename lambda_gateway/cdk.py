@@ -1,99 +1,497 @@
+"""
+TypeScript CDK stack parser.
+
+Stacks are read by a tokenizer that scans the source once, skipping
+comments and strings, then by a pass over the tokens that picks out:
+
+* functions, created with ``new Function(...)`` or a factory function
+  such as ``createLambda(scope, id, handler, ...)`` declared in the stack,
+* each function's ``Code.fromAsset()`` directory, ``timeout`` and
+  ``memorySize``, from its own props or its factory's body,
+* ``addRoutes({path, methods, integration})`` routes,
+* the ``getLambdaEnv()`` environment mapping.
+
+Both passes are linear in the size of the source. Parsed stacks are cached
+by the SHA-256 of their source.
+"""
+import hashlib
+import os
 import re
 from collections import namedtuple
-import os
 
-Endpoint = namedtuple("Endpoint", "CodeUri Handler Path Method")
+from lambda_gateway.sam import Endpoint
+
+# Whitespace and comments, then a string, name, number or punctuation,
+# which is optional so that trailing comments never backtrack
+TOKEN = re.compile(r'''
+    (?:\s+|//[^\n]*|/\*(?:[^*]|\*(?!/))*(?:\*/)?)*
+    (?:
+        ('(?:[^'\\\n]|\\.)*'?|"(?:[^"\\\n]|\\.)*"?|`(?:[^`\\]|\\.)*`?)
+      | ([A-Za-z_$][\w$]*)
+      | (\d[\w.]*)
+      | (.)
+    )?
+''', re.VERBOSE | re.DOTALL)
+
+OPENING = {'(': ')', '[': ']', '{': '}'}
+
+# Tokens the stack pass looks at
+KEYWORDS = {
+    ';', '{', ')', '=', '.', 'const', 'let', 'var', 'function', 'def', 'Code',
+}
+
+ENV_VAR = re.compile(r'[A-Z0-9_]+$')
+
+DURATIONS = {'millis': 0.001, 'seconds': 1, 'minutes': 60, 'hours': 3600}
+
+Token = namedtuple('Token', 'kind value')
+
+Stack = namedtuple('Stack', 'endpoints env_mapping')
+
+# Parsed stacks by source hash
+_stacks = {}
+
 
 class CDKException(Exception):
     pass
 
+
+def tokenize(code):
+    """
+    Split TypeScript source into tokens, dropping whitespace and comments.
+
+    String tokens hold the string's content, without quotes.
+
+    :param str code: TypeScript source
+    :returns list: Token list
+    """
+    tokens = []
+    append = tokens.append
+    for string, name, number, punct in TOKEN.findall(code):
+        if name:
+            append(Token('name', name))
+        elif punct:
+            append(Token('punct', punct))
+        elif string:
+            end = -1 if len(string) > 1 and string[-1] == string[0] \
+                else None
+            append(Token('string', string[1:end]))
+        elif number:
+            append(Token('number', number))
+    return tokens
+
+
+def match_brackets(tokens):
+    """
+    Get the index of the closing bracket of each opening bracket.
+
+    Unbalanced brackets close at the end of the source.
+
+    :returns dict: Closing token index by opening token index
+    """
+    closing = {}
+    stack = []
+    for i, token in enumerate(tokens):
+        if token.kind != 'punct':
+            continue
+        if token.value in OPENING:
+            stack.append(i)
+        elif stack and token.value == OPENING[tokens[stack[-1]].value]:
+            closing[stack.pop()] = i
+    for i in stack:
+        closing[i] = len(tokens)
+    return closing
+
+
+class Parser:
+    """
+    Pass over the tokens of a stack.
+
+    :param list tokens: Tokens from tokenize()
+    """
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.closing = match_brackets(tokens)
+        # Token values, without strings, for matching names and punctuation
+        self.words = [
+            None if token.kind == 'string' else token.value
+            for token in tokens]
+
+    def at(self, i, *values):
+        """
+        Whether the tokens from ``i`` are the names or punctuation
+        ``values``.
+        """
+        return i >= 0 and self.words[i:i + len(values)] == list(values)
+
+    def skip(self, i):
+        """
+        Get the index after the token at ``i``, or after its brackets.
+        """
+        return self.closing.get(i, i) + 1
+
+    def split(self, start, end):
+        """
+        Split a token range on its top-level commas.
+
+        :returns list: (start, end) ranges
+        """
+        words = self.words
+        ranges = []
+        i = item = start
+        while i < end:
+            if words[i] == ',':
+                ranges.append((item, i))
+                item = i + 1
+                i += 1
+            else:
+                i = self.skip(i)
+        if item < end:
+            ranges.append((item, end))
+        return ranges
+
+    def get_object(self, start, end):
+        """
+        Get the top-level properties of an object literal.
+
+        :param int start: Index of the opening brace
+        :returns dict: (start, end) value range by key
+        """
+        props = {}
+        if not self.at(start, '{'):
+            return props
+        for s, e in self.split(start + 1, min(end, self.closing[start])):
+            key = self.tokens[s]
+            if key.kind not in ('name', 'string'):
+                continue
+            if self.at(s + 1, ':'):
+                props[key.value] = (s + 2, e)
+            elif e == s + 1:
+                props[key.value] = (s, e)  # Shorthand property
+        return props
+
+    def get_string(self, start, end):
+        """
+        Get the string a value range is, if any.
+        """
+        if end == start + 1 and self.tokens[start].kind == 'string':
+            return self.tokens[start].value
+        return None
+
+    def find(self, start, end, *values):
+        """
+        Get the index of the first occurrence of ``values`` in a range.
+        """
+        words = self.words
+        i = start
+        while True:
+            try:
+                i = words.index(values[0], i, end)
+            except ValueError:
+                return None
+            if self.at(i, *values):
+                return i
+            i += 1
+
+    def get_call_args(self, i):
+        """
+        Get the argument ranges of the call whose ``(`` is at ``i``.
+        """
+        return self.split(i + 1, self.closing[i])
+
+    def get_asset(self, start, end):
+        """
+        Get the argument range of the first ``Code.fromAsset()`` in a range.
+        """
+        i = self.find(start, end, 'Code', '.', 'fromAsset', '(')
+        if i is None:
+            return None
+        args = self.get_call_args(i + 3)
+        return args[0] if args else None
+
+    def get_number(self, start, end, key):
+        """
+        Get a numeric property, e.g. ``memorySize: 512``, in a range.
+        """
+        i = self.find(start, end, key, ':')
+        if i is None or i + 2 >= end:
+            return None
+        token = self.tokens[i + 2]
+        if token.kind == 'number':
+            return int(float(token.value))
+        return None
+
+    def get_timeout(self, start, end):
+        """
+        Get a ``timeout: Duration.seconds(N)`` property in a range, in
+        seconds.
+        """
+        i = self.find(start, end, 'timeout', ':', 'Duration', '.')
+        if i is None or not self.at(i + 5, '('):
+            return None
+        unit = self.tokens[i + 4].value
+        value = self.tokens[i + 6]
+        if unit not in DURATIONS or value.kind != 'number':
+            return None
+        return int(float(value.value) * DURATIONS[unit])
+
+
+class StackParser(Parser):
+    """
+    Extract functions, routes and the environment mapping of a stack.
+    """
+    def parse(self):
+        tokens = self.tokens
+        functions = {}
+        assignments = []
+        routes = []
+        assets = []
+        words = self.words
+        declared = None
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            word = words[i]
+            if word not in KEYWORDS:
+                i += 1
+                continue
+            if word in (';', '{', ')'):
+                declared = None
+                i += 1
+            elif token.kind == 'name' \
+                    and word in ('const', 'let', 'var') \
+                    and i + 1 < len(tokens) and tokens[i + 1].kind == 'name':
+                # const NAME[: TYPE] = ...
+                declared = tokens[i + 1].value
+                i += 2
+            elif token.kind == 'name' and word in ('function', 'def') \
+                    and self.at(i + 2, '(') and tokens[i + 1].kind == 'name':
+                # function NAME(params) { body }
+                params = self.closing[i + 2]
+                if self.at(params + 1, '{'):
+                    # Parameter names and default values
+                    names = []
+                    defaults = {}
+                    for s, e in self.split(i + 3, params):
+                        names.append(tokens[s].value)
+                        default = self.find(s, e, '=')
+                        if default is not None:
+                            defaults[tokens[s].value] = (default + 1, e)
+                    body = (params + 1, self.closing[params + 1])
+                    functions[tokens[i + 1].value] = (names, defaults, body)
+                i += 3
+            elif self.at(i, '=') and not self.at(i + 1, '=') \
+                    and not self.at(i + 1, '>') and (
+                        declared or tokens[i - 1].kind == 'name'):
+                # NAME = [new] CALLEE(args)
+                target = declared or tokens[i - 1].value
+                declared = None
+                j = i + 1
+                is_new = self.at(j, 'new')
+                if is_new:
+                    j += 1
+                # Dotted callee, e.g. lambda.Function
+                while self.at(j + 1, '.') and j + 2 < len(tokens):
+                    j += 2
+                callee = tokens[j].value \
+                    if j < len(tokens) and tokens[j].kind == 'name' else None
+                if callee and self.at(j + 1, '('):
+                    assignments.append((target, callee, is_new, j + 1))
+                i += 1
+            elif self.at(i, '.', 'addRoutes', '('):
+                routes.append(i + 2)
+                i += 3
+            elif self.at(i, 'Code', '.', 'fromAsset', '('):
+                assets.append(self.get_asset(i, i + 4 + 1))
+                i += 4
+            else:
+                i += 1
+
+        default_asset = None
+        for asset in assets:
+            if asset is not None:
+                default_asset = self.get_string(*asset)
+                if default_asset is not None:
+                    break
+
+        lambdas = {}
+        for var, callee, is_new, paren in assignments:
+            function = self.get_function(
+                callee, is_new, paren, functions, default_asset)
+            if function is not None:
+                lambdas[var] = function
+
+        endpoints = []
+        for paren in routes:
+            endpoints += self.get_routes(paren, lambdas)
+        return Stack(endpoints, self.get_env_mapping(functions))
+
+    def get_function(self, callee, is_new, paren, functions,
+                     default_asset):
+        """
+        Get the (handler, code URI, timeout, memory size) of a function.
+
+        :returns tuple: Function, or None if the call creates no function
+        """
+        args = self.get_call_args(paren)
+        end = self.closing[paren]
+        if is_new and callee == 'Function':
+            if len(args) < 3:
+                return None
+            props = self.get_object(args[2][0], args[2][1])
+            handler = self.get_string(*props.get('handler', (0, 0)))
+            if handler is None:
+                return None
+            asset = self.get_asset(*props.get('code', (0, 0)))
+            code_uri = self.get_string(*asset) if asset else None
+            return (handler, code_uri or default_asset or '.',
+                    self.get_timeout(paren, end),
+                    self.get_number(paren, end, 'memorySize'))
+        if is_new:
+            return None
+
+        # Factory function, e.g. createLambda(scope, id, handler, ...)
+        params, defaults, body = functions.get(callee, ([], {}, (0, 0)))
+        if 'handler' in params:
+            index = params.index('handler')
+        elif callee == 'createLambda':
+            index = 2
+        else:
+            return None
+
+        def get_arg(name):
+            if name in params and params.index(name) < len(args):
+                return args[params.index(name)]
+            return defaults.get(name)
+
+        handler = self.get_string(*args[index]) \
+            if index < len(args) else None
+        if handler is None:
+            return None
+
+        # Code.fromAsset() in the call, else in the factory's body, where
+        # its path may be one of the factory's parameters
+        code_uri = None
+        asset = self.get_asset(paren, end)
+        if asset is None:
+            asset = self.get_asset(*body)
+            if asset is not None and asset[1] == asset[0] + 1:
+                arg = get_arg(self.tokens[asset[0]].value)
+                asset = arg or asset
+        if asset is not None:
+            code_uri = self.get_string(*asset)
+
+        timeout = self.get_timeout(paren, end)
+        if timeout is None:
+            timeout = self.get_timeout(*body)
+        memory_size = self.get_number(paren, end, 'memorySize')
+        if memory_size is None:
+            memory_size = self.get_number(*body, 'memorySize')
+        return (handler, code_uri or default_asset or '.',
+                timeout, memory_size)
+
+    def get_routes(self, paren, lambdas):
+        """
+        Get the endpoints of an ``addRoutes({...})`` call.
+        """
+        args = self.get_call_args(paren)
+        if not args:
+            return []
+        props = self.get_object(*args[0])
+        path = self.get_string(*props.get('path', (0, 0)))
+        integration = props.get('integration')
+        if path is None or integration is None:
+            return []
+
+        # new HttpLambdaIntegration('Id', fn)
+        start, end = integration
+        var = None
+        i = self.find(start, end, '(')
+        if i is not None:
+            integration_args = self.get_call_args(i)
+            if integration_args:
+                s, e = integration_args[-1]
+                var = self.tokens[s].value if e == s + 1 else None
+        if var not in lambdas:
+            return []
+
+        methods = []
+        if 'methods' in props:
+            start, end = props['methods']
+            methods = [
+                self.tokens[i + 2].value
+                for i in range(start, end - 2)
+                if self.at(i, 'HttpMethod', '.')
+            ]
+        handler, code_uri, timeout, memory_size = lambdas[var]
+        return [
+            Endpoint(code_uri, handler, path, method.lower(),
+                     timeout, memory_size, var)
+            for method in methods or ['GET']
+        ]
+
+    def get_env_mapping(self, functions):
+        """
+        Get the ``KEY: obj.attr`` entries of ``getLambdaEnv()``.
+
+        :returns dict: Props key by env var, or None for values that are
+            not props
+        """
+        mapping = {}
+        if 'getLambdaEnv' not in functions:
+            return mapping
+        _, _, (start, end) = functions['getLambdaEnv']
+        tokens = self.tokens
+        for i in range(start, end - 4):
+            key = tokens[i]
+            if key.kind not in ('name', 'string') \
+                    or not self.at(i + 1, ':') \
+                    or tokens[i + 2].kind != 'name' \
+                    or not self.at(i + 3, '.') \
+                    or tokens[i + 4].kind != 'name' \
+                    or not (self.at(i + 5, ',') or self.at(i + 5, '}')):
+                continue
+            if tokens[i + 2].value == 'props' and ENV_VAR.match(key.value):
+                mapping[key.value] = tokens[i + 4].value
+            else:
+                mapping[key.value] = None
+        return mapping
+
+
+def parse(code):
+    """
+    Parse a stack, or get it from the cache of parsed stacks.
+
+    :param str code: TypeScript source
+    :returns Stack: Parsed stack
+    """
+    digest = hashlib.sha256(code.encode()).hexdigest()
+    try:
+        return _stacks[digest]
+    except KeyError:
+        stack = _stacks[digest] = StackParser(tokenize(code)).parse()
+        return stack
+
+
 class CDKParser:
     def __init__(self, ts_filename):
         with open(ts_filename, "rt") as f:
             self.ts_code = f.read()
+        self.stack = parse(self.ts_code)
 
     def get_endpoints(self):
-        # 1. Map variable names to (handler, code_uri)
-        lambda_vars = {}
-        create_lambda_pattern = re.compile(r"const\s+(\w+)\s*=\s*createLambda\([^,]+,\s*['\"]([^'\"]+)['\"],\s*['\"]([^'\"]+)['\"][^)]*\)")
-        for match in create_lambda_pattern.finditer(self.ts_code):
-            varname = match.group(1)
-            id_ = match.group(2)
-            handler = match.group(3)
-            code_uri = self._infer_code_uri()
-            lambda_vars[varname] = (handler, code_uri)
-
-        # 2. Find httpApi.addRoutes calls
-        # Example: httpApi.addRoutes({ path: '/configuration/start', methods: [HttpMethod.GET], integration: new HttpLambdaIntegration('CanvaConfigurationStartIntegration', canvaConfigurationStartFn), });
-        add_routes_pattern = re.compile(
-            r"addRoutes\s*\(\s*{[^}]*path:\s*['\"]([^'\"]+)['\"],[^}]*methods:\s*\[([^\]]+)\][^}]*integration:\s*new HttpLambdaIntegration\([^,]+,\s*(\w+)\)[^}]*}\s*\)",
-            re.DOTALL)
-        for match in add_routes_pattern.finditer(self.ts_code):
-            path = match.group(1)
-            methods_str = match.group(2)
-            integration_var = match.group(3)
-            # Parse methods (e.g., HttpMethod.GET, HttpMethod.POST)
-            methods = re.findall(r'HttpMethod\.([A-Z]+)', methods_str)
-            if not methods:
-                methods = ['GET']  # Default to GET if not found
-            for method in methods:
-                method = method.lower()
-                if integration_var in lambda_vars:
-                    handler, code_uri = lambda_vars[integration_var]
-                    yield Endpoint(code_uri, handler, path, method)
-
-        # 3. Fallback: yield any createLambda not referenced in addRoutes (with guessed path/method)
-        for varname, (handler, code_uri) in lambda_vars.items():
-            # If not already yielded
-            # (This is a simple fallback; could be improved)
-            pass  # Do not yield fallback for now, only yield those with routes
-
-    def _infer_code_uri(self):
-        # Naive: look for Code.fromAsset('...') in the file
-        m = re.search(r"Code\.fromAsset\(['\"]([^'\"]+)['\"]\)", self.ts_code)
-        if m:
-            return m.group(1)
-        return '.' 
+        return iter(self.stack.endpoints)
 
     def get_env_var_mapping(self):
         """
         Parse getLambdaEnv function to map env var names to props keys.
+
+        Values that are not ``props.*`` are read from the environment.
+
         Returns a dict: { ENV_VAR: props_key, ... }
         """
-        mapping = {}
-        # Find start of getLambdaEnv function
-        m = re.search(r'function\s+getLambdaEnv\([^)]*\)\s*{', self.ts_code)
-        if not m:
-            m = re.search(r'def\s+getLambdaEnv\([^)]*\)\s*{', self.ts_code)
-        if not m:
-            return mapping
-        start = m.end() - 1  # position of the opening brace
-        code = self.ts_code
-        brace_count = 0
-        body = ''
-        i = start
-        while i < len(code):
-            c = code[i]
-            if c == '{':
-                brace_count += 1
-            elif c == '}':
-                brace_count -= 1
-                if brace_count == 0:
-                    body += c
-                    break
-            body += c
-            i += 1
-        # Now parse lines for ENV_VAR: props.propsKey
-        for line in body.splitlines():
-            line = line.strip().rstrip(',')
-            m2 = re.match(r'([A-Z0-9_]+)\s*:\s*props\.([a-zA-Z0-9_]+)\s*(,|$)', line)
-            if m2:
-                env_var, props_key = m2.group(1), m2.group(2)
-                mapping[env_var] = props_key
-            else:
-                # Match lines like DDBTableName: table.tableName,
-                m3 = re.match(r'([A-Za-z0-9_]+)\s*:\s*[a-zA-Z0-9_]+\.[a-zA-Z0-9_]+\s*(,|$)', line)
-                if m3:
-                    env_var = m3.group(1)
-                    mapping[env_var] = os.environ.get(env_var, "")
-        return mapping 
\ No newline at end of file
+        return {
+            env_var: props_key if props_key is not None
+            else os.environ.get(env_var, "")
+            for env_var, props_key in self.stack.env_mapping.items()
+        }
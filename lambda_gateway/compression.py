@@ -0,0 +1,183 @@
+"""
+Response compression.
+
+Handler responses are compressed with the best encoding the client accepts
+(``br`` when the brotli package is installed, then ``gzip``), if they are
+large enough, of a compressible content type and not already encoded.
+Bodies of ``offload_size`` bytes or more are compressed in a thread, off
+the event loop; zlib and brotli release the GIL while compressing.
+
+Compressed bodies are kept in a small LRU cache keyed by a hash of the
+body, so that repeated identical responses (e.g. served from the response
+cache) are not compressed again.
+"""
+import asyncio
+import collections
+import hashlib
+import threading
+import zlib
+
+from lambda_gateway import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content types compressed by default; ``text/`` matches all text types
+CONTENT_TYPES = (
+    'text/',
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+)
+
+# Encodings by order of preference
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+
+def get_encoding(accept_encoding):
+    """
+    Choose a response encoding from an Accept-Encoding header.
+
+    The encoding with the highest q-value wins, ties going to the preferred
+    encoding; ``*`` matches encodings not listed and ``q=0`` refuses one.
+
+    :param str accept_encoding: Accept-Encoding header value, or None
+    :returns str: Encoding, or None to send the body as is
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.lower().split(','):
+        coding, _, params = item.partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip()] = weight
+    default = weights.get('*', 0.0)
+    best = max(ENCODINGS, key=lambda coding: weights.get(coding, default))
+    return best if weights.get(best, default) > 0 else None
+
+
+def compress(body, encoding, level):
+    """
+    Compress a body.
+
+    :param bytes body: Body
+    :param str encoding: ``br`` or ``gzip``
+    :param int level: Compression level, 1-9 (brotli quality for ``br``)
+    :returns bytes: Compressed body
+    """
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(body) + compressor.flush()
+
+
+class Compressor:
+    """
+    Compress handler responses for clients that accept it.
+
+    :param int min_size: Smallest body to compress, in bytes
+    :param tuple content_types: Compressed content types, or prefixes
+        ending with ``/``
+    :param int level: Compression level
+    :param int offload_size: Smallest body to compress in a thread
+    :param int cache_size: Maximum size of cached compressed bodies, in
+        bytes; 0 to disable the cache
+    """
+    def __init__(self, min_size=1024, content_types=CONTENT_TYPES, level=6,
+                 offload_size=64 * 1024, cache_size=8 * 1024 * 1024):
+        self.min_size = min_size
+        self.content_types = tuple(content_types)
+        self.level = level
+        self.offload_size = offload_size
+        self.cache_size = cache_size
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def is_compressible(self, response):
+        """
+        Whether a response may be compressed, whatever the client accepts.
+
+        :param web.Response response: Response with a bytes body
+        """
+        headers = response.headers
+        if response.status in (204, 206, 304) \
+                or 'Content-Encoding' in headers \
+                or 'no-transform' in headers.get('Cache-Control', '') \
+                or not isinstance(response.body, bytes) \
+                or len(response.body) < self.min_size:
+            return False
+        content_type = headers.get('Content-Type', '').split(';')[0].strip()
+        return any(
+            content_type.startswith(allowed) if allowed.endswith('/')
+            else content_type == allowed
+            for allowed in self.content_types)
+
+    async def compress_response(self, request, response):
+        """
+        Compress a response in place if the request accepts it.
+
+        Compressible responses vary on Accept-Encoding, compressed or not.
+
+        :param web.Request request: Request
+        :param web.Response response: Response with a bytes body
+        :returns web.Response: The response
+        """
+        if not self.is_compressible(response):
+            return response
+        response.headers.add('Vary', 'Accept-Encoding')
+        encoding = get_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        body = response.body
+        if len(body) >= self.offload_size:
+            compressed = await asyncio.get_running_loop().run_in_executor(
+                None, self.get_compressed, body, encoding)
+        else:
+            compressed = self.get_compressed(body, encoding)
+        if len(compressed) >= len(body):
+            return response
+
+        response.body = compressed
+        response.headers['Content-Encoding'] = encoding
+        response.headers.popall('Content-Length', None)
+        metrics.COMPRESSED_RESPONSES.inc(encoding)
+        return response
+
+    def get_compressed(self, body, encoding):
+        """
+        Get a compressed body, from the cache or by compressing it.
+
+        Safe to call from any thread.
+        """
+        if not self.cache_size:
+            return compress(body, encoding, self.level)
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        with self.lock:
+            compressed = self.entries.get(key)
+            if compressed is not None:
+                self.entries.move_to_end(key)
+                metrics.COMPRESSION_CACHE_HITS.inc(encoding)
+                return compressed
+
+        compressed = compress(body, encoding, self.level)
+        if len(compressed) > self.cache_size:
+            return compressed
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = compressed
+                self.size += len(compressed)
+            while self.size > self.cache_size:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+        return compressed
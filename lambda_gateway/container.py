@@ -0,0 +1,482 @@
+import asyncio
+import collections
+import inspect
+import multiprocessing
+import time
+
+from lambda_gateway import executors, logger, tracing
+
+# Seconds terminated workers get to exit before they are killed
+KILL_TIMEOUT = 1.0
+
+
+class Container:
+    """
+    Warm execution environment for a Lambda function.
+
+    A container serves one invocation at a time and keeps its handler, and
+    with it the handler module's state, alive between invocations.
+
+    :param function handler: Lambda handler function
+    :param Executor executor: Thread pool for synchronous handlers
+        [default: the shared handlers pool]
+    """
+    def __init__(self, handler, executor=None):
+        self.handler = handler
+        self.executor = executor
+        self.is_async = inspect.iscoroutinefunction(handler)
+        self.generation = 0
+        self.init_duration = 0.0
+        self.invocations = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def alive(self):
+        return True
+
+    async def invoke(self, event, context=None, profiler=None):
+        """
+        Invoke the Lambda handler.
+
+        ``async def`` handlers are awaited directly on the event loop; plain
+        functions run in the container's executor.
+
+        :param dict event: Lambda event object
+        :param Context context: Mock Lambda context
+        :param Profiler profiler: Sampling profiler for the invocation
+        :returns dict: Lambda invocation result
+        """
+        handler = self.handler
+        if profiler is not None:
+            handler = profiler.wrap(handler)
+        if self.is_async:
+            return await handler(event, context)
+        executor = self.executor or executors.get_executor()
+        if tracing.current_span() is None:
+            return await executor.run(handler, event, context)
+
+        # Record how long the call waited for an executor thread
+        submitted = time.time_ns()
+        started = []
+
+        def run():
+            started.append(time.time_ns())
+            return handler(event, context)
+
+        try:
+            return await executor.run(run)
+        finally:
+            if started:
+                tracing.add_span('executor_queue', submitted, started[0])
+
+    def stop(self):
+        """
+        Release resources held by the container.
+        """
+
+
+class WorkerError(Exception):
+    pass
+
+
+class TooManyRequestsException(Exception):
+    pass
+
+
+class ProcessContainer(Container):
+    """
+    Container running the Lambda handler in a long-lived worker process.
+
+    Events and results are pickled over a pipe. A worker busy with an
+    invocation that gets cancelled (e.g. timed out) is terminated, since
+    its late result would otherwise be read by the next invocation, and
+    killed if it has not exited after ``KILL_TIMEOUT`` seconds.
+
+    :param Process process: Worker process
+    :param Connection conn: Parent end of the worker pipe
+    """
+    def __init__(self, process, conn):
+        super().__init__(None)
+        self.process = process
+        self.conn = conn
+
+    @classmethod
+    async def start(cls, handler, code_path):
+        """
+        Spawn a worker process and wait for it to load the handler.
+
+        :param str handler: Handler spec, e.g. ``app.lambda_handler``
+        :param str code_path: Absolute path to the function code
+        :returns ProcessContainer: Ready container
+        """
+        ctx = multiprocessing.get_context('spawn')
+        conn, child_conn = ctx.Pipe()
+        process = ctx.Process(
+            target=serve,
+            args=(child_conn, handler, code_path),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        container = cls(process, conn)
+        try:
+            await container.recv()
+        except BaseException:
+            container.stop()
+            raise
+        return container
+
+    @property
+    def alive(self):
+        return not self.conn.closed and self.process.is_alive()
+
+    async def invoke(self, event, context=None, profiler=None):
+        """
+        Invoke the Lambda handler in the worker process.
+
+        Profiling is not supported across processes; ``profiler`` is
+        ignored.
+
+        :param dict event: Lambda event object
+        :param Context context: Mock Lambda context
+        :returns dict: Lambda invocation result
+        """
+        self.conn.send((event, context))
+        try:
+            return await self.recv()
+        except asyncio.CancelledError:
+            logger.warning(
+                'Terminating worker %d of cancelled invocation',
+                self.process.pid)
+            self.stop()
+            raise
+
+    async def recv(self):
+        """
+        Wait for the next reply from the worker.
+
+        :returns object: Reply payload
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            ready = loop.create_future()
+            fd = self.conn.fileno()
+            loop.add_reader(
+                fd, lambda: ready.done() or ready.set_result(None))
+        except NotImplementedError:  # pragma: no cover
+            reply = await loop.run_in_executor(None, self.conn.recv)
+        else:
+            try:
+                await ready
+            finally:
+                loop.remove_reader(fd)
+            try:
+                reply = self.conn.recv()
+            except EOFError:
+                self.stop()
+                self.process.join(1)
+                raise WorkerError(
+                    f'Worker exited with code {self.process.exitcode}')
+        status, payload = reply
+        if status == 'error':
+            raise WorkerError(payload)
+        return payload
+
+    def stop(self):
+        """
+        Close the pipe and terminate the worker process.
+        """
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.terminate()
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            loop.call_later(KILL_TIMEOUT, self.kill)
+
+    def kill(self):
+        """
+        Kill the worker process if it ignored termination.
+        """
+        if self.process.is_alive():
+            logger.warning('Killing worker %d', self.process.pid)
+            self.process.kill()
+        self.process.join(0)
+
+
+def serve(conn, handler, code_path):
+    """
+    Worker process main loop.
+
+    Loads the handler once, then invokes it for each event received until
+    the parent closes the pipe. ``async def`` handlers run on an event loop
+    kept for the worker's lifetime.
+    """
+    from lambda_gateway.event_proxy import load_handler
+    from lambda_gateway.streaming import materialize
+    try:
+        func = load_handler(handler, code_path)
+    except Exception as err:
+        conn.send(('error', str(err)))
+        return
+    conn.send(('ok', None))
+    loop = None
+    while True:
+        try:
+            event, context = conn.recv()
+        except EOFError:
+            return
+        try:
+            res = func(event, context)
+            if inspect.isawaitable(res):
+                loop = loop or asyncio.new_event_loop()
+                res = loop.run_until_complete(res)
+            conn.send(('ok', materialize(res)))
+        except Exception as err:
+            conn.send(('error', f'{type(err).__name__}: {err}'))
+
+
+class ContainerPool:
+    """
+    Pool of warm containers for a single Lambda function.
+
+    Containers are started lazily (or pre-warmed), reused while warm, and
+    reaped once they have been idle for longer than ``idle_ttl``, by a
+    timer set for the oldest idle container. A
+    container that dies during an invocation (e.g. a worker terminated on
+    timeout) is replaced in the background, so its slot is warm again
+    without waiting for the next request to pay for a cold start.
+
+    While all ``max_concurrency`` containers are busy, invocations queue
+    for one to be released. They are throttled (TooManyRequestsException)
+    if ``max_queue`` invocations are already waiting, or once they have
+    waited for ``queue_timeout`` seconds.
+
+    :param function factory: Coroutine function starting a new Container
+    :param int max_concurrency: Maximum number of containers [default: none]
+    :param float idle_ttl: Seconds before idle containers are reaped
+    :param float queue_timeout: Maximum wait for a container [default: none]
+    :param int max_queue: Maximum waiting invocations [default: none]
+    """
+    def __init__(self, factory, max_concurrency=None, idle_ttl=None,
+                 queue_timeout=None, max_queue=None):
+        self.factory = factory
+        self.max_concurrency = max_concurrency
+        self.idle_ttl = idle_ttl
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.throttles = 0
+        self.idle = []
+        self.busy = 0
+        self.generation = 0
+        self.cold_starts = 0
+        self.warm_starts = 0
+        self.waiters = collections.deque()
+        self.replacing = set()
+        self.reaper = None
+
+    @property
+    def full(self):
+        return self.max_concurrency is not None \
+            and self.busy >= self.max_concurrency
+
+    @property
+    def size(self):
+        return self.busy + len(self.idle)
+
+    async def start(self):
+        """
+        Start a new container, timing its initialisation.
+
+        :returns Container: Cold container
+        """
+        generation = self.generation
+        started = time.perf_counter()
+        container = await self.factory()
+        container.generation = generation
+        container.init_duration = time.perf_counter() - started
+        return container
+
+    async def acquire(self):
+        """
+        Get a warm container, or cold start one if the pool has room.
+
+        Waits for a container to be released while the pool is full.
+
+        :returns tuple: (Container, cold start flag)
+        :raises TooManyRequestsException: If the queue is full, or the wait
+            timed out
+        """
+        self.reap()
+        if not self.idle and self.full:
+            await self.queue()
+        self.busy += 1
+        while self.idle:
+            container = self.idle.pop()
+            if container.alive:
+                self.warm_starts += 1
+                return container, False
+            container.stop()
+        try:
+            container = await self.start()
+        except BaseException:
+            self.busy -= 1
+            self.wake()
+            raise
+        self.cold_starts += 1
+        return container, True
+
+    def release(self, container):
+        """
+        Return a container to the pool after an invocation.
+
+        Containers from an older generation, or that died, are stopped.
+
+        :param Container container: Container returned by acquire()
+        """
+        self.busy -= 1
+        container.invocations += 1
+        container.last_used = time.monotonic()
+        if container.generation == self.generation and container.alive:
+            self.idle.append(container)
+            self.schedule_reap()
+        else:
+            container.stop()
+            if container.generation == self.generation:
+                self.replace()
+        self.wake()
+
+    def replace(self):
+        """
+        Start a container in the background for a slot whose container
+        died. The slot stays reserved while the container starts.
+        """
+        self.busy += 1
+        task = asyncio.ensure_future(self.start_replacement())
+        self.replacing.add(task)
+        task.add_done_callback(self.replacing.discard)
+
+    async def start_replacement(self):
+        try:
+            container = await self.start()
+        except Exception as err:
+            logger.error('Unable to replace container: %s', err)
+        else:
+            if container.generation == self.generation:
+                self.idle.append(container)
+                self.schedule_reap()
+            else:
+                container.stop()
+        finally:
+            self.busy -= 1
+            self.wake()
+
+    async def prewarm(self, count):
+        """
+        Start containers ahead of the first invocation.
+
+        :param int count: Number of containers to keep warm
+        """
+        if self.max_concurrency is not None:
+            count = min(count, self.max_concurrency)
+        count -= self.size
+        if count > 0:
+            containers = await asyncio.gather(
+                *(self.start() for _ in range(count)))
+            self.idle.extend(containers)
+            self.schedule_reap()
+
+    def reap(self):
+        """
+        Stop containers that have been idle for longer than the TTL.
+        """
+        if self.idle_ttl is None:
+            return
+        deadline = time.monotonic() - self.idle_ttl
+        expired = [x for x in self.idle if x.last_used < deadline]
+        if expired:
+            self.idle = [x for x in self.idle if x.last_used >= deadline]
+            for container in expired:
+                container.stop()
+
+    def schedule_reap(self):
+        """
+        Reap idle containers once the oldest one expires, so that they are
+        stopped even if the function gets no further requests.
+        """
+        if self.idle_ttl is None or not self.idle:
+            return
+        loop = asyncio.get_running_loop()
+        if self.reaper is not None and self.reaper[0] is loop:
+            return
+        oldest = min(container.last_used for container in self.idle)
+        delay = max(0.0, oldest + self.idle_ttl - time.monotonic())
+        self.reaper = loop, loop.call_later(delay, self.run_reaper)
+
+    def run_reaper(self):
+        self.reaper = None
+        self.reap()
+        self.schedule_reap()
+
+    def invalidate(self):
+        """
+        Retire all containers, e.g. after a code change.
+
+        Idle containers stop now; busy ones stop when they are released.
+        """
+        self.generation += 1
+        for container in self.idle:
+            container.stop()
+        self.idle = []
+
+    async def queue(self):
+        """
+        Wait in the bounded queue until a container can be acquired.
+        """
+        if self.max_concurrency == 0 or (
+                self.max_queue is not None
+                and len(self.waiters) >= self.max_queue):
+            self.throttles += 1
+            raise TooManyRequestsException(
+                'Rate Exceeded: concurrency limit reached')
+        loop = asyncio.get_running_loop()
+        deadline = None if self.queue_timeout is None \
+            else loop.time() + self.queue_timeout
+        while not self.idle and self.full:
+            try:
+                if deadline is None:
+                    await self.wait()
+                else:
+                    await asyncio.wait_for(
+                        self.wait(), max(0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                self.throttles += 1
+                raise TooManyRequestsException(
+                    'Rate Exceeded: timed out waiting for a container')
+
+    async def wait(self):
+        """
+        Wait until a container is released.
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.wake()
+            raise
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+    def wake(self):
+        """
+        Wake the next task waiting for a container.
+        """
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
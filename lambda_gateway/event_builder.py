@@ -0,0 +1,247 @@
+import itertools
+import os
+import time
+import uuid
+
+ACCOUNT_ID = '123456789012'
+API_ID = 'lambda-gateway'
+STAGE = '$default'
+
+_request_time = (None, None)
+_protocols = {}
+
+
+def _seed_request_ids():
+    global _request_id_prefix, _request_ids
+    _request_id_prefix = str(uuid.uuid4())[:24]
+    _request_ids = itertools.count()
+
+
+_seed_request_ids()
+if hasattr(os, 'register_at_fork'):  # pragma: no cover
+    os.register_at_fork(after_in_child=_seed_request_ids)
+
+
+def get_request_id():
+    """
+    Get a unique, UUID-shaped request ID.
+
+    IDs share a random per-process prefix and end in a counter, which is
+    much cheaper than a uuid4() per request.
+    """
+    return f'{_request_id_prefix}{next(_request_ids):012x}'
+
+
+def get_protocol(version):
+    """
+    Get the protocol string of an HTTP version, e.g. ``HTTP/1.1``.
+    """
+    try:
+        return _protocols[version]
+    except KeyError:
+        protocol = _protocols[version] = 'HTTP/%d.%d' % version
+        return protocol
+
+
+def get_request_time(epoch):
+    """
+    Format a request time as API Gateway does, e.g.
+    ``12/Mar/2020:19:03:58 +0000``.
+
+    The formatted time is reused for requests within the same second.
+    """
+    global _request_time
+    second = int(epoch)
+    cached_second, formatted = _request_time
+    if cached_second != second:
+        formatted = time.strftime(
+            '%d/%b/%Y:%H:%M:%S +0000', time.gmtime(second))
+        _request_time = (second, formatted)
+    return formatted
+
+
+class EventBuilder:
+    """
+    Lambda event template compiled once per route.
+
+    Parts of the event that only depend on the route (route key, resource,
+    stage, account and API IDs) are computed up front; each request only
+    fills in what it carries, copying its headers and query string in a
+    single pass each.
+
+    :param Route route: Matched route, or None to derive route fields from
+        each request
+    """
+    version = None
+
+    def __init__(self, route=None):
+        self.route = route
+
+    def build(self, request, body, is_base64_encoded, path_parameters=None):
+        """
+        Build the Lambda event for a request.
+
+        :param Request request: HTTP request
+        :param str body: Request body, as forwarded to Lambda
+        :param bool is_base64_encoded: Whether the body is base64-encoded
+        :param dict path_parameters: Matched path variables
+        :returns dict: Lambda event object
+        """
+        raise NotImplementedError  # pragma: no cover
+
+
+class EventBuilderV1(EventBuilder):
+    """
+    Builder for version 1.0 (REST API style) events.
+
+    Headers keep their case and query parameters their last value, with
+    every value listed in ``multiValueHeaders`` and
+    ``multiValueQueryStringParameters``.
+    """
+    version = '1.0'
+
+    def __init__(self, route=None):
+        super().__init__(route)
+        self.resource = route.Path if route else None
+        self.request_context = {
+            'accountId': ACCOUNT_ID,
+            'apiId': API_ID,
+            'resourceId': None,
+            'stage': STAGE,
+        }
+
+    def build(self, request, body, is_base64_encoded, path_parameters=None):
+        headers = {}
+        multi_headers = {}
+        for key, value in request.headers.items():
+            headers[key] = value
+            values = multi_headers.get(key)
+            if values is None:
+                multi_headers[key] = [value]
+            else:
+                values.append(value)
+
+        query = {}
+        multi_query = {}
+        for key, value in request.query.items():
+            query[key] = value
+            values = multi_query.get(key)
+            if values is None:
+                multi_query[key] = [value]
+            else:
+                values.append(value)
+
+        now = time.time()
+        path = request.path
+        resource = self.resource or path
+        return {
+            'version': '1.0',
+            'resource': resource,
+            'path': path,
+            'httpMethod': request.method,
+            'headers': headers,
+            'multiValueHeaders': multi_headers,
+            'queryStringParameters': query,
+            'multiValueQueryStringParameters': multi_query,
+            'requestContext': {
+                **self.request_context,
+                'domainName': request.host,
+                'httpMethod': request.method,
+                'identity': {
+                    'sourceIp': request.remote,
+                    'userAgent': headers.get('User-Agent'),
+                },
+                'path': path,
+                'protocol': get_protocol(request.version),
+                'requestId': get_request_id(),
+                'requestTime': get_request_time(now),
+                'requestTimeEpoch': int(now * 1000),
+                'resourcePath': resource,
+            },
+            'pathParameters': path_parameters or None,
+            'stageVariables': None,
+            'body': body,
+            'isBase64Encoded': is_base64_encoded,
+        }
+
+
+class EventBuilderV2(EventBuilder):
+    """
+    Builder for version 2.0 (HTTP API) events.
+
+    Header names are lowercased and repeated headers and query parameters
+    comma-joined; cookies are moved to ``cookies``. An ``x-route-key``
+    request header overrides the route key.
+    """
+    version = '2.0'
+
+    def __init__(self, route=None):
+        super().__init__(route)
+        self.route_key = route.RouteKey if route else None
+        self.request_context = {
+            'accountId': ACCOUNT_ID,
+            'apiId': API_ID,
+            'stage': STAGE,
+        }
+
+    def build(self, request, body, is_base64_encoded, path_parameters=None):
+        headers = {}
+        cookies = []
+        for key, value in request.headers.items():
+            key = key.lower()
+            if key == 'cookie':
+                cookies += value.split('; ')
+                continue
+            previous = headers.get(key)
+            headers[key] = value if previous is None \
+                else f'{previous},{value}'
+
+        query = {}
+        for key, value in request.query.items():
+            previous = query.get(key)
+            query[key] = value if previous is None \
+                else f'{previous},{value}'
+
+        now = time.time()
+        method = request.method
+        path = request.path
+        route_key = headers.get('x-route-key') or self.route_key \
+            or f'{method} {path}'
+        host = request.host
+        event = {
+            'version': '2.0',
+            'routeKey': route_key,
+            'rawPath': path,
+            'rawQueryString': request.query_string,
+            'headers': headers,
+            'queryStringParameters': query,
+            'requestContext': {
+                **self.request_context,
+                'domainName': host,
+                'domainPrefix': host.split('.', 1)[0],
+                'http': {
+                    'method': method,
+                    'path': path,
+                    'protocol': get_protocol(request.version),
+                    'sourceIp': request.remote,
+                    'userAgent': headers.get('user-agent'),
+                },
+                'requestId': get_request_id(),
+                'routeKey': route_key,
+                'time': get_request_time(now),
+                'timeEpoch': int(now * 1000),
+            },
+            'body': body,
+            'isBase64Encoded': is_base64_encoded,
+        }
+        if cookies:
+            event['cookies'] = cookies
+        if path_parameters:
+            event['pathParameters'] = path_parameters
+        return event
+
+
+BUILDERS = {
+    '1.0': EventBuilderV1,
+    '2.0': EventBuilderV2,
+}
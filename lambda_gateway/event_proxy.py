@@ -1,38 +1,107 @@
 import asyncio
-import importlib
+import functools
 import json
 import os
-import sys
+import time
 
-from lambda_gateway import (lambda_context, logger)
+from lambda_gateway import (
+    importer, lambda_context, logger, metrics, streaming, tracing)
+from lambda_gateway.container import (
+    Container, ContainerPool, ProcessContainer, TooManyRequestsException)
+
+_END = object()
+
+# Resolved handler functions, keyed by (handler spec, code path)
+_handlers = {}
+
+
+def load_handler(handler, code_path):
+    """
+    Load handler function.
+
+    The handler module is imported in the code path's own namespace, see
+    ``lambda_gateway.importer``.
+
+    :param str handler: Handler spec, e.g. ``lambda_function.lambda_handler``
+    :param str code_path: Absolute path to the function code
+    :returns function: Lambda handler function
+    """
+    *path, func = handler.split('.')
+    name = '.'.join(path)
+    if not name:
+        raise ValueError(f"Bad handler signature '{handler}'")
+    try:
+        module = importer.get_namespace(code_path).load(name)
+        return getattr(module, func)
+    except ModuleNotFoundError:
+        raise ValueError(f"Unable to import module '{name}'")
+    except AttributeError:
+        raise ValueError(f"Handler '{func}' missing on module '{name}'")
 
 
 class EventProxy:
-    def __init__(self, handler, base_python_path, timeout=None):
+    def __init__(self, handler, base_python_path, timeout=None,
+                 max_concurrency=None, idle_ttl=None, isolation='thread',
+                 queue_timeout=None, max_queue=None, executor=None,
+                 memory_size=None, name=None):
         self.base_python_path = base_python_path
+        self.code_path = os.path.abspath(base_python_path)
         self.handler = handler
+        # Unique function name; functions often share a handler spec
+        self.name = name or handler
         self.timeout = timeout
+        self.isolation = isolation
+        self.executor = executor
+        self.memory_size = memory_size
+        self.profiler = None
+        self.pool = ContainerPool(
+            self.start_container, max_concurrency, idle_ttl,
+            queue_timeout, max_queue)
+
+    def invalidate(self, paths):
+        """
+        Drop the cached handler and warm containers after a code change.
+
+        :param iterable paths: Changed file paths, as reported by the watcher
+        :returns bool: Whether any path is under this function's code path
+        """
+        root = self.code_path
+        for path in map(os.path.abspath, paths):
+            if path == root or path.startswith(root + os.sep):
+                _handlers.pop((self.handler, self.code_path), None)
+                self.pool.invalidate()
+                return True
+        return False
 
     def get_handler(self):
         """
-        Load handler function.
+        Get handler function, importing it on first use.
+
+        Handlers stay cached until their code path is invalidated, so warm
+        requests do not pay for the import.
 
         :returns function: Lambda handler function
         """
-        *path, func = self.handler.split('.')
-        name = '.'.join(path)
-        if not name:
-            raise ValueError(f"Bad handler signature '{self.handler}'")
+        key = (self.handler, self.code_path)
         try:
-            sys.path.append(os.path.abspath(self.base_python_path))
-            module = importlib.import_module(name)
-            importlib.reload(module)
-            handler = getattr(module, func)
+            return _handlers[key]
+        except KeyError:
+            handler = _handlers[key] = load_handler(*key)
             return handler
-        except ModuleNotFoundError:
-            raise ValueError(f"Unable to import module '{name}'")
-        except AttributeError:
-            raise ValueError(f"Handler '{func}' missing on module '{name}'")
+
+    async def start_container(self):
+        """
+        Start a warm container for the handler (cold start).
+
+        :returns Container: New container
+        """
+        with tracing.span('init', function=self.name):
+            if self.isolation == 'process':
+                return await ProcessContainer.start(
+                    self.handler, self.code_path)
+            loop = asyncio.get_running_loop()
+            handler = await loop.run_in_executor(None, self.get_handler)
+            return Container(handler, self.executor)
 
     def get_httpMethod(self, event):
         """
@@ -57,45 +126,151 @@ class EventProxy:
             f"Unknown API Gateway payload version: {event.get('version')}")
 
     async def invoke(self, event):
-        with lambda_context.start(self.timeout) as context:
-            logger.info('Invoking "%s"', self.handler)
-            return await self.invoke_async_with_timeout(event, context)
+        with tracing.span('invoke', function=self.name) as span:
+            logger.info('Invoking "%s"', self.name)
+            return await self.invoke_async(
+                event, span and span.trace_header)
 
-    async def invoke_async(self, event, context=None):
+    async def invoke_async(self, event, trace_id=None):
         """
-        Wrapper to invoke the Lambda handler asynchronously.
+        Invoke the Lambda handler asynchronously, in a warm container.
+
+        Waiting for a container is only bounded by the pool's queue
+        timeout, which throttles with a 429. The function timeout starts
+        once the container is acquired, so time spent queued or starting
+        a container does not count against it.
 
         :param dict event: Lambda event object
-        :param Context context: Mock Lambda context
-        :returns dict: Lamnda invocation result
+        :param str trace_id: X-Ray style trace header, if tracing
+        :returns dict: Lamnda invocation result, or a 429, 502 or 504
         """
         httpMethod = self.get_httpMethod(event)
 
-        # Get & invoke Lambda handler
+        # Get a warm container
         try:
-            handler = self.get_handler()
-            loop = asyncio.get_running_loop()
-            return await loop.run_in_executor(None, handler, event, context)
+            queued = time.perf_counter()
+            with tracing.span('acquire') as span:
+                container, cold = await self.pool.acquire()
+                if span is not None:
+                    span.attributes['cold_start'] = cold
+        except TooManyRequestsException as err:
+            logger.warning('Throttled "%s": %s', self.name, err)
+            metrics.THROTTLES.inc(self.name)
+            res = self.jsonify(httpMethod, 429, message='Too Many Requests')
+            res['headers']['X-Amzn-ErrorType'] = 'TooManyRequestsException'
+            return res
+        except Exception as err:
+            logger.error(err)
+            metrics.ERRORS.inc(self.name)
+            message = 'Internal server error'
+            return self.jsonify(httpMethod, 502, message=message)
+        started = time.perf_counter()
+        (metrics.COLD_STARTS if cold else metrics.WARM_STARTS) \
+            .inc(self.name)
+
+        # Time spent waiting for a container, not starting one
+        queue_duration = started - queued
+        if cold:
+            queue_duration -= container.init_duration
+        queue_duration = max(0.0, queue_duration)
+        metrics.QUEUE_DURATION.observe(queue_duration, self.name)
+        queue_duration *= 1000
+
+        # Invoke Lambda handler
+        report = functools.partial(
+            self.report, container, cold, started, queue_duration)
+        streamed = False
+        try:
+            with lambda_context.start(
+                    self.timeout, trace_id, self.memory_size) as context, \
+                    tracing.span('execute'):
+                res = streaming.get_streamed_result(
+                    await self.invoke_with_timeout(container, event, context))
+                if isinstance(res, dict) \
+                        and streaming.is_stream(res.get('body')):
+                    # The stream ends the invocation from here on
+                    streamed = True
+                    body = await self.stream(res['body'], context, report)
+                    res = {**res, 'body': body}
+                return res
+        except asyncio.TimeoutError:
+            metrics.TIMEOUTS.inc(self.name)
+            message = 'Endpoint request timed out'
+            return self.jsonify(httpMethod, 504, message=message)
         except Exception as err:
             logger.error(err)
+            metrics.ERRORS.inc(self.name)
             message = 'Internal server error'
             return self.jsonify(httpMethod, 502, message=message)
+        finally:
+            if not streamed:
+                report()
 
-    async def invoke_async_with_timeout(self, event, context=None):
+    async def invoke_with_timeout(self, container, event, context):
         """
-        Wrapper to invoke the Lambda handler with a timeout.
+        Invoke the Lambda handler in a container with a timeout.
+
+        The timeout runs out at the context's deadline, so that it agrees
+        with ``context.get_remaining_time_in_millis()``, even when no
+        timeout is configured and the context's default applies.
 
+        :param Container container: Acquired container
         :param dict event: Lambda event object
         :param Context context: Mock Lambda context
-        :returns dict: Lamnda invocation result or 408 TIMEOUT
+        :returns dict: Lamnda invocation result
+        :raises asyncio.TimeoutError: If the timeout runs out
+        """
+        if self.profiler is None or not self.profiler.running:
+            coroutine = container.invoke(event, context)
+        else:
+            coroutine = container.invoke(event, context, self.profiler)
+        timeout = max(0, context.deadline - time.monotonic())
+        return await asyncio.wait_for(coroutine, timeout)
+
+    def report(self, container, cold, started, queue_duration):
+        """
+        Release a container at the end of an invocation and log its REPORT.
+        """
+        duration = time.perf_counter() - started
+        metrics.INVOCATION_DURATION.observe(duration, self.name)
+        duration *= 1000
+        self.pool.release(container)
+        if cold:
+            logger.info(
+                'REPORT "%s" Duration: %.2f ms '
+                'Queue Duration: %.2f ms Init Duration: %.2f ms',
+                self.name, duration, queue_duration,
+                container.init_duration * 1000)
+        else:
+            logger.info(
+                'REPORT "%s" Duration: %.2f ms '
+                'Queue Duration: %.2f ms',
+                self.name, duration, queue_duration)
+
+    async def stream(self, body, context, report):
         """
+        Start streaming a Lambda result body.
+
+        The first chunk is fetched before the response starts, so a handler
+        failing or timing out early still gets a 502 or 504. The rest is
+        fetched as the client reads it: the invocation keeps its container
+        until the stream ends or is closed, and fails at the context's
+        deadline, like the handler call itself. Blocking generators are
+        advanced in the function's executor.
+
+        :param iterable body: Streamed body
+        :param Context context: Mock Lambda context
+        :param function report: Ends the invocation
+        :returns _Stream: Async iterator of chunks
+        """
+        stream = _Stream(self, streaming.iter_body(body, self.executor),
+                         context, report)
         try:
-            coroutine = self.invoke_async(event, context)
-            return await asyncio.wait_for(coroutine, self.timeout)
-        except asyncio.TimeoutError:
-            httpMethod = self.get_httpMethod(event)
-            message = 'Endpoint request timed out'
-            return self.jsonify(httpMethod, 504, message=message)
+            stream.first = await stream.next_chunk()
+        except BaseException:
+            await stream.aclose()
+            raise
+        return stream
 
     @staticmethod
     def jsonify(httpMethod, statusCode, **kwargs):
@@ -115,3 +290,62 @@ class EventProxy:
                 'Content-Length': str(len(body)),
             },
         }
+
+
+class _Stream:
+    """
+    Streamed Lambda result body, holding its invocation's container.
+    """
+    def __init__(self, proxy, chunks, context, report):
+        self.proxy = proxy
+        self.chunks = chunks
+        self.context = context
+        self.report = report
+        self.first = _END
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed:
+            raise StopAsyncIteration
+        try:
+            if self.first is not _END:
+                chunk, self.first = self.first, _END
+            else:
+                chunk = await self.next_chunk()
+        except asyncio.TimeoutError:
+            logger.error('Stream of "%s" timed out', self.proxy.name)
+            metrics.TIMEOUTS.inc(self.proxy.name)
+            await self.aclose()
+            raise
+        except Exception as err:
+            logger.error(err)
+            metrics.ERRORS.inc(self.proxy.name)
+            await self.aclose()
+            raise
+        if chunk is _END:
+            await self.aclose()
+            raise StopAsyncIteration
+        return chunk
+
+    async def next_chunk(self):
+        timeout = max(0, self.context.deadline - time.monotonic())
+        try:
+            return await asyncio.wait_for(self.chunks.__anext__(), timeout)
+        except StopAsyncIteration:
+            return _END
+
+    async def aclose(self):
+        """
+        End the invocation, releasing its container. Safe to call twice.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if hasattr(self.chunks, 'aclose'):
+                await self.chunks.aclose()
+        finally:
+            self.report()
@@ -0,0 +1,140 @@
+"""
+Thread pools running synchronous Lambda handlers.
+
+Handlers run in a shared ``handlers`` pool instead of asyncio's implicit
+default executor, which aiohttp and other library code also rely on.
+Functions can also get a dedicated pool, so a slow function only exhausts
+its own threads.
+
+Each pool counts its queued, running and abandoned calls. A call is
+abandoned when its invocation stops waiting for it (e.g. it timed out)
+while its thread keeps running the handler: Python threads cannot be
+killed, so the thread holds its pool slot until the handler returns.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from lambda_gateway import logger
+
+SHARED = 'handlers'
+
+# Executors by name, for metrics
+EXECUTORS = {}
+
+
+def get_default_size():
+    """
+    Get asyncio's default executor size, ``min(32, CPUs + 4)``.
+    """
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+class _Call:
+    __slots__ = ('done', 'abandoned')
+
+    def __init__(self):
+        self.done = False
+        self.abandoned = False
+
+
+class Executor:
+    """
+    Sized thread pool with saturation accounting.
+
+    :param str name: Pool name, used for thread names and metrics
+    :param int max_workers: Number of threads [default: min(32, CPUs + 4)]
+    """
+    def __init__(self, name, max_workers=None):
+        self.name = name
+        self.max_workers = max_workers or get_default_size()
+        self.pool = ThreadPoolExecutor(
+            self.max_workers, thread_name_prefix=f'lambda-gateway-{name}')
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.abandoned = 0
+
+    @property
+    def saturated(self):
+        return self.running >= self.max_workers
+
+    def call(self, call, func, args):
+        with self.lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return func(*args)
+        finally:
+            with self.lock:
+                self.running -= 1
+                call.done = True
+                if call.abandoned:
+                    self.abandoned -= 1
+                    logger.warning(
+                        'Abandoned call to %s finished in "%s" pool',
+                        getattr(func, '__name__', func), self.name)
+
+    async def run(self, func, *args):
+        """
+        Run a function in the pool.
+
+        If the caller is cancelled before a thread picks the call up, the
+        call is dropped; otherwise it is counted as abandoned until the
+        function returns.
+
+        :returns: Function result
+        """
+        call = _Call()
+        with self.lock:
+            self.queued += 1
+        future = self.pool.submit(self.call, call, func, args)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            with self.lock:
+                if future.cancel():
+                    self.queued -= 1
+                elif not call.done:
+                    call.abandoned = True
+                    self.abandoned += 1
+                    if self.abandoned >= self.max_workers:
+                        logger.warning(
+                            'All %d threads of "%s" pool are held by '
+                            'abandoned calls', self.max_workers, self.name)
+            raise
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+
+def get_executor(name=SHARED, max_workers=None):
+    """
+    Get a named executor, creating it on first use.
+
+    :param str name: Pool name
+    :param int max_workers: Pool size, for new pools
+    :returns Executor: Executor
+    """
+    try:
+        return EXECUTORS[name]
+    except KeyError:
+        executor = EXECUTORS[name] = Executor(name, max_workers)
+        return executor
+
+
+def get_dedicated_executor(name, max_workers=None):
+    """
+    Get the dedicated executor of a function, creating it on first use.
+
+    :param str name: Function name, naming the pool
+    :param int max_workers: Pool size, for new pools
+    :returns Executor: Executor
+    :raises ValueError: If the name is the shared pool's
+    """
+    if name == SHARED:
+        raise ValueError(
+            f"'{SHARED}' is the shared pool's name; rename the function to "
+            f"give it a dedicated pool")
+    return get_executor(name, max_workers)
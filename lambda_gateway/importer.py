@@ -0,0 +1,232 @@
+"""
+Per-function import namespaces.
+
+Function code is imported by a meta path finder instead of adding each
+code path to ``sys.path``, so the path that every import scans stays the
+same however many functions are served. While a function's code is being
+imported, top-level modules resolve against its code path only; at other
+times (e.g. imports inside a handler body) code paths are searched in the
+order functions were loaded.
+
+Each function keeps the modules imported from its code path, including
+those imported later by its handler. If two functions have modules of the
+same name, e.g. ``app``, the first one keeps the name in ``sys.modules``
+and the other keeps its own module objects, which its handler is bound to.
+
+While a function's code is being imported, the modules of other code paths
+are hidden from ``sys.modules``. Their import locks are held meanwhile, so
+a handler importing one of them in another thread waits for the module to
+be shown again instead of importing a second copy.
+
+The finder comes after the standard ones, so like with ``sys.path`` an
+installed package wins over a module of the same name in a code path.
+"""
+import contextlib
+import importlib
+import importlib.machinery
+import os
+import sys
+import threading
+from importlib import _bootstrap
+
+_lock = threading.RLock()
+_local = threading.local()
+
+# Namespace by code path, in load order
+_namespaces = {}
+
+
+class Namespace:
+    """
+    Modules imported from one function code path.
+
+    :param str code_path: Absolute path to the function code
+    """
+    def __init__(self, code_path):
+        self.code_path = code_path
+        self.prefix = os.path.join(code_path, '')
+        self.roots = set()
+        self.modules = {}
+
+    def owns(self, name):
+        """
+        Whether a module name is the name of one of this code path's modules
+        or one of their submodules.
+        """
+        return name.partition('.')[0] in self.roots
+
+    def find_spec(self, name):
+        spec = importlib.machinery.PathFinder.find_spec(
+            name, [self.code_path])
+        if spec is not None:
+            self.roots.add(name)
+        return spec
+
+    def load(self, name):
+        """
+        Import a module of the function, e.g. its handler module.
+
+        :param str name: Module name
+        :returns module: Module
+        """
+        try:
+            return self.modules[name]
+        except KeyError:
+            pass
+        with _lock:
+            hidden = self.enter()
+            try:
+                return importlib.import_module(name)
+            finally:
+                self.exit(hidden)
+
+    def reload(self, names):
+        """
+        Import fresh copies of all of the function's modules.
+
+        Modules are re-imported by importing ``names`` again. On failure the
+        previous modules stay in place.
+
+        :param list names: Modules to import, e.g. handler modules
+        """
+        with _lock:
+            old = self.modules
+            self.modules = {}
+            for name, module in old.items():
+                if sys.modules.get(name) is module:
+                    del sys.modules[name]
+            hidden = self.enter()
+            try:
+                for name in names:
+                    importlib.import_module(name)
+            except BaseException:
+                for name in list(sys.modules):
+                    if self.owns(name):
+                        del sys.modules[name]
+                sys.modules.update(old)
+                raise
+            finally:
+                self.exit(hidden)
+
+    def enter(self):
+        """
+        Make this namespace's modules the ones visible in ``sys.modules``.
+
+        Modules found in any code path since the last load are recorded in
+        their namespace first, so that a module a handler imported lazily
+        is hidden like the others.
+
+        :returns dict: Modules of other namespaces that were hidden
+        """
+        names = []
+        for name, module in list(sys.modules.items()):
+            owner = find_owner(name, module)
+            if owner is not None:
+                owner.modules.setdefault(name, module)
+                if owner is not self:
+                    names.append(name)
+        names.extend(self.modules)
+
+        # Imports of these names in other threads wait until exit()
+        with contextlib.ExitStack() as stack:
+            for name in sorted(set(names)):
+                stack.enter_context(_bootstrap._ModuleLockManager(name))
+            locks = stack.pop_all()
+        _local.active = self
+        _local.locks = locks
+
+        hidden = {}
+        for name in names:
+            module = sys.modules.get(name)
+            if module is not None \
+                    and self.modules.get(name) is not module:
+                hidden[name] = sys.modules.pop(name)
+        sys.modules.update(self.modules)
+        return hidden
+
+    def exit(self, hidden):
+        """
+        Record the modules imported from this code path and show the hidden
+        modules again. Hidden modules keep their names.
+        """
+        for name, module in list(sys.modules.items()):
+            if find_owner(name, module) is self:
+                self.modules[name] = module
+        sys.modules.update(hidden)
+        _local.active = None
+        _local.locks.close()
+
+
+class Finder:
+    """
+    Meta path finder resolving top-level modules from function code paths.
+    """
+    @classmethod
+    def find_spec(cls, name, path=None, target=None):
+        if path is not None:
+            return None  # Submodules are found through their package
+        active = getattr(_local, 'active', None)
+        namespaces = [active] if active else list(_namespaces.values())
+        for namespace in namespaces:
+            spec = namespace.find_spec(name)
+            if spec is not None:
+                return spec
+        return None
+
+    @classmethod
+    def invalidate_caches(cls):
+        pass
+
+
+def get_namespace(code_path):
+    """
+    Get the import namespace of a code path, creating it on first use.
+
+    :param str code_path: Absolute path to the function code
+    :returns Namespace: Namespace
+    """
+    try:
+        return _namespaces[code_path]
+    except KeyError:
+        pass
+    with _lock:
+        if Finder not in sys.meta_path:
+            sys.meta_path.append(Finder)
+        return _namespaces.setdefault(code_path, Namespace(code_path))
+
+
+def find_owner(name, module):
+    """
+    Find the namespace of the code path a module was imported from.
+
+    :param str name: Module name
+    :param module module: Module
+    :returns Namespace: Namespace, or None for modules found on sys.path
+    """
+    location = getattr(module, '__file__', None)
+    if location is None:
+        # Namespace packages have a path but no file
+        location = next(iter(getattr(module, '__path__', None) or ()), None)
+    if not isinstance(location, str):
+        return None
+    owner = None
+    for namespace in _namespaces.values():
+        # The innermost code path wins if code paths are nested
+        if namespace.owns(name) and location.startswith(namespace.prefix) \
+                and (owner is None
+                     or len(namespace.prefix) > len(owner.prefix)):
+            owner = namespace
+    return owner
+
+
+def get_owner(name):
+    """
+    Get the namespace whose module is loaded as ``name`` in ``sys.modules``.
+
+    :returns Namespace: Namespace, or None for modules found on sys.path
+    """
+    module = sys.modules.get(name)
+    for namespace in _namespaces.values():
+        if module is not None and namespace.modules.get(name) is module:
+            return namespace
+    return None
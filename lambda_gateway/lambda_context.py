@@ -1,25 +1,42 @@
-import uuid
+import time
 from contextlib import contextmanager
-from datetime import datetime
+
+from lambda_gateway.event_builder import get_request_id
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_MEMORY_SIZE = 128
 
 
 @contextmanager
-def start(timeout=None):
+def start(timeout=None, trace_id=None, memory_size=None):
     """
     Yield mock Lambda context object.
     """
-    yield Context(timeout)
+    yield Context(timeout, trace_id, memory_size)
 
 
 class Context:
     """
     Mock Lambda context object.
 
+    The request ID and log stream name are generated once, on first use.
+    The deadline is a ``time.monotonic()`` timestamp, also used to enforce
+    the timeout of the invocation.
+
     :param int timeout: Lambda timeout in seconds
+    :param str trace_id: X-Ray style trace header, if tracing
+    :param int memory_size: Function memory size in MB [default: 128]
     """
-    def __init__(self, timeout=None):
-        self._start = datetime.utcnow()
-        self._timeout = timeout or 30
+    __slots__ = ('_timeout', 'deadline', 'trace_id', '_memory_size',
+                 '_aws_request_id', '_log_stream_name')
+
+    def __init__(self, timeout=None, trace_id=None, memory_size=None):
+        self._timeout = timeout or DEFAULT_TIMEOUT
+        self.deadline = time.monotonic() + self._timeout
+        self.trace_id = trace_id
+        self._memory_size = memory_size or DEFAULT_MEMORY_SIZE
+        self._aws_request_id = None
+        self._log_stream_name = None
 
     @property
     def function_name(self):
@@ -38,11 +55,13 @@ class Context:
 
     @property
     def memory_limit_in_mb(self):
-        return 128
+        return self._memory_size
 
     @property
     def aws_request_id(self):
-        return str(uuid.uuid1())
+        if self._aws_request_id is None:
+            self._aws_request_id = get_request_id()
+        return self._aws_request_id
 
     @property
     def log_group_name(self):
@@ -50,14 +69,16 @@ class Context:
 
     @property
     def log_stream_name(self):
-        return str(uuid.uuid1())
+        if self._log_stream_name is None:
+            self._log_stream_name = time.strftime('%Y/%m/%d/[$LATEST]') \
+                + self.aws_request_id.replace('-', '')
+        return self._log_stream_name
 
     def get_remaining_time_in_millis(self):
         """
         Get remaining TTL for Lambda context.
         """
-        delta = datetime.utcnow() - self._start
-        remaining_time_in_s = self._timeout - delta.total_seconds()
+        remaining_time_in_s = self.deadline - time.monotonic()
         if remaining_time_in_s < 0:
             return 0
         return remaining_time_in_s * 1000
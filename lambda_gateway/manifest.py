@@ -0,0 +1,124 @@
+"""
+Compiled route manifests of SAM templates and CDK stacks.
+
+A manifest holds what the gateway reads from a template: the endpoints,
+with each function's timeout and memory size, the caching settings and
+reserved concurrencies. Manifests are cached on disk keyed by the SHA-256
+of the template, so restarting with an unchanged template skips parsing
+the YAML altogether.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from lambda_gateway.cdk import CDKParser
+from lambda_gateway.sam import SAM, Endpoint
+
+# Bump when the manifest format or its compilation changes
+MANIFEST_VERSION = 3
+
+
+def get_cache_dir():
+    """
+    Get the manifest cache directory, under ``$XDG_CACHE_HOME``.
+    """
+    root = os.environ.get('XDG_CACHE_HOME') \
+        or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(root, 'lambda-gateway', 'manifests')
+
+
+class Manifest:
+    """
+    Routes and settings compiled from a template.
+
+    Manifests have the same getters as ``SAM``, so they can be used in
+    place of the template.
+
+    :param list endpoints: Endpoint tuples
+    :param list cache_settings: (method, path, TTL) of cached methods
+    :param dict reserved_concurrency: Reserved concurrency by function
+    """
+    def __init__(self, endpoints, cache_settings, reserved_concurrency):
+        self.endpoints = endpoints
+        self.cache_settings = cache_settings
+        self.reserved_concurrency = reserved_concurrency
+
+    @classmethod
+    def from_template(cls, template):
+        """
+        Compile a parsed template.
+
+        :param SAM template: Template, or CDKParser stack
+        """
+        return cls(
+            list(template.get_endpoints()),
+            template.get_cache_settings()
+            if hasattr(template, 'get_cache_settings') else [],
+            template.get_reserved_concurrency()
+            if hasattr(template, 'get_reserved_concurrency') else {},
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        if data['version'] != MANIFEST_VERSION:
+            raise ValueError(f"Unknown manifest version {data['version']}")
+        return cls(
+            [Endpoint(*endpoint) for endpoint in data['endpoints']],
+            [tuple(setting) for setting in data['cache_settings']],
+            data['reserved_concurrency'],
+        )
+
+    def to_dict(self):
+        return {
+            'version': MANIFEST_VERSION,
+            'endpoints': [list(endpoint) for endpoint in self.endpoints],
+            'cache_settings': [list(s) for s in self.cache_settings],
+            'reserved_concurrency': self.reserved_concurrency,
+        }
+
+    def get_endpoints(self):
+        return iter(self.endpoints)
+
+    def get_cache_settings(self):
+        return list(self.cache_settings)
+
+    def get_reserved_concurrency(self):
+        return dict(self.reserved_concurrency)
+
+
+def load(path, cache_dir=None):
+    """
+    Load the manifest of a SAM template or CDK stack (``.ts``), compiling it
+    on a cache miss.
+
+    Cache write errors (e.g. a read-only home directory) are ignored.
+
+    :param str path: Template or stack path
+    :param str cache_dir: Manifest cache directory [default: get_cache_dir()]
+    :returns Manifest: Manifest
+    """
+    cache_dir = cache_dir or get_cache_dir()
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    cache_path = os.path.join(cache_dir, f'{digest}.json')
+    try:
+        with open(cache_path, 'rt') as f:
+            return Manifest.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    parser = CDKParser if path.endswith('.ts') else SAM
+    manifest = Manifest.from_template(parser(path))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    except OSError:
+        return manifest
+    try:
+        with os.fdopen(fd, 'wt') as f:
+            json.dump(manifest.to_dict(), f)
+        os.replace(tmp_path, cache_path)
+    except (OSError, TypeError, ValueError):
+        os.unlink(tmp_path)
+    return manifest
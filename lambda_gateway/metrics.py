@@ -0,0 +1,312 @@
+"""
+Prometheus metrics for the gateway.
+
+Metrics are kept in process and rendered in the Prometheus text exposition
+format by the ``/__gateway/metrics`` endpoint. Gauges describing current
+state (in-flight invocations, executor queue depth, ...) are refreshed by
+collectors when the endpoint is scraped, so they cost nothing per request.
+"""
+import asyncio
+import math
+
+from aiohttp import web
+
+from lambda_gateway import executors
+
+METRICS_PATH = '/__gateway/metrics'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (
+    .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, math.inf)
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(names, values):
+    """
+    Format label names and values, e.g. ``{route="GET /",status="200"}``.
+    """
+    if not names:
+        return ''
+    pairs = (
+        '{}="{}"'.format(name, str(value)
+                         .replace('\\', r'\\')
+                         .replace('"', r'\"')
+                         .replace('\n', r'\n'))
+        for name, value in zip(names, values))
+    return '{' + ','.join(pairs) + '}'
+
+
+class Metric:
+    """
+    Base metric with a value per combination of label values.
+
+    :param str name: Metric name
+    :param str documentation: Help text
+    :param tuple labels: Label names
+    """
+    type = 'untyped'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def clear(self):
+        self.values.clear()
+
+    def samples(self):
+        """
+        Yield (name, label names, label values, value) samples.
+        """
+        for labels, value in self.values.items():
+            yield self.name, self.labels, labels, value
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type}',
+        ]
+        for name, names, values, value in self.samples():
+            labels = format_labels(names, values)
+            lines.append(f'{name}{labels} {format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    """
+    Histogram of observed values, e.g. latencies in seconds.
+
+    :param tuple buckets: Upper bounds of the buckets; a ``+Inf`` bucket is
+        always added
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        if self.buckets[-1:] != (math.inf,):
+            self.buckets += (math.inf,)
+
+    def observe(self, value, *labels):
+        try:
+            counts, total = self.values[labels]
+        except KeyError:
+            counts = [0] * len(self.buckets)
+            total = 0.0
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        self.values[labels] = (counts, total + value)
+
+    def samples(self):
+        names = self.labels + ('le',)
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield (f'{self.name}_bucket', names,
+                       labels + (format_value(bound),), cumulative)
+            yield f'{self.name}_sum', self.labels, labels, total
+            yield f'{self.name}_count', self.labels, labels, cumulative
+
+
+class Registry:
+    """
+    Collection of metrics rendered together.
+    """
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def add_collector(self, collector):
+        """
+        Add a function refreshing gauges before each render.
+        """
+        self.collectors.append(collector)
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text format.
+
+        :returns str: Exposition text
+        """
+        for collector in self.collectors:
+            collector()
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter(
+    'lambda_gateway_requests_total',
+    'HTTP requests, by route and status code.',
+    ('route', 'status'))
+REQUEST_DURATION = REGISTRY.histogram(
+    'lambda_gateway_request_duration_seconds',
+    'HTTP request latency, by route.',
+    ('route',))
+INVOCATION_DURATION = REGISTRY.histogram(
+    'lambda_gateway_invocation_duration_seconds',
+    'Handler invocation duration, by function.',
+    ('function',))
+QUEUE_DURATION = REGISTRY.histogram(
+    'lambda_gateway_queue_duration_seconds',
+    'Time invocations waited for a container, by function.',
+    ('function',))
+THROTTLES = REGISTRY.counter(
+    'lambda_gateway_throttles_total',
+    'Invocations rejected with 429 TooManyRequestsException, by function.',
+    ('function',))
+TIMEOUTS = REGISTRY.counter(
+    'lambda_gateway_invocation_timeouts_total',
+    'Invocations that timed out (504), by function.',
+    ('function',))
+ERRORS = REGISTRY.counter(
+    'lambda_gateway_invocation_errors_total',
+    'Invocations that raised an error (502), by function.',
+    ('function',))
+COLD_STARTS = REGISTRY.counter(
+    'lambda_gateway_cold_starts_total',
+    'Invocations that started a new container, by function.',
+    ('function',))
+WARM_STARTS = REGISTRY.counter(
+    'lambda_gateway_warm_starts_total',
+    'Invocations served by a warm container, by function.',
+    ('function',))
+CACHE_HITS = REGISTRY.counter(
+    'lambda_gateway_cache_hits_total',
+    'GET requests served from the response cache, by route.',
+    ('route',))
+CACHE_MISSES = REGISTRY.counter(
+    'lambda_gateway_cache_misses_total',
+    'Cacheable GET requests that invoked the handler, by route.',
+    ('route',))
+COALESCED = REGISTRY.counter(
+    'lambda_gateway_coalesced_requests_total',
+    'GET requests that shared the invocation of an identical request, '
+    'by route.',
+    ('route',))
+COMPRESSED_RESPONSES = REGISTRY.counter(
+    'lambda_gateway_compressed_responses_total',
+    'Responses sent compressed, by content encoding.',
+    ('encoding',))
+COMPRESSION_CACHE_HITS = REGISTRY.counter(
+    'lambda_gateway_compression_cache_hits_total',
+    'Compressed bodies reused from the compression cache, by content '
+    'encoding.',
+    ('encoding',))
+IN_FLIGHT = REGISTRY.gauge(
+    'lambda_gateway_invocations_in_flight',
+    'Invocations currently running, by function.',
+    ('function',))
+WAITING = REGISTRY.gauge(
+    'lambda_gateway_invocations_waiting',
+    'Invocations waiting for a container, by function.',
+    ('function',))
+IDLE_CONTAINERS = REGISTRY.gauge(
+    'lambda_gateway_idle_containers',
+    'Warm containers waiting for an invocation, by function.',
+    ('function',))
+EXECUTOR_THREADS = REGISTRY.gauge(
+    'lambda_gateway_executor_threads',
+    'Maximum threads, by executor.',
+    ('executor',))
+EXECUTOR_BUSY_THREADS = REGISTRY.gauge(
+    'lambda_gateway_executor_busy_threads',
+    'Threads running a call, by executor.',
+    ('executor',))
+EXECUTOR_ABANDONED_THREADS = REGISTRY.gauge(
+    'lambda_gateway_executor_abandoned_threads',
+    'Threads still running a call whose invocation timed out, by executor.',
+    ('executor',))
+EXECUTOR_QUEUE_DEPTH = REGISTRY.gauge(
+    'lambda_gateway_executor_queue_depth',
+    'Calls queued for a free thread, by executor.',
+    ('executor',))
+
+
+def get_pool_collector(proxies):
+    """
+    Get a collector reporting the container pools of the given proxies.
+
+    :param dict proxies: EventProxy by function; may change between scrapes
+    """
+    def collect():
+        for gauge in (IN_FLIGHT, WAITING, IDLE_CONTAINERS):
+            gauge.clear()
+        for proxy in proxies.values():
+            pool = proxy.pool
+            IN_FLIGHT.set(pool.busy, proxy.name)
+            WAITING.set(len(pool.waiters), proxy.name)
+            IDLE_CONTAINERS.set(len(pool.idle), proxy.name)
+    return collect
+
+
+def collect_executor():
+    """
+    Report the handler executors, and the work queue depth of the running
+    loop's default executor.
+    """
+    for gauge in (EXECUTOR_THREADS, EXECUTOR_BUSY_THREADS,
+                  EXECUTOR_ABANDONED_THREADS, EXECUTOR_QUEUE_DEPTH):
+        gauge.clear()
+    for name, executor in executors.EXECUTORS.items():
+        EXECUTOR_THREADS.set(executor.max_workers, name)
+        EXECUTOR_BUSY_THREADS.set(executor.running, name)
+        EXECUTOR_ABANDONED_THREADS.set(executor.abandoned, name)
+        EXECUTOR_QUEUE_DEPTH.set(executor.queued, name)
+    loop = asyncio.get_running_loop()
+    executor = getattr(loop, '_default_executor', None)
+    queue = getattr(executor, '_work_queue', None)
+    EXECUTOR_QUEUE_DEPTH.set(
+        queue.qsize() if queue is not None else 0, 'default')
+
+
+REGISTRY.add_collector(collect_executor)
+
+
+def get_metrics_handler(registry=REGISTRY):
+    async def metrics_handler(request):
+        return web.Response(
+            body=registry.render().encode(),
+            headers={'Content-Type': CONTENT_TYPE})
+    return metrics_handler
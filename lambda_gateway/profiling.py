@@ -0,0 +1,337 @@
+"""
+Opt-in sampling profiler for Lambda handlers.
+
+A profiler is attached to a function's EventProxy, either at startup
+(``--profile FUNCTION``) or through the admin endpoint:
+
+    POST   /__gateway/profile/{function}[?interval=S][&invocations=N]
+    GET    /__gateway/profile/{function}[?format=text|collapsed|pstats]
+    DELETE /__gateway/profile/{function}
+    GET    /__gateway/profile
+
+Functions are named by their logical ID, or by their handler spec when
+no other function shares it.
+
+While attached, a background thread samples the stacks of the threads
+running the function's invocations every ``interval`` seconds. Samples are
+aggregated across invocations and dumped as a pstats report, a pstats file
+or collapsed stacks for flamegraph tools. Functions without a profiler pay
+nothing beyond an attribute check.
+"""
+import collections
+import functools
+import inspect
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+
+from aiohttp import web
+
+PROFILE_PATH = '/__gateway/profile'
+
+
+class Profiler:
+    """
+    Sampling profiler aggregating stacks across invocations.
+
+    :param float interval: Seconds between samples [default: 0.005]
+    :param int invocations: Stop sampling after this many invocations
+    """
+    def __init__(self, interval=0.005, invocations=None):
+        self.interval = interval
+        self.limit = invocations
+        self.invocations = 0
+        self.samples = 0
+        self.stacks = collections.Counter()
+        self.active = collections.Counter()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.started = False
+        self.thread = None
+        self.pid = None
+
+    @property
+    def running(self):
+        return self.started and not self.stopped.is_set()
+
+    def start(self):
+        """
+        Start profiling.
+
+        The sampler thread is started by the first wrapped handler in each
+        process, so that workers forked after ``start()`` get their own.
+        """
+        self.started = True
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def wrap(self, handler):
+        """
+        Wrap a handler so that its invocations are sampled.
+
+        Only frames below the wrapper are recorded, so samples of a thread
+        (or of the event loop, for ``async def`` handlers) that is busy with
+        something else are dropped.
+        """
+        # Start the sampler lazily so that forked workers get their own
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        if inspect.iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def __profiled__(event, context):
+                ident = self.enter()
+                try:
+                    return await handler(event, context)
+                finally:
+                    self.exit(ident)
+        else:
+            @functools.wraps(handler)
+            def __profiled__(event, context):
+                ident = self.enter()
+                try:
+                    return handler(event, context)
+                finally:
+                    self.exit(ident)
+        return __profiled__
+
+    def enter(self):
+        ident = threading.get_ident()
+        with self.lock:
+            self.active[ident] += 1
+        return ident
+
+    def exit(self, ident):
+        with self.lock:
+            self.active[ident] -= 1
+            if not self.active[ident]:
+                del self.active[ident]
+            self.invocations += 1
+            if self.limit is not None and self.invocations >= self.limit:
+                self.stopped.set()
+
+    def run(self):
+        """
+        Sampler thread main loop.
+        """
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                idents = list(self.active)
+            if not idents:
+                continue
+            frames = sys._current_frames()
+            for ident in idents:
+                stack = get_stack(frames.get(ident))
+                if stack:
+                    with self.lock:
+                        self.stacks[stack] += 1
+                        self.samples += 1
+
+    def get_stats(self):
+        """
+        Convert samples to pstats data.
+
+        Call counts are sample counts; times are samples times interval.
+
+        :returns dict: pstats ``stats`` mapping
+        """
+        with self.lock:
+            stacks = list(self.stacks.items())
+        interval = self.interval
+        stats = {}
+
+        def entry(func):
+            if func not in stats:
+                stats[func] = [0, 0, 0.0, 0.0, {}]
+            return stats[func]
+
+        for stack, count in stacks:
+            for func in set(stack):
+                row = entry(func)
+                row[0] += count
+                row[1] += count
+                row[3] += count * interval
+            entry(stack[-1])[2] += count * interval
+            for i, (caller, callee) in enumerate(zip(stack, stack[1:])):
+                callers = entry(callee)[4]
+                cc, nc, tt, ct = callers.get(caller, (0, 0, 0.0, 0.0))
+                leaf = i == len(stack) - 2
+                callers[caller] = (
+                    cc + count, nc + count,
+                    tt + (count * interval if leaf else 0.0),
+                    ct + count * interval)
+        return {func: tuple(row) for func, row in stats.items()}
+
+    def get_pstats(self):
+        """
+        Get samples as a pstats.Stats object.
+        """
+        holder = type('Samples', (), {
+            'stats': self.get_stats(),
+            'create_stats': lambda self: None,
+        })()
+        return pstats.Stats(holder, stream=io.StringIO())
+
+    def dump(self, format='text'):
+        """
+        Dump aggregated samples.
+
+        :param str format: ``text`` (pstats report sorted by cumulative
+            time), ``collapsed`` (flamegraph stacks) or ``pstats`` (file
+            for ``python -m pstats`` or snakeviz)
+        :returns bytes: Dump
+        """
+        if format == 'collapsed':
+            with self.lock:
+                stacks = list(self.stacks.items())
+            lines = (
+                ';'.join(map(get_label, stack)) + f' {count}'
+                for stack, count in stacks)
+            return ('\n'.join(lines) + '\n').encode()
+        elif format == 'pstats':
+            if not self.samples:
+                raise ValueError('No samples yet')
+            return marshal.dumps(self.get_stats())
+        elif format == 'text':
+            header = (f'{self.samples} samples of {self.invocations} '
+                      f'invocations, every {self.interval * 1000:g} ms\n')
+            if not self.samples:
+                return header.encode()
+            stats = self.get_pstats()
+            stats.sort_stats('cumulative').print_stats(50)
+            return (header + stats.stream.getvalue()).encode()
+        raise ValueError(f"Unknown profile format '{format}'")
+
+
+def get_stack(frame):
+    """
+    Get the stack below the profiling wrapper, from the outermost frame.
+
+    :returns tuple: (filename, line, function name) per frame, or None if
+        the frame is not running a profiled handler
+    """
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == '__profiled__':
+            return tuple(reversed(stack))
+        stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+        frame = frame.f_back
+    return None
+
+
+def get_label(func):
+    filename, line, name = func
+    return f'{name} ({os.path.basename(filename)}:{line})'
+
+
+def find_proxy(name, proxies):
+    """
+    Find a function by name, or by handler spec if only one function has
+    that handler.
+
+    :param str name: Function name or handler spec
+    :param dict proxies: EventProxy by function
+    :returns EventProxy: Function
+    :raises LookupError: If no function, or several, match
+    """
+    matches = [proxy for proxy in proxies.values() if proxy.name == name] \
+        or [proxy for proxy in proxies.values() if proxy.handler == name]
+    if not matches:
+        raise LookupError(f"No function named '{name}'")
+    if len(matches) > 1:
+        raise LookupError(
+            f"Several functions have handler '{name}': "
+            + ', '.join(sorted(proxy.name for proxy in matches)))
+    return matches[0]
+
+
+def get_proxy(request, proxies):
+    try:
+        return find_proxy(request.match_info['function'], proxies)
+    except LookupError as err:
+        raise web.HTTPNotFound(text=f'{err}\n')
+
+
+def start(proxy, interval=0.005, invocations=None):
+    """
+    Attach a new profiler to a function, replacing any previous one.
+
+    :returns Profiler: Started profiler
+    """
+    if proxy.isolation == 'process':
+        raise ValueError(
+            'Profiling is not supported with --isolation=process')
+    if proxy.profiler is not None:
+        proxy.profiler.stop()
+    proxy.profiler = Profiler(interval, invocations).start()
+    return proxy.profiler
+
+
+def get_routes(proxies):
+    """
+    Get the admin routes controlling profilers.
+
+    :param dict proxies: EventProxy by function; may change on reload
+    :returns list: Route definitions (web.RouteDef)
+    """
+    async def index(request):
+        return web.json_response([
+            {
+                'function': proxy.name,
+                'handler': proxy.handler,
+                'running': proxy.profiler.running,
+                'invocations': proxy.profiler.invocations,
+                'samples': proxy.profiler.samples,
+            }
+            for proxy in proxies.values() if proxy.profiler is not None
+        ])
+
+    async def post(request):
+        proxy = get_proxy(request, proxies)
+        try:
+            interval = float(request.query.get('interval', 0.005))
+            invocations = request.query.get('invocations')
+            invocations = int(invocations) if invocations else None
+            start(proxy, interval, invocations)
+        except ValueError as err:
+            raise web.HTTPBadRequest(text=f'{err}\n')
+        return web.Response(status=201, text=f'Profiling {proxy.name}\n')
+
+    async def get(request):
+        proxy = get_proxy(request, proxies)
+        if proxy.profiler is None:
+            raise web.HTTPNotFound(text=f'{proxy.name} is not profiled\n')
+        format = request.query.get('format', 'text')
+        try:
+            body = proxy.profiler.dump(format)
+        except ValueError as err:
+            raise web.HTTPBadRequest(text=f'{err}\n')
+        if format == 'pstats':
+            return web.Response(body=body, headers={
+                'Content-Type': 'application/octet-stream',
+                'Content-Disposition':
+                    f'attachment; filename="{proxy.name}.pstats"',
+            })
+        return web.Response(body=body, content_type='text/plain')
+
+    async def delete(request):
+        proxy = get_proxy(request, proxies)
+        if proxy.profiler is not None:
+            proxy.profiler.stop()
+            proxy.profiler = None
+        return web.Response(status=204)
+
+    path = PROFILE_PATH + '/{function}'
+    return [
+        web.get(PROFILE_PATH, index),
+        web.post(path, post),
+        web.get(path, get),
+        web.delete(path, delete),
+    ]
@@ -0,0 +1,84 @@
+import importlib.util
+import os
+import sys
+
+from lambda_gateway import importer, logger
+
+
+def get_modules(paths):
+    """
+    Get loaded modules whose source file is one of the given paths.
+
+    :param iterable paths: Changed file paths
+    :returns list: Module names, most recently imported first
+    """
+    paths = {os.path.abspath(path) for path in paths}
+    return [
+        name for name, module in reversed(list(sys.modules.items()))
+        if getattr(module, '__file__', None)
+        and os.path.abspath(module.__file__) in paths
+    ]
+
+
+def reimport(name):
+    """
+    Import a fresh copy of a loaded module.
+
+    Unlike ``importlib.reload()`` the old module object is left untouched,
+    so code that is still running (in-flight invocations) keeps seeing its
+    own globals. On failure the old module stays in place.
+
+    :param str name: Module name
+    """
+    old = sys.modules[name]
+    module = importlib.util.module_from_spec(old.__spec__)
+    sys.modules[name] = module
+    try:
+        old.__spec__.loader.exec_module(module)
+    except BaseException:
+        sys.modules[name] = old
+        raise
+    parent, _, child = name.rpartition('.')
+    if parent in sys.modules:
+        setattr(sys.modules[parent], child, module)
+
+
+def reload(paths, proxies):
+    """
+    Reload changed modules and rebuild the handlers that depend on them.
+
+    Changed modules are re-imported first, then the handler module of every
+    function whose code path contains a change, so that names imported from
+    the changed modules are rebound. Functions whose code was imported in
+    their own namespace re-import all of their modules. Unaffected handlers
+    are left warm.
+
+    :param list paths: Changed file paths, as reported by the watcher
+    :param iterable proxies: EventProxy instances of the running server
+    :returns list: Invalidated proxies
+    """
+    names = [name for name in get_modules(paths)
+             if importer.get_owner(name) is None]
+    stale = [proxy for proxy in proxies if proxy.invalidate(paths)]
+    namespaces = {}
+    for proxy in stale:
+        name = proxy.handler.rpartition('.')[0]
+        namespace = importer.get_namespace(proxy.code_path)
+        if namespace.owns(name):
+            namespaces.setdefault(namespace, []).append(name)
+        elif name in sys.modules and name not in names:
+            names.append(name)
+    for name in names:
+        try:
+            reimport(name)
+            logger.info('Reloaded module "%s"', name)
+        except Exception as err:
+            logger.error('Unable to reload module "%s": %s', name, err)
+    for namespace, handlers in namespaces.items():
+        try:
+            namespace.reload(handlers)
+            logger.info('Reloaded modules of "%s"', namespace.code_path)
+        except Exception as err:
+            logger.error('Unable to reload modules of "%s": %s',
+                         namespace.code_path, err)
+    return stale
@@ -1,19 +1,96 @@
 from urllib import parse
 from aiohttp import web
+import asyncio
 import base64
+import time
+
+from lambda_gateway import metrics, streaming, tracing
+from lambda_gateway.event_builder import BUILDERS
+from lambda_gateway.response_cache import CachedResponse, get_ttl
+from lambda_gateway.router import PATH_PARAMETERS, ROUTE
+
+# Lambda's synchronous invocation payload limit
+MAX_BODY_SIZE = 6 * 1024 * 1024
+
+# Content types forwarded as text; anything else is base64-encoded
+TEXT_CONTENT_TYPES = (
+    'application/javascript',
+    'application/json',
+    'application/x-www-form-urlencoded',
+    'application/xml',
+)
+
+
+def get_server_timing(**durations):
+    """
+    Format phase durations (in seconds) as a Server-Timing header value.
+    """
+    return ', '.join(
+        f'{name};dur={duration * 1000:.3f}'
+        for name, duration in durations.items())
+
 
 class LambdaRequestHandler:
+    chunk_size = 64 * 1024
+
+    @staticmethod
+    def is_text(request):
+        """
+        Whether a request body is forwarded to Lambda as text.
+
+        Requests without a Content-Type header are treated as text.
+        """
+        if 'Content-Type' not in request.headers:
+            return True
+        content_type = request.content_type
+        return content_type.startswith('text/') \
+            or content_type.endswith(('+json', '+xml')) \
+            or content_type in TEXT_CONTENT_TYPES
+
     async def get_body(self, request):
         """
         Get request body to forward to Lambda handler.
+
+        The body is read in chunks, up to ``max_body_size`` bytes. Text is
+        decoded once, straight from the bytes read; binary content is
+        base64-encoded chunk by chunk as it arrives.
+
+        :returns tuple: (body, isBase64Encoded)
         """
         if not request.can_read_body:
-            return ''
+            return '', False
+        with tracing.span('body'):
+            return await self.read_body(request)
+
+    async def read_body(self, request):
+        if (request.content_length or 0) > self.max_body_size:
+            raise web.HTTPRequestEntityTooLarge(
+                self.max_body_size, request.content_length)
+
+        binary = not self.is_text(request)
+        chunks = []
+        size = 0
+        rest = b''
+        async for chunk in request.content.iter_chunked(self.chunk_size):
+            size += len(chunk)
+            if size > self.max_body_size:
+                raise web.HTTPRequestEntityTooLarge(self.max_body_size, size)
+            if binary:
+                # Encode whole 3-byte groups now, carry the rest over
+                chunk = rest + chunk
+                cut = len(chunk) - len(chunk) % 3
+                rest = chunk[cut:]
+                chunk = base64.b64encode(chunk[:cut])
+            chunks.append(chunk)
+
+        if binary:
+            chunks.append(base64.b64encode(rest))
+            return b''.join(chunks).decode('ascii'), True
+        body = b''.join(chunks)
         try:
-            #content_length = request.content_length
-            return await request.text()
-        except TypeError:
-            return ''
+            return body.decode(request.charset or 'utf-8'), False
+        except (LookupError, UnicodeDecodeError):
+            return base64.b64encode(body).decode('ascii'), True
 
     async def get_event(self, request):
         """
@@ -23,11 +100,30 @@ class LambdaRequestHandler:
         :return dict: Lambda event object
         """
         if self.version == '1.0':
-            return await self.get_event_v1(request)
+            event = await self.get_event_v1(request)
         elif self.version == '2.0':
-            return await self.get_event_v2(request)
-        raise ValueError(  # pragma: no cover
-            f'Unknown API Gateway payload version: {self.version}')
+            event = await self.get_event_v2(request)
+        else:
+            raise ValueError(  # pragma: no cover
+                f'Unknown API Gateway payload version: {self.version}')
+        span = tracing.current_span()
+        if span is not None:
+            name = 'x-amzn-trace-id' if self.version == '2.0' \
+                else 'X-Amzn-Trace-Id'
+            event['headers'][name] = span.trace_header
+        return event
+
+    def get_builder(self, request):
+        """
+        Get the event builder of the request's route, compiling it on first
+        use.
+        """
+        route = request.get(ROUTE)
+        try:
+            return self.builders[route]
+        except KeyError:
+            builder = self.builders[route] = BUILDERS[self.version](route)
+            return builder
 
     async def get_event_v1(self, request):
         """
@@ -36,14 +132,9 @@ class LambdaRequestHandler:
         :param str httpMethod: HTTP request method
         :return dict: Lambda event object
         """
-        return {
-            'version': '1.0',
-            'body': await self.get_body(request),
-            'headers': dict(request.headers),
-            'httpMethod': request.method,
-            'path': request.path,
-            'queryStringParameters': dict(request.query),
-        }
+        body, is_base64_encoded = await self.get_body(request)
+        return self.get_builder(request).build(
+            request, body, is_base64_encoded, request.get(PATH_PARAMETERS))
 
     async def get_event_v2(self, request):
         """
@@ -52,22 +143,9 @@ class LambdaRequestHandler:
         :param str httpMethod: HTTP request method
         :return dict: Lambda event object
         """
-        route_key = request.headers.get('x-route-key') or f'{request.method} {request.path}'
-        return {
-            'version': '2.0',
-            'body': await self.get_body(request),
-            'routeKey': route_key,
-            'rawPath': request.path,
-            'rawQueryString': request.query_string,
-            'headers': dict(request.headers),
-            'queryStringParameters': dict(request.query),
-            'requestContext': {
-                'http': {
-                    'method': request.method,
-                    'path': request.path,
-                },
-            },
-        }
+        body, is_base64_encoded = await self.get_body(request)
+        return self.get_builder(request).build(
+            request, body, is_base64_encoded, request.get(PATH_PARAMETERS))
 
     async def invoke(self, request):
         """
@@ -77,28 +155,179 @@ class LambdaRequestHandler:
         :param Context context: Mock Lambda context
         :returns dict: Lamnda invocation result
         """
+        with tracing.span('request', request.headers,
+                          **{'http.method': request.method,
+                             'http.target': request.path_qs}) as span:
+            if request.method == 'GET' \
+                    and (self.cache_ttl or self.single_flight):
+                response = await self.handle_get(request)
+            else:
+                response = await self.handle(request)
+            if self.compressor is not None \
+                    and type(response) is web.Response:
+                with tracing.span('compress'):
+                    response = await self.compressor.compress_response(
+                        request, response)
+            if span is not None:
+                span.attributes['http.status_code'] = response.status
+            return response
+
+    async def handle_get(self, request):
+        """
+        Serve a GET request from the response cache, or from the invocation
+        of an identical request already in flight, or invoke the handler.
+
+        Only whole ``200`` responses are cached, for ``cache_ttl`` seconds
+        unless their Cache-Control header says otherwise. Requests sent
+        with ``Cache-Control: no-cache`` skip the lookup.
+
+        With ``single_flight``, concurrent requests with the same cache key
+        wait for the first one's invocation and replay its response.
+        Streamed responses cannot be replayed, so those waiters invoke the
+        handler themselves.
+        """
+        route = request.get(ROUTE)
+        route_key = route.RouteKey if route else ''
+        key = self.cache.get_key(request)
+        if self.cache_ttl:
+            if 'no-cache' not in request.headers.get('Cache-Control', ''):
+                entry = self.cache.get(key)
+                if entry is not None:
+                    metrics.CACHE_HITS.inc(route_key)
+                    return entry.get_response()
+            metrics.CACHE_MISSES.inc(route_key)
+        if not self.single_flight:
+            response = await self.handle(request)
+            self.cache_response(key, response)
+            return response
+
+        waiter = self.in_flight.get(key)
+        if waiter is not None:
+            entry = await asyncio.shield(waiter)
+            if entry is not None:
+                metrics.COALESCED.inc(route_key)
+                return entry.get_response('Coalesced')
+            return await self.handle(request)
+
+        waiter = self.in_flight[key] = \
+            asyncio.get_running_loop().create_future()
+        entry = None
+        try:
+            response = await self.handle(request)
+            entry = self.cache_response(key, response)
+            return response
+        finally:
+            del self.in_flight[key]
+            waiter.set_result(entry)
+
+    def cache_response(self, key, response):
+        """
+        Cache a response if it is cacheable.
+
+        :returns CachedResponse: Snapshot of the response, or None for
+            streamed responses
+        """
+        if type(response) is not web.Response:
+            return None
+        entry = None
+        if self.cache_ttl and response.status == 200:
+            ttl = get_ttl(response.headers.get('Cache-Control'),
+                          self.cache_ttl)
+            response.headers['X-Cache'] = 'Miss'
+            if ttl > 0:
+                entry = CachedResponse.from_response(response, ttl)
+                self.cache.add(key, entry)
+        if entry is None and self.single_flight:
+            entry = CachedResponse.from_response(response)
+        return entry
+
+    async def handle(self, request):
+        started = time.perf_counter()
+
         # Get Lambda event
-        event = await self.get_event(request)
+        with tracing.span('event'):
+            event = await self.get_event(request)
+        built = time.perf_counter()
 
         # Get Lambda result
-        res = await self.proxy.invoke(event)
+        res = streaming.get_streamed_result(await self.proxy.invoke(event))
+        invoked = time.perf_counter()
 
         # Parse response
         status = res.get('statusCode') or 500
         headers = res.get('headers') or {}
 
-        body = res.get('body', '').encode()
+        if streaming.is_stream(res.get('body')):
+            with tracing.span('stream'):
+                return await self.stream(request, res, status, headers)
 
-        if res.get('isBase64Encoded', False):
-            body = base64.b64decode(body)
+        with tracing.span('response'):
+            body = res.get('body', '').encode()
 
-        # Send response
-        return web.Response(status=status, body=body, headers={**headers, **self.extra_headers})
+            if res.get('isBase64Encoded', False):
+                body = base64.b64decode(body)
+
+            # Send response
+            response = web.Response(
+                status=status, body=body,
+                headers={**headers, **self.extra_headers})
+        if self.server_timing:
+            response.headers['Server-Timing'] = get_server_timing(
+                event=built - started,
+                invoke=invoked - built,
+                response=time.perf_counter() - invoked,
+            )
+        return response
+
+    async def stream(self, request, res, status, headers):
+        """
+        Forward a streamed Lambda result with chunked transfer encoding.
 
-    def __init__(self, proxy, version, extra_headers={}):
+        Chunks are written as the handler produces them, so the client gets
+        the first bytes early and the body is never held in memory.
+        """
+        headers = {
+            key: value for key, value in headers.items()
+            if key.lower() != 'content-length'
+        }
+        response = web.StreamResponse(
+            status=status, headers={**headers, **self.extra_headers})
+        response.enable_chunked_encoding()
+        body = res['body']
+        try:
+            await response.prepare(request)
+            chunks = streaming.iter_chunks(
+                body, res.get('isBase64Encoded', False))
+            async for chunk in chunks:
+                await response.write(chunk)
+        finally:
+            # Let the proxy release the container if the stream is cut short
+            if hasattr(body, 'aclose'):
+                await body.aclose()
+        await response.write_eof()
+        return response
+
+    def __init__(self, proxy, version, extra_headers={},
+                 max_body_size=MAX_BODY_SIZE, server_timing=False,
+                 cache=None, cache_ttl=0, single_flight=False,
+                 compressor=None):
         """
         Set up LambdaRequestHandler.
+
+        GET responses are cached in ``cache`` for ``cache_ttl`` seconds, if
+        both are set. ``single_flight`` coalesces concurrent GET requests
+        with the same cache key. Responses other than streams are
+        compressed by ``compressor``, if set; the cache keeps them
+        uncompressed.
         """
         self.proxy = proxy
         self.version = version
         self.extra_headers = extra_headers
+        self.max_body_size = max_body_size
+        self.server_timing = server_timing
+        self.builders = {}
+        self.cache = cache
+        self.cache_ttl = cache_ttl if cache is not None else 0
+        self.single_flight = single_flight and cache is not None
+        self.compressor = compressor
+        self.in_flight = {}
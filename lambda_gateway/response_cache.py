@@ -0,0 +1,146 @@
+import collections
+import re
+import time
+
+from aiohttp import web
+
+# Response headers that are not replayed from the cache
+UNCACHED_HEADERS = {'content-length', 'date', 'server-timing', 'x-cache'}
+
+MAX_AGE = re.compile(r'\b(s-maxage|max-age)\s*=\s*"?(\d+)', re.I)
+
+
+def get_ttl(cache_control, default):
+    """
+    Get the TTL of a response from its Cache-Control header.
+
+    ``no-store``, ``no-cache`` and ``private`` responses are not cached;
+    ``s-maxage`` (or else ``max-age``) overrides the route's TTL.
+
+    :param str cache_control: Cache-Control header value, or None
+    :param int default: Route TTL in seconds
+    :returns int: TTL in seconds, 0 for responses not to cache
+    """
+    if not cache_control:
+        return default
+    directives = cache_control.lower()
+    if 'no-store' in directives or 'no-cache' in directives \
+            or 'private' in directives:
+        return 0
+    ages = dict((k.lower(), int(v)) for k, v in MAX_AGE.findall(directives))
+    return ages.get('s-maxage', ages.get('max-age', default))
+
+
+class CachedResponse:
+    __slots__ = ('status', 'headers', 'body', 'created', 'expires', 'size')
+
+    def __init__(self, status, headers, body, ttl=0):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.created = time.monotonic()
+        self.expires = self.created + ttl
+        self.size = len(body) + sum(len(k) + len(v) for k, v in headers)
+
+    @classmethod
+    def from_response(cls, response, ttl=0):
+        """
+        Snapshot a response so that it can be replayed.
+
+        :param web.Response response: Response with a bytes body
+        :param int ttl: Seconds the snapshot stays fresh
+        """
+        headers = [
+            (name, value) for name, value in response.headers.items()
+            if name.lower() not in UNCACHED_HEADERS
+        ]
+        return cls(response.status, headers, response.body, ttl)
+
+    def get_response(self, x_cache='Hit'):
+        """
+        Get a new response replaying the cached one.
+
+        :param str x_cache: X-Cache header value
+        """
+        response = web.Response(status=self.status, body=self.body)
+        response.headers.extend(self.headers)
+        if x_cache == 'Hit':
+            response.headers['Age'] = \
+                str(int(time.monotonic() - self.created))
+        response.headers['X-Cache'] = x_cache
+        return response
+
+
+class ResponseCache:
+    """
+    In-memory LRU cache of handler responses.
+
+    Responses are keyed on method, path, query string and selected request
+    headers, and evicted least recently used first once the cached bodies
+    and headers exceed ``max_size`` bytes.
+
+    :param int max_size: Maximum size of cached responses, in bytes
+    :param list key_headers: Request headers that vary the response
+    """
+    def __init__(self, max_size=64 * 1024 * 1024, key_headers=()):
+        self.max_size = max_size
+        self.key_headers = tuple(key_headers)
+        self.entries = collections.OrderedDict()
+        self.size = 0
+
+    def get_key(self, request):
+        """
+        Get the cache key of a request.
+        """
+        headers = request.headers
+        return (request.method, request.path, request.query_string,
+                *(headers.get(name) for name in self.key_headers))
+
+    def get(self, key):
+        """
+        Get a fresh cached response.
+
+        :returns CachedResponse: Cached response, or None
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= time.monotonic():
+            self.pop(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, response, ttl):
+        """
+        Cache a response for ``ttl`` seconds.
+
+        :param web.Response response: Response to cache
+        """
+        self.add(key, CachedResponse.from_response(response, ttl))
+
+    def add(self, key, entry):
+        """
+        Cache a response snapshot.
+
+        :param CachedResponse entry: Snapshot, fresh until its expiry
+        """
+        if entry.size > self.max_size:
+            return
+        self.pop(key)
+        self.entries[key] = entry
+        self.size += entry.size
+        while self.size > self.max_size:
+            self.pop(next(iter(self.entries)))
+
+    def pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def clear(self):
+        """
+        Drop all cached responses, e.g. after a code change.
+        """
+        self.entries.clear()
+        self.size = 0
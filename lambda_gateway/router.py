@@ -0,0 +1,199 @@
+import time
+from collections import namedtuple
+
+from aiohttp import web
+
+from lambda_gateway import metrics
+
+Route = namedtuple("Route", "Method Path Handler RouteKey")
+
+ANY_METHODS = ('ANY', '*')
+DEFAULT_PATH = '$default'
+
+# Request storage keys; typed keys where aiohttp supports them
+if hasattr(web, 'RequestKey'):  # pragma: no cover
+    ROUTE = web.RequestKey('route', Route)
+    PATH_PARAMETERS = web.RequestKey('path_parameters', dict)
+else:  # pragma: no cover
+    ROUTE = 'route'
+    PATH_PARAMETERS = 'path_parameters'
+
+
+def split_path(path):
+    """
+    Split a path into segments, e.g. ``/a/b`` into ``['a', 'b']``.
+    """
+    return path[1:].split('/') if path != '/' else []
+
+
+class Node:
+    """
+    Radix tree node, one per path segment.
+
+    Static segments are children keyed by their text; ``{name}`` segments
+    hang off ``param`` and a trailing ``{name+}`` off ``greedy``.
+    """
+    __slots__ = ('children', 'param', 'greedy', 'methods')
+
+    def __init__(self):
+        self.children = {}
+        self.param = None
+        self.greedy = None
+        self.methods = {}
+
+    def insert(self, segments, route):
+        node = self
+        for i, segment in enumerate(segments):
+            if segment.startswith('{') and segment.endswith('+}'):
+                if i != len(segments) - 1:
+                    raise ValueError(
+                        f'Greedy path variable must be last: {route.Path}')
+                if node.greedy is None:
+                    node.greedy = (segment[1:-2], {})
+                node.greedy[1][route.Method] = route
+                return
+            elif segment.startswith('{') and segment.endswith('}'):
+                if node.param is None:
+                    node.param = (segment[1:-1], Node())
+                node = node.param[1]
+            else:
+                node = node.children.setdefault(segment, Node())
+        node.methods[route.Method] = route
+
+    def match(self, segments, i, method, params):
+        """
+        Find the route for ``segments[i:]``, preferring static segments over
+        path variables over greedy path variables.
+
+        :returns Route: Matching route, or None
+        """
+        if i == len(segments):
+            route = get_route(self.methods, method)
+            if route is not None:
+                return route
+        else:
+            segment = segments[i]
+            child = self.children.get(segment)
+            if child is not None:
+                route = child.match(segments, i + 1, method, params)
+                if route is not None:
+                    return route
+            if self.param is not None and segment:
+                name, child = self.param
+                route = child.match(segments, i + 1, method, params)
+                if route is not None:
+                    params[name] = segment
+                    return route
+        if self.greedy is not None and any(segments[i:]):
+            name, methods = self.greedy
+            route = get_route(methods, method)
+            if route is not None:
+                params[name] = '/'.join(segments[i:])
+                return route
+        return None
+
+
+def get_route(methods, method):
+    """
+    Get the route for a method, falling back to an ANY route.
+    """
+    return methods.get(method) or methods.get('ANY')
+
+
+class Router:
+    """
+    Compiled, swappable route table for Lambda endpoints.
+
+    Routes use API Gateway path syntax (``/items/{id}``, ``/{proxy+}``,
+    ``$default``) and the ``ANY`` method. Static paths are looked up in a
+    dict; parameterized and greedy ones in a radix tree of path segments.
+
+    aiohttp freezes the application router once the server starts, so the
+    app has a single catch-all route that dispatches through this table
+    instead. Reloads swap in a new table; requests that were already
+    dispatched finish on the handlers they resolved.
+
+    :param list routes: Route definitions (web.RouteDef)
+    """
+    def __init__(self, routes=()):
+        self.set_routes(routes)
+
+    def set_routes(self, routes):
+        """
+        Compile and replace the route table.
+
+        :param list routes: Route definitions (web.RouteDef)
+        """
+        static = {}
+        tree = Node()
+        default = {}
+        for route in routes:
+            method, path, handler = \
+                route.method.upper(), route.path, route.handler
+            if method in ANY_METHODS:
+                method = 'ANY'
+            if path == DEFAULT_PATH:
+                route = Route(method, path, handler, DEFAULT_PATH)
+                default[method] = route
+                continue
+            route = Route(method, path, handler, f'{method} {path}')
+            if '{' in path:
+                tree.insert(split_path(path), route)
+            else:
+                static.setdefault(path, {})[method] = route
+        self.table = (static, tree, default)
+
+    def resolve(self, method, path):
+        """
+        Find the route for a request.
+
+        :returns tuple: (Route, dict of path parameters), or (None, None)
+        """
+        static, tree, default = self.table
+        methods = static.get(path)
+        if methods is not None:
+            route = get_route(methods, method)
+            if route is not None:
+                return route, {}
+        params = {}
+        route = tree.match(split_path(path), 0, method, params)
+        if route is not None:
+            return route, params
+        route = get_route(default, method)
+        if route is not None:
+            return route, {}
+        return None, None
+
+    async def handle(self, request):
+        """
+        Dispatch a request to the handler of its matching route.
+
+        The route and its path parameters are stored on the request under
+        the ``ROUTE`` and ``PATH_PARAMETERS`` keys. Requests are counted by
+        route key and status; unmatched ones under an empty route key.
+        """
+        started = time.perf_counter()
+        route, params = self.resolve(request.method, request.path)
+        route_key = route.RouteKey if route else ''
+        status = 500
+        try:
+            if route is None:
+                raise web.HTTPNotFound()
+            request[ROUTE] = route
+            request[PATH_PARAMETERS] = params
+            response = await route.Handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as err:
+            status = err.status
+            raise
+        finally:
+            metrics.REQUESTS.inc(route_key, status)
+            metrics.REQUEST_DURATION.observe(
+                time.perf_counter() - started, route_key)
+
+    def route(self):
+        """
+        Get the catch-all route to register on the application.
+        """
+        return web.RouteDef('*', r'/{path:.*}', self.handle, {})
@@ -1,43 +1,186 @@
 import json
 from collections import namedtuple
-from ruamel.yaml import YAML
 import re
 import os
 
-Endpoint = namedtuple("Endpoint", "CodeUri Handler Path Method")
+# Function is the function's unique name, e.g. its logical ID
+Endpoint = namedtuple(
+    "Endpoint", "CodeUri Handler Path Method Timeout MemorySize Function",
+    defaults=(None, None, None))
+
+METHODS = ('any', 'delete', 'get', 'head', 'options', 'patch', 'post', 'put')
+
+# CloudFormation short-form intrinsic function tags, e.g. !Sub
+INTRINSICS = (
+    'And', 'Base64', 'Cidr', 'Condition', 'Equals', 'FindInMap', 'GetAtt',
+    'GetAZs', 'If', 'ImportValue', 'Join', 'Not', 'Or', 'Ref', 'Select',
+    'Split', 'Sub', 'Transform',
+)
 
 class SamException(Exception):
     pass
 
+
+def construct_intrinsic(constructor, node):
+    tag = node.tag.lstrip('!')
+    if node.id == 'mapping':
+        value = constructor.construct_mapping(node, deep=True)
+    elif node.id == 'sequence':
+        value = constructor.construct_sequence(node, deep=True)
+    else:
+        value = constructor.construct_scalar(node)
+        if tag == 'GetAtt':
+            value = value.split('.', 1)
+    return {tag if tag in ('Ref', 'Condition') else f'Fn::{tag}': value}
+
+
+def construct_unknown_tag(constructor, tag_suffix, node):
+    """
+    Read a value with an unknown ``!`` tag as if it was untagged, as the
+    round-trip loader used to.
+    """
+    if node.id == 'mapping':
+        return constructor.construct_mapping(node, deep=True)
+    elif node.id == 'sequence':
+        return constructor.construct_sequence(node, deep=True)
+    return constructor.construct_scalar(node)
+
+
+def get_yaml():
+    """
+    Get a safe YAML loader reading CloudFormation short-form intrinsics
+    (``!Ref x``) as their long form (``{'Ref': 'x'}``). Values with other
+    ``!`` tags are read as if they were untagged.
+
+    ruamel.yaml is only imported here, so that loading a cached manifest
+    or a CDK stack doesn't pay for it.
+    """
+    from ruamel.yaml import YAML
+    from ruamel.yaml.constructor import SafeConstructor
+
+    class IntrinsicConstructor(SafeConstructor):
+        pass
+
+    for tag in INTRINSICS:
+        IntrinsicConstructor.add_constructor(f'!{tag}', construct_intrinsic)
+    IntrinsicConstructor.add_multi_constructor('!', construct_unknown_tag)
+
+    yaml = YAML(typ='safe')
+    yaml.Constructor = IntrinsicConstructor
+    return yaml
+
 class SAM:
+    """
+    SAM template.
 
-    def __init__(self, config_filename):
+    Templates are parsed with the safe loader, which uses the C extension
+    of ruamel.yaml when it is installed; comments and quoting are not kept.
+    """
 
-        yaml = YAML()
-        yaml.preserve_quotes = True
-        yaml.default_flow_style = False
+    def __init__(self, config_filename):
 
         with open(config_filename, "rt") as f:
-            self.template = yaml.load(f.read())
+            self.template = get_yaml().load(f.read()) or {}
 
-    def get_endpoints(self):
+    def get_functions(self):
+        """
+        Get the properties of each function, with ``Globals.Function``
+        applied.
+
+        :returns iterator: (resource name, properties) of each function
+        """
+        defaults = self.template.get('Globals', {}).get('Function', {})
         for name, resource in self.template.get('Resources', {}).items():
             if resource.get('Type', '') == 'AWS::Serverless::Function':
-                resprops = resource.get('Properties', {})
-                CodeUri = resprops.get('CodeUri', '')
-                Handler = resprops.get('Handler', '')
-                Events = resprops.get('Events', {})
-
-                for eventname, event in Events.items():
-                    if event.get('Type', '') == 'HttpApi':
-                        eventprops = event.get('Properties', {})
-                        Path = eventprops.get('Path', '/')
-                        Method = eventprops.get('Method', 'get')
-
-                        if Method not in ('get', 'post'):
-                            raise SamException(f'{Method} not supported in {name} / {eventname}')
-                        
-                        yield Endpoint(CodeUri, Handler, Path, Method)
+                yield name, {**defaults, **resource.get('Properties', {})}
+
+    def get_number(self, value):
+        """
+        Get a numeric property, resolving ``!Ref`` to the default of a
+        template parameter.
+
+        Other intrinsics (``!If``, ``!FindInMap``, ...) are not evaluated.
+
+        :param value: Property value, as parsed
+        :returns int: Number, or None if the value is not a number
+        """
+        if isinstance(value, dict) and list(value) == ['Ref']:
+            parameter = self.template.get('Parameters', {}).get(value['Ref'])
+            value = (parameter or {}).get('Default')
+        if isinstance(value, bool):
+            return None
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return None
+
+    def get_endpoints(self):
+        for name, resprops in self.get_functions():
+            CodeUri = resprops.get('CodeUri', '')
+            Handler = resprops.get('Handler', '')
+            Timeout = self.get_number(resprops.get('Timeout'))
+            MemorySize = self.get_number(resprops.get('MemorySize'))
+            Events = resprops.get('Events', {})
+
+            for eventname, event in Events.items():
+                if event.get('Type', '') == 'HttpApi':
+                    eventprops = event.get('Properties', {})
+                    Path = eventprops.get('Path', '/')
+                    Method = eventprops.get('Method', 'get').lower()
+
+                    if Method not in METHODS:
+                        raise SamException(
+                            f'{Method} not supported in {name} / {eventname}')
+
+                    yield Endpoint(CodeUri, Handler, Path, Method,
+                                   Timeout, MemorySize, name)
+
+    def get_cache_settings(self):
+        """
+        Get API Gateway caching settings from ``MethodSettings``.
+
+        Settings are read from ``AWS::Serverless::Api`` and
+        ``AWS::ApiGateway::Stage`` resources and ``Globals.Api``. Resource
+        paths use the API Gateway encoding (``/~1items~1{id}``), with
+        ``/*`` and ``*`` matching any path or method.
+
+        :returns list: (method, path, TTL in seconds) of cached methods
+        """
+        apis = [self.template.get('Globals', {}).get('Api', {})]
+        for resource in self.template.get('Resources', {}).values():
+            if resource.get('Type', '') in (
+                    'AWS::Serverless::Api', 'AWS::ApiGateway::Stage'):
+                apis.append(resource.get('Properties', {}))
+        settings = []
+        for api in apis:
+            for setting in api.get('MethodSettings', []):
+                if not setting.get('CachingEnabled', False):
+                    continue
+                path = setting.get('ResourcePath', '/*')
+                if path != '/*':
+                    path = path[1:].replace('~1', '/') or '/'
+                method = setting.get('HttpMethod', '*').upper()
+                ttl = self.get_number(setting.get('CacheTtlInSeconds', 300))
+                if ttl is not None:
+                    settings.append((method, path, ttl))
+        return settings
+
+    def get_reserved_concurrency(self):
+        """
+        Get each function's ``ReservedConcurrentExecutions``.
+
+        Functions without their own setting inherit it from
+        ``Globals.Function``.
+
+        :returns dict: Reserved concurrency by function logical ID
+        """
+        reserved = {}
+        for name, resprops in self.get_functions():
+            limit = self.get_number(
+                resprops.get('ReservedConcurrentExecutions'))
+            if limit is not None:
+                reserved[name] = limit
+        return reserved
 
 def load_env_vars(env_vars_path, mapping=None):
     if not env_vars_path:
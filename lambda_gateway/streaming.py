@@ -0,0 +1,100 @@
+import asyncio
+import base64
+
+from lambda_gateway import executors
+
+_END = object()
+
+
+def is_stream(body):
+    """
+    Whether a handler result (or its body) is a stream of chunks.
+
+    Anything iterable other than a string, bytes or a response dict counts,
+    e.g. generators, async generators, iterators and lists of chunks.
+    """
+    if isinstance(body, (str, bytes, bytearray, dict)):
+        return False
+    return hasattr(body, '__iter__') or hasattr(body, '__aiter__')
+
+
+def get_streamed_result(res):
+    """
+    Normalise a handler result so a bare stream becomes a 200 response.
+
+    :param object res: Lambda invocation result
+    :returns dict: Lambda invocation result
+    """
+    if is_stream(res):
+        return {'statusCode': 200, 'body': res}
+    return res
+
+
+def materialize(res):
+    """
+    Collect the chunks of a streamed result into a list.
+
+    Used where a stream cannot be passed on as-is, e.g. to send it back
+    from a worker process.
+
+    :param object res: Lambda invocation result
+    :returns object: Result with any streamed body as a list of chunks
+    """
+    res = get_streamed_result(res)
+    if isinstance(res, dict) and is_stream(res.get('body')):
+        body = res['body']
+        if hasattr(body, '__aiter__'):
+            async def collect():
+                return [chunk async for chunk in body]
+            chunks = asyncio.run(collect())
+        else:
+            chunks = list(body)
+        res = {**res, 'body': chunks}
+    return res
+
+
+async def iter_chunks(body, is_base64_encoded=False):
+    """
+    Iterate over a streamed body as bytes.
+
+    Blocking iterators are advanced in the shared handlers pool, so a slow
+    generator does not stall the event loop. Base64-encoded chunks are
+    decoded one by one, so each must be a whole number of 4-char groups.
+
+    :param iterable body: Iterable or async iterable of str/bytes chunks
+    :param bool is_base64_encoded: Whether chunks are base64-encoded
+    """
+    async for chunk in iter_body(body):
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        if is_base64_encoded:
+            chunk = base64.b64decode(chunk)
+        if chunk:
+            yield chunk
+
+
+def iter_body(body, executor=None):
+    """
+    Iterate asynchronously over the chunks of a streamed body.
+
+    :param iterable body: Iterable or async iterable of chunks
+    :param Executor executor: Thread pool advancing blocking iterators
+        [default: the shared handlers pool]
+    :returns: Async iterator of chunks
+    """
+    if hasattr(body, '__aiter__'):
+        return body
+    return _iter_in_executor(body, executor or executors.get_executor())
+
+
+async def _iter_in_executor(body, executor):
+    if isinstance(body, (list, tuple)):
+        for chunk in body:
+            yield chunk
+        return
+    iterator = iter(body)
+    while True:
+        chunk = await executor.run(next, iterator, _END)
+        if chunk is _END:
+            return
+        yield chunk
@@ -0,0 +1,271 @@
+"""
+Per-request phase tracing with OpenTelemetry-compatible spans.
+
+Tracing is off unless an exporter is configured with ``configure()``; until
+then ``span()`` returns a shared no-op context manager. The current span is
+kept in a context variable, so spans opened in a request task nest under
+that request's root span.
+
+Trace IDs follow the W3C format (32 hex digits) and are propagated to
+handlers as an X-Ray style ``X-Amzn-Trace-Id`` header, whose ``Root`` is
+the same ID split as ``1-<8 hex>-<24 hex>``.
+"""
+import contextlib
+import contextvars
+import json
+import os
+import queue
+import re
+import threading
+import time
+import urllib.request
+
+from lambda_gateway import logger
+
+_current = contextvars.ContextVar('lambda_gateway_span', default=None)
+_noop = contextlib.nullcontext()
+
+# Active exporter; None disables tracing
+exporter = None
+
+TRACEPARENT = re.compile(r'^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-')
+AMZN_TRACE_ID = re.compile(r'Root=1-([0-9a-f]{8})-([0-9a-f]{24})')
+
+
+class Span:
+    """
+    Timed phase of a request.
+
+    :param str name: Span name
+    :param str trace_id: Trace ID (32 hex digits)
+    :param str parent_id: Parent span ID, or None for a root span
+    :param dict attributes: Span attributes
+    """
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start',
+                 'end', 'attributes', 'error')
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None,
+                 start=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start = start or time.time_ns()
+        self.end = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    @property
+    def trace_header(self):
+        """
+        X-Ray style trace header, e.g. for ``X-Amzn-Trace-Id``.
+        """
+        return (f'Root=1-{self.trace_id[:8]}-{self.trace_id[8:]};'
+                f'Parent={self.span_id};Sampled=1')
+
+    def to_dict(self):
+        """
+        Get the span as OTLP/JSON.
+        """
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'startTimeUnixNano': str(self.start),
+            'endTimeUnixNano': str(self.end),
+            'attributes': [
+                {'key': key, 'value': get_any_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            'status': {'code': 2, 'message': self.error}
+            if self.error else {'code': 0},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+def get_any_value(value):
+    """
+    Convert an attribute value to an OTLP AnyValue.
+    """
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    elif isinstance(value, int):
+        return {'intValue': str(value)}
+    elif isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def get_remote_parent(headers):
+    """
+    Get the (trace ID, parent span ID) from incoming trace headers.
+
+    Supports W3C ``traceparent`` and X-Ray ``X-Amzn-Trace-Id`` headers.
+
+    :returns tuple: (trace ID, parent span ID or None), or (None, None)
+    """
+    match = TRACEPARENT.match(headers.get('traceparent', ''))
+    if match:
+        return match.group(1), match.group(2)
+    match = AMZN_TRACE_ID.search(headers.get('X-Amzn-Trace-Id', ''))
+    if match:
+        return match.group(1) + match.group(2), None
+    return None, None
+
+
+def current_span():
+    """
+    Get the span of the current request phase, if tracing.
+    """
+    return _current.get()
+
+
+@contextlib.contextmanager
+def _span(name, attributes, headers):
+    parent = _current.get()
+    if parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    else:
+        trace_id, parent_id = get_remote_parent(headers or {})
+        trace_id = trace_id or os.urandom(16).hex()
+    span = Span(name, trace_id, parent_id, attributes)
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as err:
+        span.error = f'{type(err).__name__}: {err}'
+        raise
+    finally:
+        _current.reset(token)
+        span.end = time.time_ns()
+        exporter.export(span)
+
+
+def span(name, headers=None, **attributes):
+    """
+    Time a request phase as a child of the current span.
+
+    Without a current span a new trace is started, continuing the one in
+    ``headers`` if they carry a trace header.
+
+    :param str name: Span name
+    :param dict headers: Incoming request headers, for root spans
+    :returns contextmanager: Yields the Span, or None if not tracing
+    """
+    if exporter is None:
+        return _noop
+    return _span(name, attributes, headers)
+
+
+def add_span(name, start, end, **attributes):
+    """
+    Record an already finished phase under the current span.
+
+    Useful for phases that ran outside the request task, e.g. in an
+    executor thread.
+
+    :param int start: Start time, in nanoseconds since the epoch
+    :param int end: End time, in nanoseconds since the epoch
+    """
+    parent = _current.get()
+    if exporter is None or parent is None:
+        return
+    span = Span(name, parent.trace_id, parent.span_id, attributes, start)
+    span.end = end
+    exporter.export(span)
+
+
+class FileExporter:
+    """
+    Append spans to a file, one OTLP/JSON span per line.
+
+    :param str path: Output file path
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.pid = None
+
+    def export(self, span):
+        # Reopen after a fork so each worker has its own file object
+        if self.pid != os.getpid():
+            self.file = open(self.path, 'a', buffering=1)
+            self.pid = os.getpid()
+        self.file.write(json.dumps(span.to_dict()) + '\n')
+
+
+class OTLPExporter:
+    """
+    Post spans in batches to an OTLP/HTTP JSON collector endpoint.
+
+    Spans are queued and sent by a background thread, so requests never
+    wait for the collector.
+
+    :param str endpoint: Collector URL, e.g. ``http://localhost:4318``
+    :param int batch_size: Maximum spans per request
+    :param float interval: Seconds to wait for a batch to fill up
+    """
+    def __init__(self, endpoint, batch_size=512, interval=1.0):
+        if not endpoint.rstrip('/').endswith('/v1/traces'):
+            endpoint = endpoint.rstrip('/') + '/v1/traces'
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = None
+        self.pid = None
+
+    def export(self, span):
+        # Start the sender lazily so that forked workers get their own
+        if self.pid != os.getpid():
+            self.queue = queue.Queue()
+            self.pid = os.getpid()
+            threading.Thread(target=self.run, daemon=True).start()
+        self.queue.put(span)
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get(
+                        timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self.send(batch)
+            except Exception as err:
+                logger.error('Unable to export %d spans: %s', len(batch), err)
+
+    def send(self, spans):
+        body = json.dumps({
+            'resourceSpans': [{
+                'resource': {'attributes': [{
+                    'key': 'service.name',
+                    'value': {'stringValue': 'lambda-gateway'},
+                }]},
+                'scopeSpans': [{
+                    'scope': {'name': 'lambda_gateway'},
+                    'spans': [span.to_dict() for span in spans],
+                }],
+            }],
+        }).encode()
+        request = urllib.request.Request(
+            self.endpoint, body, {'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=10) as res:
+            res.read()
+
+
+def configure(destination):
+    """
+    Enable tracing, exporting spans to a file or an OTLP collector.
+
+    :param str destination: File path, or ``http(s)://`` collector URL
+    """
+    global exporter
+    if destination.startswith(('http://', 'https://')):
+        exporter = OTLPExporter(destination)
+    else:
+        exporter = FileExporter(destination)
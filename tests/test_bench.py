@@ -0,0 +1,39 @@
+import filecmp
+
+import pytest
+
+from lambda_gateway import bench
+from lambda_gateway.request_handler import get_server_timing
+
+
+def test_server_timing_roundtrip():
+    header = get_server_timing(event=0.001, invoke=0.25)
+    assert header == 'event;dur=1.000, invoke;dur=250.000'
+    assert bench.parse_server_timing(header) == \
+        {'event': 0.001, 'invoke': 0.25}
+
+
+def test_get_percentiles():
+    ret = bench.get_percentiles([x / 1000 for x in range(1, 101)])
+    assert ret == {
+        'p50': pytest.approx(50.5),
+        'p95': pytest.approx(95.05),
+        'p99': pytest.approx(99.01),
+    }
+
+
+def test_compare():
+    ret = bench.compare(
+        {'rps': 110, 'latency_ms': {'p50': 9}, 'version': '1'},
+        {'rps': 100, 'latency_ms': {'p50': 10}, 'version': '0'},
+    )
+    assert ret == {
+        'rps': pytest.approx(10),
+        'latency_ms.p50': pytest.approx(-10),
+    }
+
+
+def test_sample_handler():
+    # The packaged copy must match the root lambda_function.py
+    assert filecmp.cmp(
+        bench.SAMPLE_HANDLER, 'lambda_function.py', shallow=False)
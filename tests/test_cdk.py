@@ -0,0 +1,106 @@
+import pytest
+
+from lambda_gateway import cdk
+from lambda_gateway.cdk import CDKParser
+from lambda_gateway.sam import Endpoint
+
+STACK = '''\
+import { Duration } from "aws-cdk-lib";
+
+// createLambda(this, "Commented", "app.commented", props)
+function createLambda(
+  scope: Construct,
+  id: string,
+  handler: string,
+  props: StackProps,
+  codePath = "../default"
+) {
+  return new Function(scope, id, {
+    functionName: `${id}-${props.environment}`,
+    runtime: Runtime.PYTHON_3_11,
+    handler,
+    code: Code.fromAsset(codePath),
+    timeout: Duration.seconds(10),
+    environment: getLambdaEnv(props),
+  });
+}
+
+function getLambdaEnv(props) {
+  return {
+    SUPPORT_EMAIL: props.supportEmail,
+    DDBTableName: table.tableName,
+  };
+}
+
+const itemsFn: Function = createLambda(
+  this,
+  "Items",
+  "app.items.handler",
+  props,
+  "../items"
+);
+const usersFn = createLambda(this, "Users", "app.users.handler", props);
+const reportsFn = new lambda.Function(this, "Reports", {
+  handler: "reports.handler",
+  code: Code.fromAsset("../reports"),
+  memorySize: 1024,
+  timeout: Duration.minutes(1),
+});
+
+httpApi.addRoutes({
+  path: "/items",
+  methods: [HttpMethod.GET, HttpMethod.POST],
+  integration: new HttpLambdaIntegration("ItemsIntegration", itemsFn),
+});
+httpApi.addRoutes({
+  integration: new HttpLambdaIntegration("UsersIntegration", usersFn),
+  path: '/users/{id}',
+});
+httpApi.addRoutes({
+  path: "/reports",
+  methods: [HttpMethod.PUT],
+  integration: new HttpLambdaIntegration("ReportsIntegration", reportsFn),
+});
+'''
+
+
+@pytest.fixture
+def stack(tmp_path):
+    path = tmp_path / 'stack.ts'
+    path.write_text(STACK)
+    return CDKParser(str(path))
+
+
+def test_get_endpoints(stack):
+    assert list(stack.get_endpoints()) == [
+        Endpoint('../items', 'app.items.handler', '/items', 'get', 10, None,
+                 'itemsFn'),
+        Endpoint('../items', 'app.items.handler', '/items', 'post', 10, None,
+                 'itemsFn'),
+        Endpoint('../default', 'app.users.handler', '/users/{id}', 'get',
+                 10, None, 'usersFn'),
+        Endpoint('../reports', 'reports.handler', '/reports', 'put',
+                 60, 1024, 'reportsFn'),
+    ]
+
+
+def test_get_env_var_mapping(stack, monkeypatch):
+    monkeypatch.setenv('DDBTableName', 'table')
+    assert stack.get_env_var_mapping() == {
+        'SUPPORT_EMAIL': 'supportEmail',
+        'DDBTableName': 'table',
+    }
+
+
+def test_parse_cached():
+    assert cdk.parse(STACK) is cdk.parse(STACK)
+
+
+@pytest.mark.parametrize('code', [
+    'const a = createLambda(this, "A", "app.handler"',
+    'httpApi.addRoutes({ path: "/x", integration: new X("X", ',
+    '/* unterminated comment ' + '/*' * 1000,
+    '"unterminated string\n' + '(' * 1000 + '{[' * 1000,
+])
+def test_parse_malformed(code):
+    assert cdk.parse(code).endpoints == []
@@ -0,0 +1,108 @@
+import asyncio
+import gzip
+from unittest import mock
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from lambda_gateway import compression
+from lambda_gateway.compression import Compressor, get_encoding
+from lambda_gateway.request_handler import LambdaRequestHandler
+from lambda_gateway.response_cache import ResponseCache
+
+BODY = b'{"items": [' + b'{"fizz": "buzz"}, ' * 200 + b'{}]}'
+
+
+def compress_response(compressor, accept_encoding='gzip',
+                      content_type='application/json', body=BODY):
+    async def run():
+        request = make_mocked_request(
+            'GET', '/', headers={'Accept-Encoding': accept_encoding})
+        response = web.Response(body=body, content_type=content_type)
+        return await compressor.compress_response(request, response)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize(('accept_encoding', 'exp'), [
+    (None, None),
+    ('', None),
+    ('gzip', 'gzip'),
+    ('deflate, gzip;q=0.5', 'gzip'),
+    ('gzip;q=0', None),
+    ('*', compression.ENCODINGS[0]),
+    ('*, gzip;q=0', 'br' if compression.brotli else None),
+    ('identity', None),
+])
+def test_get_encoding(accept_encoding, exp):
+    assert get_encoding(accept_encoding) == exp
+
+
+def test_compress_response():
+    response = compress_response(Compressor())
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(response.body) == BODY
+
+
+@pytest.mark.parametrize(('kwargs', 'exp'), [
+    ({'content_type': 'text/html'}, 'gzip'),
+    ({'content_type': 'image/png'}, None),
+    ({'body': b'{}'}, None),
+    ({'accept_encoding': 'identity'}, None),
+])
+def test_compress_response_skipped(kwargs, exp):
+    response = compress_response(Compressor(), **kwargs)
+    assert response.headers.get('Content-Encoding') == exp
+
+
+def test_compress_response_offloaded():
+    compressor = Compressor(offload_size=0)
+    with mock.patch.object(compressor, 'get_compressed',
+                           wraps=compressor.get_compressed) as get:
+        response = compress_response(compressor)
+    get.assert_called_once_with(BODY, 'gzip')
+    assert gzip.decompress(response.body) == BODY
+
+
+def test_compression_cache():
+    compressor = Compressor(cache_size=1024)
+    with mock.patch('lambda_gateway.compression.compress',
+                    wraps=compression.compress) as compress:
+        first = compress_response(compressor)
+        second = compress_response(compressor)
+        compress_response(compressor, body=BODY.replace(b'fizz', b'fuzz'))
+    assert compress.call_count == 2
+    assert first.body == second.body
+    assert compressor.size <= 1024
+
+    compressor = Compressor(cache_size=0)
+    compress_response(compressor)
+    assert not compressor.entries
+
+
+class JSONProxy:
+    async def invoke(self, event):
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json'},
+            'body': BODY.decode(),
+        }
+
+
+def test_request_handler():
+    cache = ResponseCache()
+    handler = LambdaRequestHandler(
+        JSONProxy(), '2.0', cache=cache, cache_ttl=60, single_flight=True,
+        compressor=Compressor())
+
+    async def run():
+        return await handler.invoke(make_mocked_request(
+            'GET', '/', headers={'Accept-Encoding': 'gzip'}))
+
+    response = asyncio.run(run())
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.body) == BODY
+    # Cached uncompressed, for clients that don't accept gzip
+    entry, = cache.entries.values()
+    assert entry.body == BODY
@@ -0,0 +1,194 @@
+import asyncio
+import os
+from unittest import mock
+
+import pytest
+
+from lambda_gateway.container import (
+    Container, ContainerPool, ProcessContainer, TooManyRequestsException,
+    WorkerError)
+
+
+class DyingContainer(Container):
+    dead = False
+
+    @property
+    def alive(self):
+        return not self.dead
+
+
+class TestContainerPool:
+    def setup_method(self):
+        self.started = 0
+
+        async def factory():
+            self.started += 1
+            return DyingContainer(lambda event, context: {'event': event})
+
+        self.subject = ContainerPool(factory, max_concurrency=2, idle_ttl=60)
+
+    def test_acquire_cold_then_warm(self):
+        async def run():
+            container, cold = await self.subject.acquire()
+            assert cold
+            assert await container.invoke('x') == {'event': 'x'}
+            self.subject.release(container)
+            again, cold = await self.subject.acquire()
+            assert not cold
+            assert again is container
+            self.subject.release(again)
+        asyncio.run(run())
+        assert self.started == 1
+        assert self.subject.cold_starts == 1
+        assert self.subject.warm_starts == 1
+
+    def test_acquire_waits_when_full(self):
+        async def run():
+            first, _ = await self.subject.acquire()
+            second, _ = await self.subject.acquire()
+            assert self.subject.full
+            waiter = asyncio.ensure_future(self.subject.acquire())
+            await asyncio.sleep(0)
+            assert not waiter.done()
+            self.subject.release(first)
+            third, cold = await waiter
+            assert third is first
+            assert not cold
+            self.subject.release(second)
+            self.subject.release(third)
+        asyncio.run(run())
+        assert self.started == 2
+
+    def test_acquire_throttled_after_queue_timeout(self):
+        self.subject.queue_timeout = 0.01
+
+        async def run():
+            first, _ = await self.subject.acquire()
+            await self.subject.acquire()
+            with pytest.raises(TooManyRequestsException):
+                await self.subject.acquire()
+            assert not self.subject.waiters
+            self.subject.release(first)
+            await self.subject.acquire()
+        asyncio.run(run())
+        assert self.subject.throttles == 1
+
+    def test_acquire_throttled_when_queue_full(self):
+        self.subject.max_queue = 1
+
+        async def run():
+            await self.subject.acquire()
+            await self.subject.acquire()
+            waiter = asyncio.ensure_future(self.subject.acquire())
+            await asyncio.sleep(0)
+            with pytest.raises(TooManyRequestsException):
+                await self.subject.acquire()
+            waiter.cancel()
+        asyncio.run(run())
+        assert self.subject.throttles == 1
+
+    def test_acquire_throttled_without_concurrency(self):
+        self.subject.max_concurrency = 0
+        with pytest.raises(TooManyRequestsException):
+            asyncio.run(self.subject.acquire())
+        assert self.started == 0
+
+    def test_prewarm(self):
+        asyncio.run(self.subject.prewarm(5))
+        assert self.started == 2
+        assert len(self.subject.idle) == 2
+
+    def test_reap(self):
+        asyncio.run(self.subject.prewarm(1))
+        self.subject.idle[0].last_used -= 61
+        self.subject.reap()
+        assert self.subject.idle == []
+
+    def test_reap_without_acquire(self):
+        self.subject.idle_ttl = 0.05
+
+        async def run():
+            container, _ = await self.subject.acquire()
+            container.stop = mock.Mock()
+            self.subject.release(container)
+            await asyncio.sleep(0.1)
+            assert self.subject.idle == []
+            container.stop.assert_called_once_with()
+            assert self.subject.reaper is None
+        asyncio.run(run())
+
+    def test_release_dead_replaces(self):
+        async def run():
+            container, _ = await self.subject.acquire()
+            container.dead = True
+            self.subject.release(container)
+            assert self.subject.busy == 1
+            await asyncio.gather(*self.subject.replacing)
+            assert self.subject.busy == 0
+            assert len(self.subject.idle) == 1
+            assert self.subject.idle[0] is not container
+        asyncio.run(run())
+        assert self.started == 2
+
+    def test_invalidate(self):
+        async def run():
+            container, _ = await self.subject.acquire()
+            self.subject.invalidate()
+            self.subject.release(container)
+            assert self.subject.idle == []
+            _, cold = await self.subject.acquire()
+            assert cold
+        asyncio.run(run())
+
+
+def test_process_container():
+    async def run():
+        container = await ProcessContainer.start(
+            'lambda_function.lambda_handler', os.path.abspath('.'))
+        try:
+            assert container.alive
+            ret = await container.invoke({}, None)
+            assert ret['statusCode'] == 200
+        finally:
+            container.stop()
+        assert not container.alive
+    asyncio.run(run())
+
+
+def test_process_container_timeout(monkeypatch):
+    monkeypatch.setenv('SLEEP', '10')
+
+    async def factory():
+        return await ProcessContainer.start(
+            'lambda_function.lambda_handler', os.path.abspath('.'))
+
+    async def run():
+        pool = ContainerPool(factory, max_concurrency=1)
+        container, _ = await pool.acquire()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(container.invoke({}, None), 0.1)
+        assert not container.alive
+        pool.release(container)
+        await asyncio.gather(*pool.replacing)
+        assert pool.idle[0].alive
+        pool.invalidate()
+        container.process.join(5)
+        assert container.process.exitcode is not None
+    asyncio.run(run())
+
+
+def test_process_container_bad_handler():
+    async def run():
+        with pytest.raises(WorkerError):
+            await ProcessContainer.start(
+                'lambda_function.not_a_function', os.path.abspath('.'))
+    asyncio.run(run())
+
+
+def test_container_async_handler():
+    async def handler(event, context):
+        return asyncio.current_task() is not None
+
+    async def run():
+        return await Container(handler).invoke({})
+    assert asyncio.run(run())
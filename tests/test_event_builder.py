@@ -0,0 +1,71 @@
+from multidict import CIMultiDict
+from aiohttp.test_utils import make_mocked_request
+
+from lambda_gateway.event_builder import (
+    EventBuilderV1, EventBuilderV2, get_request_id)
+from lambda_gateway.router import Route
+
+ROUTE = Route('GET', '/items/{id}', None, 'GET /items/{id}')
+
+
+def get_request(headers=()):
+    return make_mocked_request(
+        'GET', '/items/1?a=1&b=2&a=3', headers=CIMultiDict([
+            ('Host', 'api.example.com'),
+            ('User-Agent', 'curl'),
+            ('Accept', 'text/html'),
+            ('Accept', '*/*'),
+            ('Cookie', 'fizz=buzz; jazz=fuzz'),
+            *headers,
+        ]))
+
+
+def test_get_request_id():
+    first, second = get_request_id(), get_request_id()
+    assert first != second
+    assert len(first) == 36
+    assert first[:24] == second[:24]
+
+
+def test_event_v1():
+    ret = EventBuilderV1(ROUTE).build(get_request(), '', False, {'id': '1'})
+    assert ret['resource'] == '/items/{id}'
+    assert ret['path'] == '/items/1'
+    assert ret['headers']['Accept'] == '*/*'
+    assert ret['multiValueHeaders']['Accept'] == ['text/html', '*/*']
+    assert ret['queryStringParameters'] == {'a': '3', 'b': '2'}
+    assert ret['multiValueQueryStringParameters'] == \
+        {'a': ['1', '3'], 'b': ['2']}
+    assert ret['pathParameters'] == {'id': '1'}
+    context = ret['requestContext']
+    assert context['resourcePath'] == '/items/{id}'
+    assert context['identity']['userAgent'] == 'curl'
+    assert context['protocol'] == 'HTTP/1.1'
+
+
+def test_event_v2():
+    ret = EventBuilderV2(ROUTE).build(get_request(), '', False, {'id': '1'})
+    assert ret['routeKey'] == 'GET /items/{id}'
+    assert ret['rawQueryString'] == 'a=1&b=2&a=3'
+    assert ret['headers'] == {
+        'host': 'api.example.com',
+        'user-agent': 'curl',
+        'accept': 'text/html,*/*',
+    }
+    assert ret['cookies'] == ['fizz=buzz', 'jazz=fuzz']
+    assert ret['queryStringParameters'] == {'a': '1,3', 'b': '2'}
+    assert ret['pathParameters'] == {'id': '1'}
+    context = ret['requestContext']
+    assert context['routeKey'] == 'GET /items/{id}'
+    assert context['domainPrefix'] == 'api'
+    assert context['http']['method'] == 'GET'
+    assert context['http']['userAgent'] == 'curl'
+
+
+def test_event_v2_route_key():
+    builder = EventBuilderV2()
+    ret = builder.build(get_request(), '', False)
+    assert ret['routeKey'] == 'GET /items/1'
+    assert 'pathParameters' not in ret
+    ret = builder.build(get_request([('X-Route-Key', 'fizz')]), '', False)
+    assert ret['routeKey'] == 'fizz'
@@ -1,13 +1,33 @@
 import asyncio
+import os
+import threading
 from unittest import mock
 
 import pytest
 
+from lambda_gateway import metrics
 from lambda_gateway.event_proxy import EventProxy
+from lambda_gateway.executors import Executor
+
+
+def test_get_handler_cached():
+    proxy = EventProxy('lambda_function.lambda_handler', os.path.curdir)
+    handler = proxy.get_handler()
+    assert proxy.get_handler() is handler
+    assert proxy.invalidate([os.path.abspath('lambda_function.py')])
+    assert proxy.pool.generation == 1
+    assert proxy.get_handler().__name__ == 'lambda_handler'
+
+
+def test_invalidate_other_path():
+    proxy = EventProxy('lambda_function.lambda_handler', os.path.curdir)
+    handler = proxy.get_handler()
+    assert not proxy.invalidate(['/elsewhere/lambda_function.py'])
+    assert proxy.get_handler() is handler
 
 
 class TestEventProxy:
-    def setup(self):
+    def setup_method(self):
         self.subject = EventProxy('index.handler', '/simple/', 3)
 
     @pytest.mark.parametrize(('handler', 'exp'), [
@@ -280,3 +300,98 @@ class TestEventProxy:
     def test_jsonify(self, verb, statusCode, body, exp):
         ret = EventProxy.jsonify(verb, statusCode, **body)
         assert ret == exp
+
+
+def test_invoke_timeout_excludes_queue_time():
+    async def handler(event, context):
+        await asyncio.sleep(0.3)
+        return {'statusCode': 200, 'body': ''}
+
+    proxy = EventProxy('index.handler', os.path.curdir, 0.5,
+                       max_concurrency=1)
+    event = {'version': '2.0',
+             'requestContext': {'http': {'method': 'GET'}}}
+
+    async def run():
+        with mock.patch.object(proxy, 'get_handler', return_value=handler):
+            return await asyncio.gather(
+                proxy.invoke(event), proxy.invoke(event))
+    first, second = asyncio.run(run())
+    assert first['statusCode'] == 200
+    assert second['statusCode'] == 200
+
+
+def test_invoke_default_timeout():
+    async def handler(event, context):
+        await asyncio.sleep(1)
+        return {'statusCode': 200, 'body': ''}
+
+    proxy = EventProxy('index.handler', os.path.curdir)
+    event = {'version': '2.0',
+             'requestContext': {'http': {'method': 'GET'}}}
+
+    async def run():
+        with mock.patch.object(proxy, 'get_handler', return_value=handler), \
+                mock.patch('lambda_gateway.lambda_context.DEFAULT_TIMEOUT',
+                           0.1):
+            return await proxy.invoke(event)
+    assert asyncio.run(run())['statusCode'] == 504
+
+
+def stream_chunks(proxy, handler):
+    event = {'version': '2.0',
+             'requestContext': {'http': {'method': 'GET'}}}
+
+    async def run():
+        with mock.patch.object(proxy, 'get_handler', return_value=handler):
+            res = await proxy.invoke(event)
+            if not isinstance(res['body'], str):
+                assert proxy.pool.busy == 1
+                res['body'] = [chunk async for chunk in res['body']]
+            assert proxy.pool.busy == 0
+            return res
+    return asyncio.run(run())
+
+
+def test_invoke_stream():
+    executor = Executor('stream')
+    threads = []
+
+    def handler(event, context):
+        for chunk in ['fizz', 'buzz']:
+            threads.append(threading.current_thread().name)
+            yield chunk
+
+    proxy = EventProxy('index.handler', os.path.curdir, executor=executor)
+    res = stream_chunks(proxy, handler)
+    assert res == {'statusCode': 200, 'body': ['fizz', 'buzz']}
+    assert all(name.startswith('lambda-gateway-stream') for name in threads)
+
+
+@pytest.mark.parametrize(('fail_at', 'exp'), [(0, 502), (1, 200)])
+def test_invoke_stream_error(fail_at, exp):
+    def handler(event, context):
+        for i in range(2):
+            if i == fail_at:
+                raise ValueError('boom')
+            yield 'fizz'
+
+    proxy = EventProxy('index.handler', os.path.curdir, name='stream_error')
+    errors = metrics.ERRORS.values.get(('stream_error',), 0)
+    if exp == 502:
+        assert stream_chunks(proxy, handler)['statusCode'] == 502
+    else:
+        with pytest.raises(ValueError):
+            stream_chunks(proxy, handler)
+    assert metrics.ERRORS.values[('stream_error',)] == errors + 1
+
+
+def test_invoke_stream_timeout():
+    async def handler(event, context):
+        yield 'fizz'
+        await asyncio.sleep(1)
+        yield 'buzz'
+
+    proxy = EventProxy('index.handler', os.path.curdir, 0.1)
+    with pytest.raises(asyncio.TimeoutError):
+        stream_chunks(proxy, handler)
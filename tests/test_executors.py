@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+import pytest
+
+from lambda_gateway import executors
+
+
+def test_get_executor():
+    executor = executors.get_executor('test-get', 3)
+    assert executor.max_workers == 3
+    assert executors.get_executor('test-get') is executor
+    assert executors.EXECUTORS['test-get'] is executor
+
+
+def test_run():
+    executor = executors.Executor('test-run', 1)
+    ret = asyncio.run(executor.run(lambda a, b: a + b, 1, 2))
+    assert ret == 3
+    assert (executor.queued, executor.running, executor.abandoned) == \
+        (0, 0, 0)
+
+
+def test_run_abandoned():
+    executor = executors.Executor('test-abandoned', 1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    async def run():
+        first = asyncio.ensure_future(executor.run(block))
+        second = asyncio.ensure_future(executor.run(block))
+        await asyncio.get_running_loop().run_in_executor(
+            None, started.wait, 5)
+        assert executor.saturated
+        assert executor.queued == 1
+        first.cancel()
+        second.cancel()
+        await asyncio.gather(first, second, return_exceptions=True)
+
+    asyncio.run(run())
+    assert executor.abandoned == 1
+    assert executor.queued == 0
+    release.set()
+    executor.pool.shutdown(wait=True)
+    assert (executor.running, executor.abandoned) == (0, 0)
+
+
+def test_get_dedicated_executor():
+    executor = executors.get_dedicated_executor('test-dedicated', 2)
+    assert executor is executors.get_executor('test-dedicated')
+    with pytest.raises(ValueError):
+        executors.get_dedicated_executor(executors.SHARED, 2)
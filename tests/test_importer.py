@@ -0,0 +1,116 @@
+import importlib
+import sys
+import threading
+
+import pytest
+
+from lambda_gateway import importer
+from lambda_gateway.event_proxy import load_handler
+
+
+@pytest.fixture
+def functions(tmp_path):
+    paths = []
+    for name in ('one', 'two'):
+        path = tmp_path / name
+        path.mkdir()
+        (path / 'shared_name_util.py').write_text(f'NAME = {name!r}\n')
+        (path / 'shared_name_app.py').write_text(
+            'import shared_name_util\n\n'
+            'def handler(event, context):\n'
+            '    return shared_name_util.NAME\n')
+        paths.append(str(path))
+    yield paths
+    for name in ('shared_name_app', 'shared_name_util'):
+        sys.modules.pop(name, None)
+
+
+def test_load_handler_isolated(functions):
+    sys_path = list(sys.path)
+    one = load_handler('shared_name_app.handler', functions[0])
+    two = load_handler('shared_name_app.handler', functions[1])
+    assert one(None, None) == 'one'
+    assert two(None, None) == 'two'
+    assert sys.path == sys_path
+
+    # The first function keeps the names in sys.modules
+    assert sys.modules['shared_name_util'].NAME == 'one'
+    assert importer.get_owner('shared_name_util') is \
+        importer.get_namespace(functions[0])
+    assert importer.get_owner('sys') is None
+
+
+def test_reload(functions):
+    namespace = importer.get_namespace(functions[1])
+    old = namespace.load('shared_name_app')
+    with open(functions[1] + '/shared_name_util.py', 'w') as file:
+        file.write('NAME = "two, reloaded"\n')
+    namespace.reload(['shared_name_app'])
+    assert namespace.load('shared_name_app') is not old
+    assert namespace.load('shared_name_app').handler(None, None) == \
+        'two, reloaded'
+    assert old.handler(None, None) == 'two'
+
+
+def test_reload_error(functions):
+    namespace = importer.get_namespace(functions[0])
+    old = namespace.load('shared_name_app')
+    with open(functions[0] + '/shared_name_util.py', 'w') as file:
+        file.write('NAME = (\n')
+    with pytest.raises(SyntaxError):
+        namespace.reload(['shared_name_app'])
+    assert namespace.load('shared_name_app') is old
+    assert sys.modules['shared_name_app'] is old
+
+
+@pytest.fixture
+def lazy_functions(tmp_path):
+    paths = []
+    for name, lazy in (('A', True), ('B', False)):
+        path = tmp_path / name
+        path.mkdir()
+        (path / 'lazy_name_helper.py').write_text(f'WHO = {name!r}\n')
+        if lazy:
+            code = ('def handler(event, context):\n'
+                    '    import lazy_name_helper\n'
+                    '    return lazy_name_helper.WHO\n')
+        else:
+            code = ('import lazy_name_helper\n\n'
+                    'def handler(event, context):\n'
+                    '    return lazy_name_helper.WHO\n')
+        (path / f'lazy_name_app_{name}.py').write_text(code)
+        paths.append(str(path))
+    yield paths
+    for name in ('lazy_name_app_A', 'lazy_name_app_B', 'lazy_name_helper'):
+        sys.modules.pop(name, None)
+
+
+def test_load_handler_after_lazy_import(lazy_functions):
+    a = load_handler('lazy_name_app_A.handler', lazy_functions[0])
+    assert a(None, None) == 'A'
+    b = load_handler('lazy_name_app_B.handler', lazy_functions[1])
+    assert b(None, None) == 'B'
+    assert a(None, None) == 'A'
+    assert importer.get_owner('lazy_name_helper') is \
+        importer.get_namespace(lazy_functions[0])
+
+
+def test_lazy_import_waits_for_load(lazy_functions):
+    a = load_handler('lazy_name_app_A.handler', lazy_functions[0])
+    a(None, None)
+    helper = sys.modules['lazy_name_helper']
+    namespace = importer.get_namespace(lazy_functions[1])
+
+    # A's handler imports its hidden helper while B is being loaded
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(importlib.import_module(
+            'lazy_name_helper')))
+    with importer._lock:
+        hidden = namespace.enter()
+        thread.start()
+        thread.join(0.2)
+        assert thread.is_alive()
+        namespace.exit(hidden)
+    thread.join(5)
+    assert results == [helper]
@@ -1,4 +1,4 @@
-from datetime import timedelta
+import pickle
 
 from lambda_gateway import lambda_context
 from lambda_gateway.lambda_context import Context
@@ -11,7 +11,7 @@ def test_start():
 
 
 class TestContext:
-    def setup(self):
+    def setup_method(self):
         self.subject = Context(1)
 
     def test_function_name(self):
@@ -26,17 +26,30 @@ class TestContext:
 
     def test_memory_limit_in_mb(self):
         assert self.subject.memory_limit_in_mb == 128
+        assert Context(1, memory_size=1024).memory_limit_in_mb == 1024
 
     def test_aws_request_id(self):
         assert self.subject.aws_request_id is not None
+        assert self.subject.aws_request_id == self.subject.aws_request_id
+        assert Context(1).aws_request_id != self.subject.aws_request_id
 
     def test_log_group_name(self):
         assert self.subject.log_group_name == '/aws/lambda/lambda-gateway'
 
     def test_log_stream_name(self):
         assert self.subject.log_stream_name is not None
+        assert self.subject.log_stream_name == self.subject.log_stream_name
 
     def test_get_remaining_time_in_millis(self):
         assert 0 < self.subject.get_remaining_time_in_millis() < 1000
-        self.subject._start -= timedelta(seconds=1)
+        self.subject.deadline -= 1
         assert self.subject.get_remaining_time_in_millis() == 0
+
+    def test_slots(self):
+        assert not hasattr(self.subject, '__dict__')
+
+    def test_pickle(self):
+        self.subject.aws_request_id
+        ret = pickle.loads(pickle.dumps(self.subject))
+        assert ret.aws_request_id == self.subject.aws_request_id
+        assert ret.deadline == self.subject.deadline
@@ -1,7 +1,145 @@
+import argparse
+import asyncio
+import os
+import shutil
+import signal
+import socket
+import subprocess
 import sys
 from unittest import mock
 
-from lambda_gateway import __main__
+import aiohttp
+import pytest
+
+from lambda_gateway import __main__, bench
+from lambda_gateway.manifest import Manifest
+from lambda_gateway.sam import Endpoint
+
+
+def test_lazy_imports():
+    code = (
+        'import sys, lambda_gateway.__main__; '
+        'print(sorted({"aiohttp", "nest_asyncio", "ruamel", "watchfiles", '
+        '"importlib.metadata"} & sys.modules.keys()))')
+    out = subprocess.check_output([sys.executable, '-c', code], text=True)
+    assert out == '[]\n'
+
+
+def test_version(capsys):
+    sys.argv = ['lambda-gateway', '--version']
+    with pytest.raises(SystemExit):
+        __main__.get_opts()
+    assert capsys.readouterr().out.startswith('lambda-gateway ')
+
+
+def test_startup_timer(capsys):
+    timer = __main__.StartupTimer()
+    timer.phase('options')
+    timer.phase('bind')
+    assert [name for name, _ in timer.phases] == ['options', 'bind']
+    timer.report()
+    out = capsys.readouterr().out
+    assert 'options' in out and 'total' in out
+
+
+def test_get_limit():
+    assert __main__.get_limit('4') == (None, 4)
+    assert __main__.get_limit('app.handler=2') == ('app.handler', 2)
+    with pytest.raises(argparse.ArgumentTypeError):
+        __main__.get_limit('app.handler')
+
+
+def test_get_routes_limits(tmp_path):
+    manifest = Manifest([
+        Endpoint('a', 'app.handler', '/a', 'get', Function='A'),
+        Endpoint('b', 'app.handler', '/b', 'get', Function='B'),
+        Endpoint('c', 'app.handler', '/c', 'get', Function='C'),
+        Endpoint('d', 'other.handler', '/d', 'get', Function='D'),
+    ], [], {'A': 0, 'B': 2})
+    sys.argv = ['lambda-gateway', '-c', '5', '-c', 'B=3',
+                '-c', 'other.handler=4', 'template.yaml']
+    opts = __main__.get_opts()
+    _, proxies = __main__.get_routes(manifest, opts, str(tmp_path), {})
+    limits = {
+        proxy.name: proxy.pool.max_concurrency
+        for proxy in proxies.values()}
+    assert limits == {'A': 0, 'B': 3, 'C': 5, 'D': 4}
+
+
+def test_get_routes_threads(tmp_path):
+    manifest = Manifest([
+        Endpoint('a', 'app.handler', '/a', 'get', Function='ThreadsA'),
+        Endpoint('b', 'app.handler', '/b', 'get', Function='ThreadsB'),
+    ], [], {})
+    sys.argv = ['lambda-gateway', '--threads', 'ThreadsA=2', 'template.yaml']
+    opts = __main__.get_opts()
+    _, proxies = __main__.get_routes(manifest, opts, str(tmp_path), {})
+    executors = {
+        proxy.name: proxy.executor for proxy in proxies.values()}
+    assert executors['ThreadsA'].name == 'ThreadsA'
+    assert executors['ThreadsA'].max_workers == 2
+    assert executors['ThreadsB'].name == 'handlers'
+
+
+@pytest.mark.parametrize(('method', 'path', 'ttls', 'settings', 'exp'), [
+    ('get', '/items', {}, [], 0),
+    ('get', '/items', {None: 60}, [], 60),
+    ('get', '/items', {None: 60, '/items': 5}, [], 5),
+    ('post', '/items', {None: 60}, [], 0),
+    ('any', '/items', {}, [('*', '/*', 30)], 30),
+    ('get', '/items', {}, [('GET', '/other', 30)], 0),
+    ('get', '/items', {}, [('GET', '/items', 30)], 30),
+])
+def test_get_cache_ttl(method, path, ttls, settings, exp):
+    endpoint = Endpoint('.', 'app.handler', path, method)
+    assert __main__.get_cache_ttl(endpoint, ttls, settings) == exp
+
+
+def test_run_workers_port_in_use():
+    with socket.create_server(('localhost', 0)) as sock, \
+            mock.patch('os.fork') as fork:
+        port = sock.getsockname()[1]
+        with pytest.raises(OSError):
+            __main__.run_workers(None, 'localhost', port, [], False)
+    fork.assert_not_called()
+
+
+@mock.patch('lambda_gateway.__main__.RESPAWN_DELAY', 0.01)
+def test_run_workers_respawn_backoff(capsys):
+    exits = [(101, 256), (103, 256), (102, 0)]
+    with mock.patch('os.fork', side_effect=[101, 102, 103, 104, 105]), \
+            mock.patch('os.wait', side_effect=[*exits, ChildProcessError]):
+        __main__.run_workers(None, 'localhost', 0, [], False, workers=2)
+    out = capsys.readouterr().out
+    assert 'Worker 101 exited with status 256, respawning in 0.01s' in out
+    assert 'Worker 103 exited with status 256, respawning in 0.02s' in out
+    assert 'Worker 102 exited with status 0, respawning in 0.04s' in out
+
+
+def test_run_workers_sigterm_drain(tmp_path):
+    (tmp_path / 'template.yaml').write_text(bench.SAMPLE_TEMPLATE)
+    shutil.copy(bench.SAMPLE_HANDLER, tmp_path / 'lambda_function.py')
+    port = bench.get_free_port()
+    env = {**os.environ, 'SLEEP': '0.5', 'PYTHONPATH': bench.ROOT}
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'lambda_gateway', '-W', '2', '-p', str(port),
+         'template.yaml'],
+        cwd=tmp_path, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        async def run():
+            await bench.wait_for_port(port, process)
+            async with aiohttp.ClientSession() as session:
+                request = asyncio.ensure_future(
+                    session.get(f'http://localhost:{port}/'))
+                await asyncio.sleep(0.2)
+                process.send_signal(signal.SIGTERM)
+                async with await request as response:
+                    return response.status
+        assert asyncio.run(run()) == 200
+        assert process.wait(10) == 0
+    finally:
+        process.kill()
 
 
 def test_get_opts_default():
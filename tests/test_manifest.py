@@ -0,0 +1,120 @@
+from unittest import mock
+
+from lambda_gateway import manifest
+from lambda_gateway.sam import SAM, Endpoint
+
+TEMPLATE = '''\
+Globals:
+  Function:
+    Timeout: 5
+    MemorySize: 256
+    ReservedConcurrentExecutions: 2
+Resources:
+  Items:
+    Type: AWS::Serverless::Function
+    Properties:
+      CodeUri: items
+      Handler: app.handler
+      MemorySize: 1024
+      Role: !GetAtt ItemsRole.Arn
+      Environment:
+        Variables:
+          TABLE: !Ref Table
+          URL: !Sub "https://${Api}.example.com"
+      Events:
+        Any:
+          Type: HttpApi
+          Properties:
+            Path: /items
+            Method: ANY
+        Delete:
+          Type: HttpApi
+          Properties:
+            Path: /items/{id}
+            Method: delete
+  Api:
+    Type: AWS::Serverless::Api
+    Properties:
+      MethodSettings:
+        - HttpMethod: GET
+          ResourcePath: /~1items
+          CachingEnabled: true
+          CacheTtlInSeconds: 60
+'''
+
+
+def test_sam_intrinsics(tmp_path):
+    path = tmp_path / 'template.yaml'
+    path.write_text(TEMPLATE)
+    props = SAM(str(path)).template['Resources']['Items']['Properties']
+    assert props['Role'] == {'Fn::GetAtt': ['ItemsRole', 'Arn']}
+    assert props['Environment']['Variables'] == {
+        'TABLE': {'Ref': 'Table'},
+        'URL': {'Fn::Sub': 'https://${Api}.example.com'},
+    }
+
+
+def test_sam_unknown_tags(tmp_path):
+    path = tmp_path / 'template.yaml'
+    path.write_text(TEMPLATE.replace(
+        '          TABLE: !Ref Table\n',
+        '          TABLE: !Ref Table\n'
+        '          SECRET: !Secret db-password\n'
+        '          HOSTS: !Hosts [a, b]\n'
+        '          OPTS: !Opts {retries: 3}\n'))
+    props = SAM(str(path)).template['Resources']['Items']['Properties']
+    variables = props['Environment']['Variables']
+    assert variables['SECRET'] == 'db-password'
+    assert variables['HOSTS'] == ['a', 'b']
+    assert variables['OPTS'] == {'retries': 3}
+    assert variables['TABLE'] == {'Ref': 'Table'}
+
+
+def test_load(tmp_path):
+    path = tmp_path / 'template.yaml'
+    path.write_text(TEMPLATE)
+    cache_dir = str(tmp_path / 'cache')
+    ret = manifest.load(str(path), cache_dir)
+    assert list(ret.get_endpoints()) == [
+        Endpoint('items', 'app.handler', '/items', 'any', 5, 1024, 'Items'),
+        Endpoint('items', 'app.handler', '/items/{id}', 'delete', 5, 1024,
+                 'Items'),
+    ]
+    assert ret.get_cache_settings() == [('GET', '/items', 60)]
+    assert ret.get_reserved_concurrency() == {'Items': 2}
+
+    # Cached by template hash
+    with mock.patch('lambda_gateway.manifest.SAM') as mock_sam:
+        cached = manifest.load(str(path), cache_dir)
+    mock_sam.assert_not_called()
+    assert cached.to_dict() == ret.to_dict()
+
+    path.write_text(TEMPLATE.replace('Timeout: 5', 'Timeout: 9'))
+    changed = manifest.load(str(path), cache_dir)
+    assert next(changed.get_endpoints()).Timeout == 9
+
+
+def test_intrinsic_numbers(tmp_path):
+    path = tmp_path / 'template.yaml'
+    path.write_text(
+        'Parameters:\n'
+        '  TimeoutParam:\n'
+        '    Type: Number\n'
+        '    Default: "12"\n'
+        + TEMPLATE
+        .replace('Timeout: 5', 'Timeout: !Ref TimeoutParam')
+        .replace('MemorySize: 1024', 'MemorySize: !Ref NoDefault')
+        .replace('ReservedConcurrentExecutions: 2',
+                 'ReservedConcurrentExecutions: !If [Prod, 2, 1]'))
+    sam = SAM(str(path))
+    assert [(x.Timeout, x.MemorySize) for x in sam.get_endpoints()] == \
+        [(12, None), (12, None)]
+    assert sam.get_reserved_concurrency() == {}
+
+
+def test_load_unwritable_cache(tmp_path):
+    path = tmp_path / 'template.yaml'
+    path.write_text(TEMPLATE)
+    (tmp_path / 'file').write_text('')
+    ret = manifest.load(str(path), str(tmp_path / 'file' / 'cache'))
+    assert len(ret.endpoints) == 2
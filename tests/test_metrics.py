@@ -0,0 +1,64 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from lambda_gateway import metrics
+from lambda_gateway.event_proxy import EventProxy
+from lambda_gateway.router import Router
+
+
+def test_format_labels():
+    ret = metrics.format_labels(('route', 'status'), ('GET /"a"', 200))
+    assert ret == r'{route="GET /\"a\"",status="200"}'
+
+
+def test_histogram():
+    histogram = metrics.Histogram('h', 'Help.', ('fn',), buckets=(1, 2, 5))
+    for value in (0.5, 1.5, 1.5, 9):
+        histogram.observe(value, 'a')
+    assert histogram.render() == [
+        '# HELP h Help.',
+        '# TYPE h histogram',
+        'h_bucket{fn="a",le="1"} 1',
+        'h_bucket{fn="a",le="2"} 3',
+        'h_bucket{fn="a",le="5"} 3',
+        'h_bucket{fn="a",le="+Inf"} 4',
+        'h_sum{fn="a"} 12.5',
+        'h_count{fn="a"} 4',
+    ]
+
+
+def test_registry_render():
+    registry = metrics.Registry()
+    counter = registry.counter('c_total', 'Help.', ('status',))
+    gauge = registry.gauge('g', 'Help.')
+    registry.add_collector(lambda: gauge.set(3))
+    counter.inc(200)
+    counter.inc(200)
+    assert registry.render() == '\n'.join([
+        '# HELP c_total Help.',
+        '# TYPE c_total counter',
+        'c_total{status="200"} 2',
+        '# HELP g Help.',
+        '# TYPE g gauge',
+        'g 3',
+    ]) + '\n'
+
+
+def test_router_metrics():
+    async def handler(request):
+        return web.Response(status=201)
+    router = Router([web.RouteDef('GET', '/items/{id}', handler, {})])
+    asyncio.run(router.handle(make_mocked_request('GET', '/items/1')))
+    assert metrics.REQUESTS.values[('GET /items/{id}', 201)] >= 1
+    assert ('GET /items/{id}',) in metrics.REQUEST_DURATION.values
+
+
+def test_pool_collector():
+    proxies = {
+        name: EventProxy('app.handler', name.lower(), name=name)
+        for name in ('A', 'B')}
+    proxies['B'].pool.busy = 2
+    metrics.get_pool_collector(proxies)()
+    assert metrics.IN_FLIGHT.values == {('A',): 0, ('B',): 2}
@@ -0,0 +1,89 @@
+import asyncio
+import marshal
+import time
+
+import pytest
+
+from lambda_gateway import profiling
+from lambda_gateway.container import Container
+from lambda_gateway.event_proxy import EventProxy
+
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def handler(event, context=None):
+    busy(0.05)
+    return {'statusCode': 200}
+
+
+def get_profiler():
+    profiler = profiling.Profiler(interval=0.001).start()
+    asyncio.run(Container(handler).invoke({}, None, profiler))
+    profiler.stop()
+    return profiler
+
+
+def test_profiler_samples():
+    profiler = get_profiler()
+    assert profiler.invocations == 1
+    assert profiler.samples > 0
+    for stack in profiler.stacks:
+        assert stack[0][2] == 'handler'
+
+
+def test_profiler_dump():
+    profiler = get_profiler()
+    stats = marshal.loads(profiler.dump('pstats'))
+    funcs = {name for _, _, name in stats}
+    assert {'handler', 'busy'} <= funcs
+    collapsed = profiler.dump('collapsed').decode()
+    assert collapsed.startswith('handler (test_profiling.py:')
+    assert b'samples of 1 invocations' in profiler.dump('text')
+    with pytest.raises(ValueError):
+        profiler.dump('svg')
+
+
+def test_profiler_invocation_limit():
+    profiler = profiling.Profiler(invocations=1).start()
+    profiler.wrap(lambda event, context: None)({}, None)
+    assert not profiler.running
+
+
+def test_start_process_isolation():
+    proxy = EventProxy('lambda_function.lambda_handler', '.',
+                       isolation='process')
+    with pytest.raises(ValueError):
+        profiling.start(proxy)
+
+
+def test_find_proxy():
+    proxies = {
+        name: EventProxy(handler, '.', name=name)
+        for name, handler in (('A', 'app.handler'), ('B', 'app.handler'),
+                              ('C', 'other.handler'))}
+    assert profiling.find_proxy('B', proxies) is proxies['B']
+    assert profiling.find_proxy('other.handler', proxies) is proxies['C']
+    with pytest.raises(LookupError):
+        profiling.find_proxy('app.handler', proxies)
+    with pytest.raises(LookupError):
+        profiling.find_proxy('D', proxies)
+
+
+def test_profiler_started_per_process():
+    profiler = profiling.Profiler().start()
+    assert profiler.running
+    assert profiler.thread is None
+    profiler.wrap(handler)
+    thread = profiler.thread
+    assert thread.is_alive()
+    profiler.wrap(handler)
+    assert profiler.thread is thread
+    # As in a worker forked after the profiler was started
+    profiler.pid = -1
+    profiler.wrap(handler)
+    assert profiler.thread is not thread
+    profiler.stop()
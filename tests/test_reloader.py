@@ -0,0 +1,43 @@
+import sys
+
+from lambda_gateway import reloader
+from lambda_gateway.event_proxy import EventProxy
+
+
+def write_module(path, value):
+    path.write_text(f'VALUE = {value!r}\n\ndef handler(event, context):\n'
+                    f'    return VALUE\n')
+
+
+def test_reload(tmp_path):
+    source = tmp_path / 'reload_me.py'
+    write_module(source, 'old')
+    proxy = EventProxy('reload_me.handler', str(tmp_path))
+    old_handler = proxy.get_handler()
+    assert reloader.get_modules([str(source)]) == ['reload_me']
+
+    write_module(source, 'new, and longer')
+    assert reloader.reload([str(source)], [proxy]) == [proxy]
+    handler = proxy.get_handler()
+    assert handler(None, None) == 'new, and longer'
+    assert old_handler(None, None) == 'old'
+    del sys.modules['reload_me']
+
+
+def test_reload_error_keeps_old_module(tmp_path):
+    source = tmp_path / 'reload_bad.py'
+    write_module(source, 'old')
+    proxy = EventProxy('reload_bad.handler', str(tmp_path))
+    proxy.get_handler()
+    module = sys.modules['reload_bad']
+
+    source.write_text('def handler(:\n')
+    reloader.reload([str(source)], [proxy])
+    assert sys.modules['reload_bad'] is module
+    assert proxy.get_handler()(None, None) == 'old'
+    del sys.modules['reload_bad']
+
+
+def test_reload_unrelated():
+    proxy = EventProxy('lambda_function.lambda_handler', '.')
+    assert reloader.reload(['/elsewhere/other.py'], [proxy]) == []
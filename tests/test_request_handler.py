@@ -1,3 +1,5 @@
+import asyncio
+import base64
 import io
 import json
 from unittest.mock import Mock
@@ -5,13 +7,88 @@ from unittest.mock import call
 from urllib.parse import urlencode
 
 import pytest
+from aiohttp import streams, web
+from aiohttp.test_utils import make_mocked_request
 
 from lambda_gateway.event_proxy import EventProxy
 from lambda_gateway.request_handler import LambdaRequestHandler
+from lambda_gateway.response_cache import ResponseCache
+
+
+def get_body(body, headers=None, **kwargs):
+    async def run():
+        payload = streams.StreamReader(Mock(), 2 ** 16,
+                                       loop=asyncio.get_running_loop())
+        payload.feed_data(body)
+        payload.feed_eof()
+        request = make_mocked_request(
+            'POST', '/', headers={'Content-Length': str(len(body)),
+                                  **(headers or {})},
+            payload=payload)
+        handler = LambdaRequestHandler(None, '2.0', **kwargs)
+        handler.chunk_size = 5
+        return await handler.get_body(request)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize(('body', 'headers', 'exp'), [
+    (b'{"fizz": "buzz"}', {'Content-Type': 'application/json'},
+     ('{"fizz": "buzz"}', False)),
+    ('caf\u00e9'.encode(), {'Content-Type': 'text/plain; charset=utf-8'},
+     ('caf\u00e9', False)),
+    (b'fizz=buzz', None, ('fizz=buzz', False)),
+    (bytes(range(256)), {'Content-Type': 'image/png'},
+     (base64.b64encode(bytes(range(256))).decode(), True)),
+    (b'\xff\xfe', {'Content-Type': 'text/plain'},
+     (base64.b64encode(b'\xff\xfe').decode(), True)),
+])
+def test_get_body(body, headers, exp):
+    assert get_body(body, headers) == exp
+
+
+def test_get_body_too_large():
+    with pytest.raises(web.HTTPRequestEntityTooLarge):
+        get_body(b'x' * 11, max_body_size=10)
+
+
+class SlowProxy:
+    def __init__(self):
+        self.invocations = 0
+
+    async def invoke(self, event):
+        self.invocations += 1
+        await asyncio.sleep(0.01)
+        return {'statusCode': 200, 'body': 'fizz'}
+
+
+@pytest.mark.parametrize(('single_flight', 'cache_ttl', 'exp'), [
+    (False, 0, 6),
+    (False, 60, 1),
+    (True, 0, 2),
+    (True, 60, 1),
+])
+def test_single_flight(single_flight, cache_ttl, exp):
+    proxy = SlowProxy()
+    handler = LambdaRequestHandler(
+        proxy, '2.0', cache=ResponseCache(), cache_ttl=cache_ttl,
+        single_flight=single_flight)
+
+    async def run():
+        # One request, then a burst of identical ones: the burst hits the
+        # cache, or else shares one invocation with --single-flight
+        first = await handler.invoke(make_mocked_request('GET', '/?a=1'))
+        return [first, *await asyncio.gather(*(
+            handler.invoke(make_mocked_request('GET', '/?a=1'))
+            for _ in range(5)))]
+
+    responses = asyncio.run(run())
+    assert proxy.invocations == exp
+    assert all(x.body == b'fizz' for x in responses)
+    assert not handler.in_flight
 
 
 class TestLambdaRequestHandler:
-    def setup(self):
+    def setup_method(self):
         self.subject = Mock(LambdaRequestHandler)
         self.subject.proxy = Mock(EventProxy)
         self.subject.version = '2.0'
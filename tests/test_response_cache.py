@@ -0,0 +1,64 @@
+import time
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from lambda_gateway.response_cache import ResponseCache, get_ttl
+
+
+@pytest.mark.parametrize(('cache_control', 'exp'), [
+    (None, 60),
+    ('public', 60),
+    ('max-age=10', 10),
+    ('max-age=10, s-maxage=20', 20),
+    ('no-store', 0),
+    ('no-cache', 0),
+    ('private, max-age=10', 0),
+])
+def test_get_ttl(cache_control, exp):
+    assert get_ttl(cache_control, 60) == exp
+
+
+def test_get_key():
+    cache = ResponseCache(key_headers=['Accept'])
+    request = make_mocked_request(
+        'GET', '/items?a=1', headers={'Accept': 'text/html'})
+    assert cache.get_key(request) == ('GET', '/items', 'a=1', 'text/html')
+
+
+def test_get_put():
+    cache = ResponseCache()
+    cache.put('key', web.Response(text='fizz', headers={'X-Fizz': 'buzz'}), 60)
+    response = cache.get('key').get_response()
+    assert response.body == b'fizz'
+    assert response.headers['X-Fizz'] == 'buzz'
+    assert response.headers['X-Cache'] == 'Hit'
+    assert cache.get('other') is None
+
+
+def test_expiry():
+    cache = ResponseCache()
+    cache.put('key', web.Response(text='fizz'), 60)
+    cache.entries['key'].expires = time.monotonic() - 1
+    assert cache.get('key') is None
+    assert cache.size == 0
+
+
+def test_lru_eviction():
+    cache = ResponseCache()
+    for key in 'abc':
+        cache.put(key, web.Response(body=b'x' * 100), 60)
+    cache.max_size = cache.size - 1
+    cache.get('a')
+    cache.put('d', web.Response(body=b'x' * 100), 60)
+    assert list(cache.entries) == ['a', 'd']
+    assert cache.size == sum(x.size for x in cache.entries.values())
+
+
+def test_clear():
+    cache = ResponseCache()
+    cache.put('key', web.Response(text='fizz'), 60)
+    cache.clear()
+    assert cache.get('key') is None
+    assert cache.size == 0
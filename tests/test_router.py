@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from lambda_gateway import bench
+from lambda_gateway.router import PATH_PARAMETERS, ROUTE, Router
+
+
+def get_handler(text):
+    async def handler(request):
+        return web.Response(text=text)
+    return handler
+
+
+class TestRouter:
+    def setup_method(self):
+        self.subject = Router([
+            web.RouteDef('GET', '/fizz', get_handler('fizz'), {}),
+            web.RouteDef('GET', '/items/{id}', get_handler('item'), {}),
+            web.RouteDef('GET', '/items/new', get_handler('new'), {}),
+            web.RouteDef(
+                'any', '/items/{id}/{rest+}', get_handler('rest'), {}),
+            web.RouteDef('OPTIONS', '$default', get_handler('cors'), {}),
+        ])
+
+    def dispatch(self, method, path):
+        request = make_mocked_request(method, path)
+        return asyncio.run(self.subject.handle(request)), request
+
+    @pytest.mark.parametrize(('method', 'path', 'exp'), [
+        ('GET', '/fizz', ('GET /fizz', {})),
+        ('GET', '/items/new', ('GET /items/new', {})),
+        ('GET', '/items/1', ('GET /items/{id}', {'id': '1'})),
+        ('PUT', '/items/1/a/b', ('ANY /items/{id}/{rest+}',
+                                 {'id': '1', 'rest': 'a/b'})),
+        ('OPTIONS', '/anything', ('$default', {})),
+    ])
+    def test_resolve(self, method, path, exp):
+        route, params = self.subject.resolve(method, path)
+        assert (route.RouteKey, params) == exp
+
+    @pytest.mark.parametrize(('method', 'path'), [
+        ('POST', '/fizz'),
+        ('GET', '/buzz'),
+        ('GET', '/items/'),
+        ('GET', '/items/1/'),
+    ])
+    def test_resolve_not_found(self, method, path):
+        assert self.subject.resolve(method, path) == (None, None)
+
+    def test_handle(self):
+        res, request = self.dispatch('GET', '/items/1')
+        assert res.text == 'item'
+        assert request[PATH_PARAMETERS] == {'id': '1'}
+        assert request[ROUTE].Path == '/items/{id}'
+
+    def test_handle_not_found(self):
+        with pytest.raises(web.HTTPNotFound):
+            self.dispatch('GET', '/buzz')
+
+    def test_set_routes(self):
+        self.subject.set_routes([
+            web.RouteDef('GET', '/buzz', get_handler('buzz'), {}),
+        ])
+        assert self.dispatch('GET', '/buzz')[0].text == 'buzz'
+        with pytest.raises(web.HTTPNotFound):
+            self.dispatch('GET', '/fizz')
+
+    def test_greedy_not_last(self):
+        with pytest.raises(ValueError):
+            Router([web.RouteDef('GET', '/{a+}/b', get_handler('x'), {})])
+
+
+def test_bench_router():
+    ret = bench.bench_router(routes=40, lookups=100)
+    assert ret['routes'] == 40
+    assert ret['router_lookups_per_s'] > 0
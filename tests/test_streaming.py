@@ -0,0 +1,53 @@
+import asyncio
+import base64
+
+import pytest
+
+from lambda_gateway import streaming
+
+
+def collect(body, is_base64_encoded=False):
+    async def run():
+        chunks = streaming.iter_chunks(body, is_base64_encoded)
+        return [chunk async for chunk in chunks]
+    return asyncio.run(run())
+
+
+async def agen():
+    yield 'fizz'
+    yield b'buzz'
+
+
+@pytest.mark.parametrize(('body', 'exp'), [
+    ('body', False),
+    (b'body', False),
+    ({'body': 'OK'}, False),
+    (None, False),
+    (['fizz', 'buzz'], True),
+    ((x for x in 'ab'), True),
+    (agen(), True),
+])
+def test_is_stream(body, exp):
+    assert streaming.is_stream(body) == exp
+
+
+def test_get_streamed_result():
+    body = iter(['fizz'])
+    assert streaming.get_streamed_result(body) == \
+        {'statusCode': 200, 'body': body}
+    assert streaming.get_streamed_result({'body': 'OK'}) == {'body': 'OK'}
+
+
+def test_materialize():
+    ret = streaming.materialize({'statusCode': 201, 'body': agen()})
+    assert ret == {'statusCode': 201, 'body': ['fizz', b'buzz']}
+
+
+def test_iter_chunks():
+    assert collect(x for x in ['fizz', b'', b'buzz']) == [b'fizz', b'buzz']
+    assert collect(agen()) == [b'fizz', b'buzz']
+
+
+def test_iter_chunks_base64():
+    body = [base64.b64encode(b'fizz'), base64.b64encode(b'buzz')]
+    assert collect(body, True) == [b'fizz', b'buzz']
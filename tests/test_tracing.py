@@ -0,0 +1,84 @@
+import asyncio
+import json
+
+import pytest
+
+from lambda_gateway import tracing
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    exporter = ListExporter()
+    monkeypatch.setattr(tracing, 'exporter', exporter)
+    return exporter
+
+
+def test_span_disabled():
+    with tracing.span('request') as span:
+        assert span is None
+        assert tracing.current_span() is None
+
+
+def test_span_nesting(exporter):
+    async def run():
+        with tracing.span('request') as root:
+            with tracing.span('invoke', function='fn') as child:
+                tracing.add_span('queue', 1, 2)
+        return root, child
+    root, child = asyncio.run(run())
+    queue, child_, root_ = exporter.spans
+    assert (root_, child_) == (root, child)
+    assert root.parent_id is None
+    assert child.parent_id == root.span_id
+    assert queue.parent_id == child.span_id
+    assert {x.trace_id for x in exporter.spans} == {root.trace_id}
+    assert child.to_dict()['attributes'] == \
+        [{'key': 'function', 'value': {'stringValue': 'fn'}}]
+
+
+def test_span_error(exporter):
+    with pytest.raises(ValueError):
+        with tracing.span('request'):
+            raise ValueError('fizz')
+    assert exporter.spans[0].to_dict()['status'] == \
+        {'code': 2, 'message': 'ValueError: fizz'}
+
+
+@pytest.mark.parametrize(('headers', 'exp'), [
+    ({'traceparent':
+      '00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01'},
+     ('0af7651916cd43dd8448eb211c80319c', 'b7ad6b7169203331')),
+    ({'X-Amzn-Trace-Id':
+      'Root=1-5759e988-bd862e3fe1be46a994272793;Sampled=1'},
+     ('5759e988bd862e3fe1be46a994272793', None)),
+    ({}, (None, None)),
+])
+def test_get_remote_parent(headers, exp):
+    assert tracing.get_remote_parent(headers) == exp
+
+
+def test_trace_header(exporter):
+    headers = {'traceparent':
+               '00-5759e988bd862e3fe1be46a994272793-b7ad6b7169203331-01'}
+    with tracing.span('request', headers) as span:
+        assert span.trace_header == \
+            'Root=1-5759e988-bd862e3fe1be46a994272793;' \
+            f'Parent={span.span_id};Sampled=1'
+
+
+def test_file_exporter(tmp_path, monkeypatch):
+    path = tmp_path / 'spans.jsonl'
+    monkeypatch.setattr(tracing, 'exporter', tracing.FileExporter(str(path)))
+    with tracing.span('request'):
+        pass
+    span = json.loads(path.read_text())
+    assert span['name'] == 'request'
+    assert int(span['endTimeUnixNano']) >= int(span['startTimeUnixNano'])